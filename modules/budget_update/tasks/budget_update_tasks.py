@@ -8,8 +8,9 @@ import os
 # 添加根目录到路径（prefect 目录）
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from mypackage.utilities import connect_to_db, connect_to_fone, update_report_data
+from mypackage.utilities import connect_to_db, connect_to_fone
 from mypackage.mapping import reverse_combined_column_mapping, combined_column_mapping
+from utils.bulk_writer import update_report_data
 
 # 流水映射表（产品名称 -> 编码）
 MAP_AMO = {
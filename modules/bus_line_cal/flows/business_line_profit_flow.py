@@ -1,25 +1,154 @@
 """业务线损益计算流程 - 业务线数据计算和利润表刷新"""
 from prefect import flow
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+import contextvars
 import pandas as pd
 import sys
 import os
+import threading
+import time
 # 添加根目录到路径（prefect目录）
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
 from utils.date_utils import get_date_range_by_month, get_date_range_by_months
+from utils.db_utils import set_db_connection_budget
+from utils.ref_cache import get_reference_table, reference_cache_stats
+from utils.watermark import (
+    ensure_watermark_table, frame_fingerprint, is_unchanged, load_watermarks,
+    save_watermarks, source_watermarks
+)
 # 从同模块导入
 from .revenue_expense_profit_flow import revenue_expense_profit_flow
 from .asset_detail_flow import asset_detail_flow
+from ..tasks.data_preparation_tasks import calculate_person_weight_task, check_and_update_shared_rate_task
 # 从 profit_refresh 模块导入
 from modules.profit_refresh.flows.profit_refresh_flow import profit_refresh_flow
 from modules.shared_rate.flows.fetch_budget_shared_rate_flow import fetch_budget_shared_rate_flow
 
+# 月份计算的来源表：{表名: (日期列, 是否从年初开始取水位)}
+# fact_offset 当月抵销数由年初以来的累计数做差得到，需要从年初开始
+WATERMARK_SOURCES: Dict[str, Tuple[str, bool]] = {
+    "fact_revenue": ("acct_period", False),
+    "fact_expense": ("acct_period", False),
+    "fact_profit_bd": ("date", False),
+    "fact_offset": ("date", True),
+    "fact_receivable": ("acct_period", False),
+    "fact_inventory": ("acct_period", False),
+    "fact_inventory_on_way": ("acct_period", False),
+}
+
+
+def _month_watermarks(
+    month_list: List[Tuple[int, int]]
+) -> Dict[Tuple[int, int], Tuple[str, Dict[str, str], str]]:
+    """
+    计算各月份的来源表水位和分拆表指纹（辅助函数）
+
+    分拆表指纹覆盖人数权重结果、组织架构、业务线比例表和当月的公摊比例。
+
+    Returns:
+        {(年, 月): (期间, 来源表水位, 分拆表指纹)}
+    """
+    df_upload_merge_all, df_org = calculate_person_weight_task()
+    df_shared_rate = get_reference_table('fact_bus_shared_rate')
+    shared_rate_date = pd.to_datetime(df_shared_rate['date'])
+    split_frames = (
+        df_upload_merge_all, df_org,
+        get_reference_table('fact_bus_line'), get_reference_table('dim_org_struc'),
+    )
+
+    result = {}
+    for process_year, process_month in month_list:
+        date_range = get_date_range_by_month(process_year, process_month)
+        period = date_range.min().strftime('%Y-%m-%d')
+        marks = source_watermarks(
+            WATERMARK_SOURCES, period, date_range.max().strftime('%Y-%m-%d'),
+            f"{process_year}-01-01"
+        )
+        fingerprint = frame_fingerprint(
+            *split_frames, df_shared_rate[shared_rate_date.isin(date_range)])
+        result[(process_year, process_month)] = (period, marks, fingerprint)
+    return result
+
+
+def _process_month(
+    process_year: int,
+    process_month: int,
+    idx: int,
+    total: int,
+    allocation_mode: str = "pandas"
+) -> float:
+    """处理单个月份的业务线数据，返回耗时秒数（辅助函数）"""
+    print(f"\n{'='*60}")
+    print(
+        f"开始处理第 {idx}/{total} 个月：{process_year}年{process_month}月")
+    print(f"{'='*60}")
+    start = time.perf_counter()
+
+    # 获取单个月份的日期范围
+    date_range = get_date_range_by_month(process_year, process_month)
+    print(f"日期范围: {date_range.min()} 到 {date_range.max()}")
+
+    try:
+        # 收入、费用、利润明细生成流程（内部会自己获取数据）
+        revenue_expense_profit_flow(date_range, allocation_mode)
+
+        # 资产明细生成流程
+        asset_detail_flow(date_range)
+
+        elapsed = time.perf_counter() - start
+        print(f"✓ {process_year}年{process_month}月 处理完成，耗时 {elapsed:.1f} 秒")
+        return elapsed
+    except Exception as e:
+        print(f"✗ {process_year}年{process_month}月 处理失败: {str(e)}")
+        raise
+
+
+def _process_months_concurrently(
+    month_list: List[Tuple[int, int]],
+    max_parallel_months: int,
+    allocation_mode: str = "pandas"
+) -> None:
+    """
+    在有界线程池中并发处理多个月份，任一月份失败即停止提交剩余月份并抛出异常
+
+    各月份读写的 date_range 互不重叠；子流程在提交线程的上下文副本中运行，
+    仍作为当前 flow 的子流程记录。已在运行中的月份无法中断，会等待其结束。
+    """
+    stop = threading.Event()
+
+    def run(process_year: int, process_month: int, idx: int) -> Optional[float]:
+        if stop.is_set():
+            print(f"跳过 {process_year}年{process_month}月（已有月份失败）")
+            return None
+        return _process_month(process_year, process_month, idx, len(month_list), allocation_mode)
+
+    with ThreadPoolExecutor(max_workers=max_parallel_months) as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, run, process_year, process_month, idx):
+                (process_year, process_month)
+            for idx, (process_year, process_month) in enumerate(month_list, 1)
+        }
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except Exception:
+            stop.set()
+            for future in futures:
+                future.cancel()
+            print("警告：有月份处理失败，已取消尚未开始的月份，等待运行中的月份结束...")
+            raise
+
 
 @flow(name="business_line_profit_flow", log_prints=True)
 def business_line_profit_flow(
     year: int,
     month: Optional[int] = None,
-    months: Optional[List[int]] = None
+    months: Optional[List[int]] = None,
+    max_parallel_months: int = 1,
+    max_db_connections: int = 4,
+    force: bool = False,
+    allocation_mode: str = "pandas"
 ) -> None:
     """
     业务线损益计算流程
@@ -32,6 +161,14 @@ def business_line_profit_flow(
         year: 年份
         month: 单个月份（1-12），如果提供则只处理该月
         months: 月份列表（1-12），如果提供则按月循环处理多个月份，例如 [10, 11, 12]
+        max_parallel_months: 同时处理的月份数，默认 1（按月顺序处理）；大于 1 时各月份并发处理，
+            任一月份失败即停止并报错，利润表刷新仍在全部月份完成后执行一次
+        max_db_connections: 进程内同时占用的数据库连接上限（读取明细、写入明细时生效）
+        force: 是否强制重算全部月份；默认 False 时，来源表水位（行数 + max(last_modified)）
+            和分拆表指纹都与上次成功计算一致的月份直接跳过
+        allocation_mode: 收入、费用明细的执行方式；"pandas"（默认）在 worker 内存中计算，
+            "database" 在数据库中用 INSERT ... SELECT 计算并写入（结果与 pandas 一致，
+            可用 scripts/check_allocation_parity.py 核对）
     
     Examples:
         # 处理单个月份（只处理 12 月）
@@ -39,6 +176,15 @@ def business_line_profit_flow(
         
         # 批量处理多个月份（按月循环执行，避免内存溢出）
         business_line_profit_flow(year=2025, months=[10, 11, 12])
+
+        # 全年重算，最多 4 个月同时处理
+        business_line_profit_flow(year=2025, months=list(range(1, 13)), max_parallel_months=4)
+
+        # 忽略水位，强制重算
+        business_line_profit_flow(year=2025, month=12, force=True)
+
+        # 收入、费用明细在数据库中计算
+        business_line_profit_flow(year=2025, months=[10, 11, 12], allocation_mode="database")
     """
     print(f"开始执行业务线损益计算流程，年份: {year}")
 
@@ -68,31 +214,43 @@ def business_line_profit_flow(
         # 因为这是计算的前置条件，如果失败建议不要终止，让业务使用既有老比例跑，但需告警
         print("警告：预算比例拉取失败，本期计算将继续沿用数据库中已存有的比例...")
 
-    # 按月循环执行
-    for idx, (process_year, process_month) in enumerate(month_list, 1):
-        print(f"\n{'='*60}")
-        print(
-            f"开始处理第 {idx}/{len(month_list)} 个月：{process_year}年{process_month}月")
-        print(f"{'='*60}")
-
-        # 获取单个月份的日期范围
-        date_range = get_date_range_by_month(process_year, process_month)
-        print(f"日期范围: {date_range.min()} 到 {date_range.max()}")
+    set_db_connection_budget(max_db_connections)
 
-        try:
-            # 收入、费用、利润明细生成流程（内部会自己获取数据）
-            revenue_expense_profit_flow(date_range)
+    # ========== 按水位跳过输入未变化的月份 ==========
+    # 先补齐上月公摊比例，使分拆表指纹与各月份实际使用的比例一致
+    check_and_update_shared_rate_task()
+    ensure_watermark_table()
+    watermarks = _month_watermarks(month_list)
+    if force:
+        pending_months = list(month_list)
+        print("强制模式：忽略水位，重算全部月份")
+    else:
+        pending_months = [
+            key for key in month_list
+            if not is_unchanged(load_watermarks(watermarks[key][0]), *watermarks[key][1:])
+        ]
+        skipped = [key for key in month_list if key not in pending_months]
+        if skipped:
+            print(f"输入未变化，跳过 {len(skipped)} 个月: "
+                  f"{', '.join(f'{y}年{m}月' for y, m in skipped)}")
 
-            # 资产明细生成流程
-            asset_detail_flow(date_range)
+    if not pending_months:
+        print("所有月份的输入均未变化，无需重算（如需重算请传 force=True）")
+        return
 
-            print(f"✓ {process_year}年{process_month}月 处理完成")
-        except Exception as e:
-            print(f"✗ {process_year}年{process_month}月 处理失败: {str(e)}")
-            raise  # 如果某个月失败，停止后续处理
+    flow_start = time.perf_counter()
+    if max_parallel_months > 1 and len(pending_months) > 1:
+        print(f"并发处理模式：最多 {max_parallel_months} 个月同时处理，数据库连接上限 {max_db_connections}")
+        _process_months_concurrently(pending_months, max_parallel_months, allocation_mode)
+    else:
+        # 按月循环执行，如果某个月失败，停止后续处理
+        for idx, (process_year, process_month) in enumerate(pending_months, 1):
+            _process_month(process_year, process_month, idx, len(pending_months), allocation_mode)
 
     print(f"\n{'='*60}")
-    print(f"业务线数据计算流程全部完成，共处理 {len(month_list)} 个月")
+    print(f"业务线数据计算流程全部完成，共处理 {len(pending_months)} 个月，耗时 {time.perf_counter() - flow_start:.1f} 秒")
+    stats = reference_cache_stats()
+    print(f"参考数据缓存：命中 {stats['hits']} 次，加载 {stats['misses']} 次，缓存表 {stats['tables']} 张")
     print(f"{'='*60}")
 
     # ========== 利润表刷新流程 ==========
@@ -101,8 +259,8 @@ def business_line_profit_flow(
     print("开始利润表刷新流程（处理所有已计算的月份数据）")
     print(f"{'='*60}")
 
-    # 合并所有月份的日期范围
-    all_date_range = get_date_range_by_months(month_list)
+    # 合并所有已计算月份的日期范围
+    all_date_range = get_date_range_by_months(pending_months)
     print(f"利润表刷新日期范围: {all_date_range.min()} 到 {all_date_range.max()}")
 
     try:
@@ -112,6 +270,11 @@ def business_line_profit_flow(
         print(f"✗ 利润表刷新失败: {str(e)}")
         raise
 
+    # 利润表刷新成功后才记录水位，刷新失败时下次重跑仍会重算这些月份
+    for key in pending_months:
+        save_watermarks(*watermarks[key])
+    print(f"已记录 {len(pending_months)} 个月的输入水位")
+
     print(f"\n{'='*60}")
     print("业务线损益计算流程全部完成")
     print(f"{'='*60}")
@@ -1,10 +1,13 @@
 """收入、费用、利润明细生成流程"""
 from prefect import flow
+from prefect.task_runners import ConcurrentTaskRunner
+from datetime import datetime, timezone
 import pandas as pd
 import sys
 import os
 # 添加根目录到路径（prefect目录）
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.flow_utils import wait_branches
 from .prepare_data_flow import prepare_data_flow
 from ..tasks.revenue_tasks import (
     load_revenue_data_task,
@@ -28,6 +31,10 @@ from ..tasks.expense_tasks import (
     apply_shared_rate_to_expense_task,
     save_expense_detail_task,
 )
+from ..tasks.db_allocation_tasks import (
+    allocate_revenue_in_db_task,
+    allocate_expense_in_db_task,
+)
 from ..tasks.profit_tasks import (
     load_profit_data_task,
     process_manual_profit_task,
@@ -42,76 +49,107 @@ from ..tasks.profit_tasks import (
 )
 
 
-@flow(name="revenue_expense_profit_flow", log_prints=True)
+@flow(name="revenue_expense_profit_flow", log_prints=True, task_runner=ConcurrentTaskRunner())
 def revenue_expense_profit_flow(
-    date_range: pd.DatetimeIndex
+    date_range: pd.DatetimeIndex,
+    allocation_mode: str = "pandas"
 ) -> None:
     """
     收入、费用、利润明细生成流程
+
+    收入链、费用链以及利润明细的加载/分拆、抵销数加载互不依赖，全部通过 .submit() 并发提交；
+    利润合并只等待收入、费用转换结果及自身输入，公摊利润由内存中的利润明细计算后与明细一起保存。
     
     Args:
         date_range: 日期范围
+        allocation_mode: 收入、费用明细的执行方式；"pandas"（默认）在 worker 内存中计算，
+            "database" 在数据库中用 INSERT ... SELECT 计算并写入，只读回利润表需要的列
     """
-    print("开始收入、费用、利润明细生成流程...")
+    if allocation_mode not in ("pandas", "database"):
+        raise ValueError(f"allocation_mode 只能为 'pandas' 或 'database'，收到: {allocation_mode}")
+    print(f"开始收入、费用、利润明细生成流程（收入、费用明细执行方式: {allocation_mode}）...")
     
     # 在 flow 内部获取数据（避免 DataFrame 序列化问题）
     df_upload_merge_all, df_org = prepare_data_flow()
+    start = datetime.now(timezone.utc)
     
-    # ========== 收入明细生成 ==========
-    print("--- 开始生成收入明细 ---")
-    df_revenue = load_revenue_data_task(date_range)
-    df_revenue_bus_hand = process_manual_revenue_task(df_revenue, df_upload_merge_all)
-    df_revenue_bus_auto = process_auto_revenue_task(df_revenue, df_upload_merge_all, df_org)
-    df_revenue_bus_all = merge_revenue_data_task(df_revenue_bus_hand, df_revenue_bus_auto)
-    df_revenue_bus_all_to_profit = pivot_revenue_data_task(df_revenue_bus_all)
-    df_revenue_bus_all_to_profit = update_energy_hardware_task(df_revenue_bus_all_to_profit)
-    validate_revenue_rate_task(df_revenue_bus_all_to_profit)
-    df_revenue_final = apply_shared_rate_to_revenue_task(df_revenue_bus_all_to_profit, date_range)
-    save_revenue_detail_task(df_revenue_final, date_range)
-    print("--- 收入明细生成完成 ---")
-    
-    # ========== 费用明细生成 ==========
-    print("--- 开始生成费用明细 ---")
-    df_expense = load_expense_data_task(date_range)
-    df_expense_bus_gap = process_gap_expense_task(df_expense, df_upload_merge_all)
-    df_expense_bus_hand = process_manual_expense_task(df_expense, df_upload_merge_all)
-    df_expense_bus_auto = process_auto_expense_task(df_expense, df_upload_merge_all, df_org)
-    df_expense_bus_all = merge_expense_data_task(
-        df_expense_bus_hand, df_expense_bus_auto, df_expense_bus_gap
-    )
-    df_expense_bus_all = update_energy_hardware_expense_task(df_expense_bus_all)
-    validate_expense_rate_task(df_expense_bus_all)
-    df_expense_final = apply_shared_rate_to_expense_task(df_expense_bus_all, date_range)
-    save_expense_detail_task(df_expense_final, date_range)
-    print("--- 费用明细生成完成 ---")
+    if allocation_mode == "database":
+        # ========== 收入、费用明细在数据库中生成 ==========
+        # 分拆到保存在数据库中完成，返回值与 pandas 路径中转换为利润表格式前的数据相同
+        print("--- 提交收入、费用明细分支（数据库内执行） ---")
+        df_revenue_bus_all_to_profit = allocate_revenue_in_db_task.submit(
+            date_range, df_upload_merge_all, df_org)
+        df_expense_final = allocate_expense_in_db_task.submit(
+            date_range, df_upload_merge_all, df_org)
+        revenue_saved = df_revenue_bus_all_to_profit
+        expense_saved = df_expense_final
+    else:
+        # ========== 收入明细生成 ==========
+        print("--- 提交收入明细分支 ---")
+        df_revenue = load_revenue_data_task.submit(date_range)
+        df_revenue_bus_hand = process_manual_revenue_task.submit(df_revenue, df_upload_merge_all)
+        df_revenue_bus_auto = process_auto_revenue_task.submit(df_revenue, df_upload_merge_all, df_org)
+        df_revenue_bus_all = merge_revenue_data_task.submit(df_revenue_bus_hand, df_revenue_bus_auto)
+        df_revenue_bus_all_to_profit = pivot_revenue_data_task.submit(df_revenue_bus_all)
+        df_revenue_bus_all_to_profit = update_energy_hardware_task.submit(df_revenue_bus_all_to_profit)
+        revenue_validated = validate_revenue_rate_task.submit(df_revenue_bus_all_to_profit)
+        df_revenue_final = apply_shared_rate_to_revenue_task.submit(
+            df_revenue_bus_all_to_profit, date_range, wait_for=[revenue_validated]
+        )
+        revenue_saved = save_revenue_detail_task.submit(df_revenue_final, date_range)
+
+        # ========== 费用明细生成 ==========
+        print("--- 提交费用明细分支 ---")
+        df_expense = load_expense_data_task.submit(date_range)
+        df_expense_bus_gap = process_gap_expense_task.submit(df_expense, df_upload_merge_all)
+        df_expense_bus_hand = process_manual_expense_task.submit(df_expense, df_upload_merge_all)
+        df_expense_bus_auto = process_auto_expense_task.submit(df_expense, df_upload_merge_all, df_org)
+        df_expense_bus_all = merge_expense_data_task.submit(
+            df_expense_bus_hand, df_expense_bus_auto, df_expense_bus_gap
+        )
+        df_expense_bus_all = update_energy_hardware_expense_task.submit(df_expense_bus_all)
+        expense_validated = validate_expense_rate_task.submit(df_expense_bus_all)
+        df_expense_final = apply_shared_rate_to_expense_task.submit(
+            df_expense_bus_all, date_range, wait_for=[expense_validated]
+        )
+        expense_saved = save_expense_detail_task.submit(df_expense_final, date_range)
     
     # ========== 利润明细生成 ==========
-    print("--- 开始生成利润明细 ---")
-    df_profit = load_profit_data_task(date_range)
-    df_profit_bus_hand = process_manual_profit_task(df_profit, df_upload_merge_all)
-    df_profit_bus_auto = process_auto_profit_task(df_profit, df_upload_merge_all, df_org)
+    print("--- 提交利润明细分支 ---")
+    df_profit = load_profit_data_task.submit(date_range)
+    df_profit_bus_hand = process_manual_profit_task.submit(df_profit, df_upload_merge_all)
+    df_profit_bus_auto = process_auto_profit_task.submit(df_profit, df_upload_merge_all, df_org)
     
-    # 转换费用表和收入表为利润表格式
-    df_expense_bus_all_to_profit = convert_expense_to_profit_task(df_expense_final)
-    df_revenue_bus_all_to_profit = convert_revenue_to_profit_task(df_revenue_bus_all_to_profit)
+    # 转换费用表和收入表为利润表格式（只依赖费用、收入分支的结果）
+    df_expense_bus_all_to_profit = convert_expense_to_profit_task.submit(df_expense_final)
+    df_revenue_bus_all_to_profit = convert_revenue_to_profit_task.submit(df_revenue_bus_all_to_profit)
     
     # 加载抵销数数据
-    df_offset = load_offset_data_task(date_range)
+    df_offset = load_offset_data_task.submit(date_range)
     
-    # 合并利润数据
-    df_profit_bus_all = merge_profit_data_task(
+    # 合并利润数据（直接传入 future，不在 flow 内阻塞等待利润分拆结果）
+    df_profit_bus_all = merge_profit_data_task.submit(
         df_revenue_bus_all_to_profit,
         df_expense_bus_all_to_profit,
-        pd.concat([df_profit_bus_hand, df_profit_bus_auto], ignore_index=True),
+        df_profit_bus_hand,
+        df_profit_bus_auto,
         df_offset
     )
-    validate_profit_rate_task(df_profit_bus_all)
-    save_profit_detail_task(df_profit_bus_all, date_range)
-    print("--- 利润明细生成完成 ---")
+    profit_validated = validate_profit_rate_task.submit(df_profit_bus_all)
     
     # ========== 处理公摊利润 ==========
-    print("--- 开始处理公摊利润 ---")
-    process_shared_profit_task(date_range)
-    print("--- 公摊利润处理完成 ---")
+    # 公摊利润直接由内存中的利润明细计算，与明细一起一次写入
+    df_shared_profit = process_shared_profit_task.submit(
+        df_profit_bus_all, df_upload_merge_all, wait_for=[profit_validated]
+    )
+    profit_saved = save_profit_detail_task.submit(
+        df_profit_bus_all, date_range, df_shared_profit
+    )
+    
+    wait_branches({
+        "收入明细": revenue_saved,
+        "费用明细": expense_saved,
+        "利润明细": profit_saved,
+    }, start)
     
     print("收入、费用、利润明细生成流程完成")
@@ -1,25 +1,75 @@
 """数据准备相关 Tasks"""
 from prefect import task
-from typing import Tuple
+from datetime import date
+from typing import Dict, Optional, Tuple
 import pandas as pd
 import sys
 import os
+import threading
 # 添加根目录到路径（prefect目录）
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from mypackage.utilities import cal_person_weight, connect_to_db, add_data
+from mypackage.utilities import cal_person_weight
+from utils.bulk_writer import add_data
+from utils.ref_cache import get_reference_table, invalidate_reference_table, table_version
 from utils.date_utils import get_date_range_by_lastmonth
 
 
+# cal_person_weight 的输入表：任一表数据变化时重新计算
+PERSON_WEIGHT_SOURCE_TABLES = ("dim_org_struc", "fact_bus_line")
+
+# 运行级缓存：{(根 flow run id, 输入指纹): (df_upload_merge_all, df_org)}
+_person_weight_memo: Dict[tuple, Tuple[pd.DataFrame, pd.DataFrame]] = {}
+_person_weight_lock = threading.Lock()
+_PERSON_WEIGHT_MEMO_SIZE = 4
+
+_shared_rate_check_lock = threading.Lock()
+
+
+def _current_run_id() -> Optional[str]:
+    """当前所在的根 flow run id（没有 root_flow_run_id 的旧版本 Prefect 退回当前 flow run id）"""
+    try:
+        from prefect.runtime import flow_run
+        return getattr(flow_run, "root_flow_run_id", None) or flow_run.id
+    except Exception:
+        return None
+
+
+def _person_weight_fingerprint() -> tuple:
+    """cal_person_weight 的输入指纹：当天日期 + 各输入表的版本（辅助函数）"""
+    return (date.today().isoformat(),) + tuple(
+        table_version(table_name) for table_name in PERSON_WEIGHT_SOURCE_TABLES
+    )
+
+
 @task(name="calculate_person_weight", log_prints=True)
 def calculate_person_weight_task() -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
     计算人数权重，返回业务线比例数据和组织架构数据
+
+    同一次 flow 运行内（按根 flow run id + 输入指纹）只计算一次，之后各月份、
+    各子流程直接复用结果；不在 flow 中运行时不缓存。
     
     Returns:
         Tuple[df_upload_merge_all, df_org]: 业务线比例数据和组织架构数据
     """
     try:
-        df_upload_merge_all, df_org = cal_person_weight()
+        run_id = _current_run_id()
+        if run_id is None:
+            df_upload_merge_all, df_org = cal_person_weight()
+        else:
+            key = (str(run_id), _person_weight_fingerprint())
+            with _person_weight_lock:
+                if key in _person_weight_memo:
+                    df_upload_merge_all, df_org = _person_weight_memo[key]
+                    print("复用本次运行已计算的人数权重")
+                    return df_upload_merge_all.copy(deep=False), df_org.copy(deep=False)
+
+                df_upload_merge_all, df_org = cal_person_weight()
+                _person_weight_memo[key] = (df_upload_merge_all, df_org)
+                while len(_person_weight_memo) > _PERSON_WEIGHT_MEMO_SIZE:
+                    _person_weight_memo.pop(next(iter(_person_weight_memo)))
+            df_upload_merge_all, df_org = df_upload_merge_all.copy(deep=False), df_org.copy(deep=False)
+
         print(f"人数权重计算完成，业务线数据行数: {len(df_upload_merge_all)}, 组织架构行数: {len(df_org)}")
         return df_upload_merge_all, df_org
     except Exception as e:
@@ -31,13 +81,13 @@ def calculate_person_weight_task() -> Tuple[pd.DataFrame, pd.DataFrame]:
 def check_and_update_shared_rate_task() -> None:
     """
     检查公摊费用比例表，如果上个月没有记录，则追加一条记录
+
+    多个月份并发处理时会同时调用，检查和追加在进程内串行执行，避免重复追加。
     """
+    _shared_rate_check_lock.acquire()
     try:
-        conn, cur = connect_to_db()
-        
         # 获取所有公摊费用比例数据
-        cur.execute("SELECT * FROM fact_bus_shared_rate")
-        df = pd.DataFrame(cur.fetchall(), columns=[desc[0] for desc in cur.description])
+        df = get_reference_table('fact_bus_shared_rate')
         df['date'] = pd.to_datetime(df['date'])
         
         # 检查上个月是否有记录
@@ -53,13 +103,13 @@ def check_and_update_shared_rate_task() -> None:
             df_max = df_max.drop(['id'], axis=1)
             
             add_data('fact_bus_shared_rate', df_max)
+            invalidate_reference_table('fact_bus_shared_rate')
             print('已追加上个月的公摊费用比例记录')
         else:
             print('上个月的公摊费用比例记录已存在，无需追加')
         
-        cur.close()
-        conn.close()
-        
     except Exception as e:
         print(f"检查并更新公摊费用比例表时发生错误: {str(e)}")
         raise
+    finally:
+        _shared_rate_check_lock.release()
@@ -0,0 +1,268 @@
+"""收入、费用明细的数据库内执行 Tasks
+
+与 revenue_tasks / expense_tasks 的 pandas 路径规则相同（scripts/check_allocation_parity.py 核对结果一致）：
+明细数据在数据库中完成分拆、逆透视、能源硬件调整、比率校验和公摊比例还原，
+用 INSERT ... SELECT 直接写入 fact_bus_revenue / fact_bus_expense，只把利润表合并需要的列读回。
+"""
+from prefect import task
+from typing import Dict, List, Sequence, Tuple
+import pandas as pd
+import sys
+import os
+# 添加根目录到路径（prefect目录）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.bulk_writer import partition_staging, replace_date_range_from_query
+from utils.db_utils import db_connection_slot, fetch_dataframe, get_engine, get_table_columns
+from utils.allocation import split_rows
+from utils.frame_schema import SOURCE_COLUMNS, apply_schema
+from utils.sql_allocation import (
+    ALLOCATION_COLUMNS,
+    allocated_columns,
+    allocation_select,
+    detail_columns,
+    melt_select,
+    quote,
+    renamed_select,
+    replace_select,
+    shared_rate_select,
+    stage_allocation_inputs,
+)
+from utils.validation import validate_rates_sql
+from .revenue_tasks import REVENUE_AMOUNT_COLUMNS, REVENUE_SUBJECTS
+
+# 与 update_energy_hardware_task 相同：2025-08-01 之后业务线为能源硬件的改为能源运营
+ENERGY_HARDWARE_SQL = (
+    "CASE WHEN acct_period >= DATE '2025-08-01' AND bus_line = '能源硬件' "
+    "THEN '能源运营' ELSE bus_line END"
+)
+
+# 保存明细时的列名转换（与 save_*_detail_task 相同）
+SAVE_RENAMES = {'unique_lvl': 'sec_dist_lvl', 'source_lvl': 'unique_lvl'}
+
+REVENUE_STAGE = "tmp_revenue_stage"
+EXPENSE_STAGE = "tmp_expense_stage"
+EXPENSE_FINAL = "tmp_expense_final"
+
+
+def _source_sql(table_name: str, columns: Sequence[str]) -> str:
+    """明细查询，条件与 load_*_data_task 相同（辅助函数）"""
+    return (
+        f"SELECT {', '.join(quote(col) for col in columns)} FROM {table_name} "
+        f"WHERE acct_period = ANY(%s::date[]) AND (unique_lvl NOT LIKE '%%无归属%%')"
+    )
+
+
+def _days(date_range: pd.DatetimeIndex) -> List[str]:
+    return [day.strftime('%Y-%m-%d') for day in pd.DatetimeIndex(date_range)]
+
+
+def _create_temp(cur, table_name: str, select_sql: str, params: Tuple = ()) -> int:
+    """把查询结果写入事务结束即删除的临时表，返回行数（辅助函数）"""
+    cur.execute(f"DROP TABLE IF EXISTS {table_name}")
+    cur.execute(f"CREATE TEMP TABLE {table_name} ON COMMIT DROP AS {select_sql}", params)
+    rows = cur.rowcount
+    cur.execute(f"ANALYZE {table_name}")
+    return rows
+
+
+def prepare_revenue(
+    cur,
+    date_range: pd.DatetimeIndex,
+    df_upload_merge_all: pd.DataFrame,
+    df_org: pd.DataFrame
+) -> Tuple[List[str], str]:
+    """
+    在当前事务中生成收入的分拆 + 逆透视 + 能源硬件调整结果（临时表 tmp_revenue_stage）
+
+    Args:
+        cur: 游标
+        date_range: 日期范围
+        df_upload_merge_all: 业务线比例数据
+        df_org: 组织架构数据
+
+    Returns:
+        (tmp_revenue_stage 的列, 公摊比例还原后的查询)
+    """
+    columns = detail_columns(SOURCE_COLUMNS['fact_revenue'])
+    amounts = [col for col in REVENUE_AMOUNT_COLUMNS if col in columns]
+    stage_allocation_inputs(cur, split_rows(df_upload_merge_all, '收入'), df_org)
+
+    alloc_sql = allocation_select(_source_sql('fact_revenue', columns), columns, amounts)
+    id_columns = [col for col in allocated_columns(columns) if col not in amounts]
+    melted = melt_select(f"({alloc_sql})", id_columns,
+                         {col: REVENUE_SUBJECTS[col] for col in amounts}, 'prim_subj', 'mo_amt')
+    stage_columns = id_columns + ['prim_subj', 'mo_amt']
+    rows = _create_temp(
+        cur, REVENUE_STAGE,
+        replace_select(f"({melted}) e", stage_columns, {'bus_line': ENERGY_HARDWARE_SQL}),
+        (_days(date_range),)
+    )
+    print(f"数据库内分拆、逆透视收入数据完成，共 {rows} 条记录")
+    return stage_columns, shared_rate_select(
+        REVENUE_STAGE, stage_columns, ['mo_amt', 'orig_curr_amt', 'tax_amt'])
+
+
+def prepare_expense(
+    cur,
+    date_range: pd.DatetimeIndex,
+    df_upload_merge_all: pd.DataFrame,
+    df_org: pd.DataFrame
+) -> List[str]:
+    """
+    在当前事务中生成费用的分拆 + 能源硬件调整结果（临时表 tmp_expense_stage）
+    以及公摊比例还原后的结果（临时表 tmp_expense_final）
+
+    Args:
+        cur: 游标
+        date_range: 日期范围
+        df_upload_merge_all: 业务线比例数据
+        df_org: 组织架构数据
+
+    Returns:
+        两个临时表的列
+    """
+    columns = detail_columns(SOURCE_COLUMNS['fact_expense'])
+    stage_allocation_inputs(cur, split_rows(df_upload_merge_all, '费用'), df_org, with_gap=True)
+
+    alloc_sql = allocation_select(
+        _source_sql('fact_expense', columns), columns, ['exp_amt'],
+        none_category='公摊费用', with_gap=True
+    )
+    stage_columns = allocated_columns(columns)
+    rows = _create_temp(
+        cur, EXPENSE_STAGE,
+        replace_select(f"({alloc_sql}) e", stage_columns, {'bus_line': ENERGY_HARDWARE_SQL}),
+        (_days(date_range),)
+    )
+    print(f"数据库内分拆费用数据完成，共 {rows} 条记录")
+    _create_temp(cur, EXPENSE_FINAL, shared_rate_select(EXPENSE_STAGE, stage_columns, ['exp_amt']))
+    return stage_columns
+
+
+def detail_select(table_name: str, relation: str, columns: Sequence[str]) -> Tuple[str, List[str]]:
+    """
+    写入明细表的查询：按保存时的规则改名，只保留目标表中存在的列
+
+    Returns:
+        (SELECT 语句, 写入的列)
+    """
+    return renamed_select(relation, columns, SAVE_RENAMES, keep=get_table_columns(table_name, ['id']))
+
+
+def profit_select(relation: str, columns: Sequence[str], renames: Dict[str, str]) -> str:
+    """
+    读回利润表合并需要的列（列名保持不变，由 convert_*_to_profit_task 改名）
+
+    merge_profit_data_task 只保留利润表的列，这里按改名后的列名只读取声明的利润表列（与 load_profit_data_task 相同）
+    和分拆结果列。
+    """
+    keep = set(SOURCE_COLUMNS['fact_profit_bd']) | set(ALLOCATION_COLUMNS)
+    selected = [
+        col for col in columns
+        if col != 'date' and renames.get(col, col) in keep
+    ]
+    return f"SELECT {', '.join(quote(col) for col in selected)} FROM {relation}"
+
+
+def _read_back(conn, sql: str) -> pd.DataFrame:
+    df = fetch_dataframe(conn, sql)
+    df['acct_period'] = pd.to_datetime(df['acct_period'])
+    return apply_schema(df)
+
+
+@task(name="allocate_revenue_in_db", log_prints=True)
+def allocate_revenue_in_db_task(
+    date_range: pd.DatetimeIndex,
+    df_upload_merge_all: pd.DataFrame,
+    df_org: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    在数据库中生成并保存收入明细（对应 pandas 路径从 load_revenue_data 到 save_revenue_detail 的全部步骤）
+
+    Args:
+        date_range: 日期范围
+        df_upload_merge_all: 业务线比例数据
+        df_org: 组织架构数据
+
+    Returns:
+        能源硬件调整后、公摊比例还原前的收入数据（与 update_energy_hardware_task 的结果相同，
+        只包含利润表使用的列），供 convert_revenue_to_profit_task 使用
+    """
+    try:
+        with db_connection_slot():
+            conn = get_engine().raw_connection()
+            try:
+                # 暂存表在建立临时表之前准备好，DDL、查询和写入共用这一个连接
+                with partition_staging(conn, 'fact_bus_revenue', 'acct_period', date_range) as staged:
+                    cur = conn.cursor()
+                    stage_columns, final_sql = prepare_revenue(cur, date_range, df_upload_merge_all, df_org)
+                    validate_rates_sql(cur, REVENUE_STAGE, ['source_no', 'unique_lvl', 'prim_subj'], '收入')
+                    # 写入明细时会提交事务（临时表随之删除），先读回利润表需要的数据
+                    df = _read_back(conn, profit_select(
+                        REVENUE_STAGE, stage_columns, {'acct_period': 'date'}))
+
+                    insert_sql, insert_columns = detail_select(
+                        'fact_bus_revenue', f"({final_sql}) f", stage_columns)
+                    written = replace_date_range_from_query(
+                        conn, 'fact_bus_revenue', 'acct_period', insert_columns, insert_sql, (),
+                        date_range, staged)
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+        print(f"保存收入明细到数据库完成，共 {written} 条记录；读回利润表格式数据 {len(df)} 条")
+        return df
+    except Exception as e:
+        print(f"数据库内生成收入明细时发生错误: {str(e)}")
+        raise
+
+
+@task(name="allocate_expense_in_db", log_prints=True)
+def allocate_expense_in_db_task(
+    date_range: pd.DatetimeIndex,
+    df_upload_merge_all: pd.DataFrame,
+    df_org: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    在数据库中生成并保存费用明细（对应 pandas 路径从 load_expense_data 到 save_expense_detail 的全部步骤）
+
+    Args:
+        date_range: 日期范围
+        df_upload_merge_all: 业务线比例数据
+        df_org: 组织架构数据
+
+    Returns:
+        公摊比例还原后的费用数据（与 apply_shared_rate_to_expense_task 的结果相同，
+        只包含利润表使用的列），供 convert_expense_to_profit_task 使用
+    """
+    try:
+        with db_connection_slot():
+            conn = get_engine().raw_connection()
+            try:
+                # 暂存表在建立临时表之前准备好，DDL、查询和写入共用这一个连接
+                with partition_staging(conn, 'fact_bus_expense', 'acct_period', date_range) as staged:
+                    cur = conn.cursor()
+                    stage_columns = prepare_expense(cur, date_range, df_upload_merge_all, df_org)
+                    validate_rates_sql(cur, EXPENSE_STAGE, ['source_no', 'unique_lvl'], '费用')
+                    # 写入明细时会提交事务（临时表随之删除），先读回利润表需要的数据
+                    df = _read_back(conn, profit_select(
+                        EXPENSE_FINAL, stage_columns, {'exp_amt': 'mo_amt', 'acct_period': 'date'}))
+
+                    insert_sql, insert_columns = detail_select(
+                        'fact_bus_expense', EXPENSE_FINAL, stage_columns)
+                    written = replace_date_range_from_query(
+                        conn, 'fact_bus_expense', 'acct_period', insert_columns, insert_sql, (),
+                        date_range, staged)
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+        print(f"保存费用明细到数据库完成，共 {written} 条记录；读回利润表格式数据 {len(df)} 条")
+        return df
+    except Exception as e:
+        print(f"数据库内生成费用明细时发生错误: {str(e)}")
+        raise
@@ -1,11 +1,16 @@
 """费用明细生成相关 Tasks"""
-from mypackage.utilities import connect_to_db, val_dist, delete_data_add_data_by_DateRange
 from prefect import task
 import pandas as pd
 import sys
 import os
 # 添加根目录到路径（prefect目录）
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.bulk_writer import delete_data_add_data_by_DateRange
+from utils.validation import validate_rates
+from utils.db_utils import load_period_data, db_connection_slot
+from utils.allocation import allocate_auto, allocate_gap, allocate_manual, split_rows
+from utils.frame_schema import SOURCE_COLUMNS, assign_where, concat_aligned
+from utils.ref_cache import get_reference_table
 
 
 @task(name="load_expense_data", log_prints=True)
@@ -20,23 +25,13 @@ def load_expense_data_task(date_range: pd.DatetimeIndex) -> pd.DataFrame:
         费用数据 DataFrame
     """
     try:
-        conn, cur = connect_to_db()
-        cur.execute(
-            "SELECT * FROM fact_expense WHERE unique_lvl NOT LIKE '%无归属%'")
-        df_expense = pd.DataFrame(cur.fetchall(), columns=[
-                                  desc[0] for desc in cur.description])
-
-        # 删除最后更新时间
-        if 'last_modified' in df_expense.columns:
-            df_expense = df_expense.drop(['last_modified'], axis=1)
-
-        # 按照日期筛选数据范围
-        df_expense['acct_period'] = pd.to_datetime(df_expense['acct_period'])
-        df_expense = df_expense[df_expense['acct_period'].isin(date_range)]
+        # 日期范围和过滤条件在 SQL 中完成，只读取声明的列
+        df_expense = load_period_data(
+            'fact_expense', 'acct_period', date_range, SOURCE_COLUMNS['fact_expense'],
+            where="unique_lvl NOT LIKE '%%无归属%%'"
+        )
 
         print(f"加载费用数据完成，共 {len(df_expense)} 条记录")
-        cur.close()
-        conn.close()
         return df_expense
     except Exception as e:
         print(f"加载费用数据时发生错误: {str(e)}")
@@ -59,29 +54,10 @@ def process_gap_expense_task(
         处理后的公摊费用数据
     """
     try:
-        df_expense_bus = df_upload_merge_all[df_upload_merge_all['class'] == '费用']
-
-        # 找出比率不完整的费用
-        df_expense_bus_gap_rate = df_expense_bus.groupby(
-            ['source_no']).agg({'rate': 'sum'}).reset_index()
-        df_expense_bus_gap_rate = df_expense_bus_gap_rate[df_expense_bus_gap_rate['rate'] < 1]
-        df_expense_bus_gap_rate['rate'] = 1 - \
-            df_expense_bus_gap_rate['rate'].astype('float')
-        df_expense_bus_gap_list = df_expense_bus_gap_rate['source_no'].tolist()
-
-        # 处理公摊费用
-        df_expense_bus_gap = df_expense[df_expense['source_no'].isin(df_expense_bus_gap_list)].merge(
-            df_expense_bus_gap_rate[['source_no', 'rate']],
-            on=['source_no'],
-            how='left'
+        # 比率不完整（Σrate < 1）的费用，缺口部分归入公摊
+        df_expense_bus_gap = allocate_gap(
+            df_expense, split_rows(df_upload_merge_all, '费用'), ['exp_amt']
         )
-        df_expense_bus_gap = df_expense_bus_gap.astype(
-            {'rate': 'float', 'exp_amt': 'float'})
-        df_expense_bus_gap['exp_amt'] = df_expense_bus_gap['exp_amt'] * \
-            df_expense_bus_gap['rate']
-        df_expense_bus_gap['bus_line'] = '无'
-        df_expense_bus_gap['source_lvl'] = df_expense_bus_gap['unique_lvl']
-        df_expense_bus_gap['category'] = '公摊费用'
 
         print(f"处理公摊费用完成，共 {len(df_expense_bus_gap)} 条记录")
         return df_expense_bus_gap
@@ -106,23 +82,9 @@ def process_manual_expense_task(
         处理后的手工分拆费用数据
     """
     try:
-        df_expense_bus = df_upload_merge_all[df_upload_merge_all['class'] == '费用']
-        df_expense_bus_list = df_expense_bus['source_no'].tolist()
-
-        df_expense_bus_hand = df_expense[df_expense['source_no'].isin(df_expense_bus_list)].merge(
-            df_expense_bus[['source_no', 'bus_line',
-                            'unique_lvl', 'category', 'rate']],
-            on=['source_no'],
-            how='left'
-        )
-        df_expense_bus_hand = df_expense_bus_hand.astype(
-            {'rate': 'float', 'exp_amt': 'float'})
-        df_expense_bus_hand = df_expense_bus_hand.rename(
-            columns={'unique_lvl_x': 'source_lvl',
-                     'unique_lvl_y': 'unique_lvl'}
+        df_expense_bus_hand = allocate_manual(
+            df_expense, split_rows(df_upload_merge_all, '费用'), ['exp_amt']
         )
-        df_expense_bus_hand['exp_amt'] = df_expense_bus_hand['exp_amt'] * \
-            df_expense_bus_hand['rate']
 
         print(f"处理手工分拆费用数据完成，共 {len(df_expense_bus_hand)} 条记录")
         return df_expense_bus_hand
@@ -149,19 +111,10 @@ def process_auto_expense_task(
         处理后的自动归属费用数据
     """
     try:
-        df_expense_bus = df_upload_merge_all[df_upload_merge_all['class'] == '费用']
-        df_expense_bus_list = df_expense_bus['source_no'].tolist()
-
-        # 不位于分拆表中的数据
-        df_expense_bus_auto = df_expense[~df_expense['source_no'].isin(df_expense_bus_list)].merge(
-            df_org[['unique_lvl', 'bus_line']],
-            on=['unique_lvl'],
-            how='left'
-        )
-        df_expense_bus_auto['source_lvl'] = df_expense_bus_auto['unique_lvl']
-        df_expense_bus_auto['rate'] = 1
-        df_expense_bus_auto['category'] = df_expense_bus_auto['bus_line'].apply(
-            lambda x: '公摊费用' if x == '无' else '直接归属'
+        # 不位于分拆表中的数据，业务线为"无"的归入公摊费用
+        df_expense_bus_auto = allocate_auto(
+            df_expense, df_org, split=split_rows(df_upload_merge_all, '费用'),
+            none_category='公摊费用'
         )
 
         print(f"处理自动归属费用数据完成，共 {len(df_expense_bus_auto)} 条记录")
@@ -189,7 +142,7 @@ def merge_expense_data_task(
         合并后的费用数据
     """
     try:
-        df_expense_bus_all = pd.concat(
+        df_expense_bus_all = concat_aligned(
             [df_expense_bus_hand, df_expense_bus_auto, df_expense_bus_gap],
             ignore_index=True
         )
@@ -225,7 +178,7 @@ def update_energy_hardware_expense_task(df: pd.DataFrame) -> pd.DataFrame:
         rows_to_change = mask.sum()
         if rows_to_change > 0:
             print(f"更新能源硬件为能源运营，共 {rows_to_change} 条记录")
-            df.loc[mask, 'bus_line'] = '能源运营'
+            df['bus_line'] = assign_where(df['bus_line'], mask, '能源运营')
 
         return df
     except Exception as e:
@@ -234,18 +187,20 @@ def update_energy_hardware_expense_task(df: pd.DataFrame) -> pd.DataFrame:
 
 
 @task(name="validate_expense_rate", log_prints=True)
-def validate_expense_rate_task(df: pd.DataFrame) -> None:
+def validate_expense_rate_task(df: pd.DataFrame) -> pd.DataFrame:
     """
-    验证费用数据比率
+    验证费用数据比率：各分组 rate 合计应为 1
 
     Args:
         df: 费用数据
+
+    Returns:
+        rate 合计不为 1 的分组（为空表示全部通过）
     """
     try:
-        col_agg_name = ['source_no', 'unique_lvl']
-        col_sum_name = 'rate'
-        val_dist(df, col_agg_name, col_sum_name)
-        print("费用数据比率验证完成")
+        violations = validate_rates(df, ['source_no', 'unique_lvl'], '费用')
+        print(f"费用数据比率验证完成，不满足的分组 {len(violations)} 组")
+        return violations
     except Exception as e:
         print(f"验证费用数据比率时发生错误: {str(e)}")
         raise
@@ -267,16 +222,11 @@ def apply_shared_rate_to_expense_task(
         应用公摊比例后的费用数据
     """
     try:
-        conn, cur = connect_to_db()
-        cur.execute("SELECT * FROM fact_bus_shared_rate")
-        df_shared_rate = pd.DataFrame(cur.fetchall(), columns=[
-                                      desc[0] for desc in cur.description])
+        df_shared_rate = get_reference_table('fact_bus_shared_rate')
         df_shared_rate = df_shared_rate.drop(
             ['id'], axis=1).rename(columns={'date': 'acct_period'})
         df_shared_rate['acct_period'] = pd.to_datetime(
             df_shared_rate['acct_period'])
-        cur.close()
-        conn.close()
 
         # 分离业务线为"无"的数据和其他数据
         df_wu = df_expense_bus_all[df_expense_bus_all['bus_line'] == '无'].drop(
@@ -296,7 +246,7 @@ def apply_shared_rate_to_expense_task(
         df_wu['exp_amt'] = df_wu['exp_amt'].astype('float')
         df_wu['exp_amt'] = df_wu['exp_amt'] * df_wu['rate']
 
-        df = pd.concat([df_wu, df_you], ignore_index=True)
+        df = concat_aligned([df_wu, df_you], ignore_index=True)
         df['acct_period'] = pd.to_datetime(df['acct_period'])
 
         print(f"应用公摊比例到费用数据完成，共 {len(df)} 条记录")
@@ -328,9 +278,10 @@ def save_expense_detail_task(
             df = df.drop(['id'], axis=1)
         df_date_column = 'acct_period'
 
-        delete_data_add_data_by_DateRange(
-            table_name, date_column, df, df_date_column, date_range
-        )
+        with db_connection_slot():
+            delete_data_add_data_by_DateRange(
+                table_name, date_column, df, df_date_column, date_range
+            )
         print(f"保存费用明细到数据库完成，共 {len(df)} 条记录")
     except Exception as e:
         print(f"保存费用明细到数据库时发生错误: {str(e)}")
@@ -1,11 +1,20 @@
 """利润明细生成相关 Tasks"""
-from mypackage.utilities import connect_to_db, val_dist, delete_data_add_data_by_DateRange, add_data
+from mypackage.utilities import connect_to_db
 from prefect import task
+from typing import Optional
 import pandas as pd
 import sys
 import os
 # 添加根目录到路径（prefect目录）
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.bulk_writer import delete_data_add_data_by_DateRange
+from utils.validation import validate_rates
+from utils.db_utils import (
+    load_period_data, fetch_dataframe, db_connection_slot, get_numeric_scale, round_to_scale
+)
+from utils.allocation import allocate_auto, allocate_manual, split_rows
+from utils.frame_schema import SOURCE_COLUMNS, assign_where, concat_aligned, replace_values
+from utils.ref_cache import get_reference_table
 
 
 @task(name="load_profit_data", log_prints=True)
@@ -20,25 +29,14 @@ def load_profit_data_task(date_range: pd.DatetimeIndex) -> pd.DataFrame:
         利润数据 DataFrame
     """
     try:
-        conn, cur = connect_to_db()
-        cur.execute(
-            "SELECT * FROM fact_profit_bd WHERE prim_subj NOT IN "
-            "('营业收入','营业成本','管理费用','销售费用','财务费用','研发费用','营业利润','净利润','利润总额')"
+        # 日期范围和过滤条件在 SQL 中完成，只读取声明的列
+        df_profit = load_period_data(
+            'fact_profit_bd', 'date', date_range, SOURCE_COLUMNS['fact_profit_bd'],
+            where="prim_subj NOT IN ('营业收入','营业成本','管理费用','销售费用','财务费用',"
+                  "'研发费用','营业利润','净利润','利润总额')"
         )
-        df_profit = pd.DataFrame(cur.fetchall(), columns=[
-                                 desc[0] for desc in cur.description])
-
-        # 删除最后更新时间
-        if 'last_modified' in df_profit.columns:
-            df_profit = df_profit.drop(['last_modified'], axis=1)
-
-        # 按照日期筛选数据范围
-        df_profit['date'] = pd.to_datetime(df_profit['date'])
-        df_profit = df_profit[df_profit['date'].isin(date_range)]
 
         print(f"加载利润数据完成，共 {len(df_profit)} 条记录")
-        cur.close()
-        conn.close()
         return df_profit
     except Exception as e:
         print(f"加载利润数据时发生错误: {str(e)}")
@@ -61,20 +59,11 @@ def process_manual_profit_task(
         处理后的手工分拆利润数据
     """
     try:
-        df_profit_bus = df_upload_merge_all[df_upload_merge_all['class'] == '其他']
-        df_profit_bus_list = df_profit_bus['source_no'].tolist()
-        df_profit_bus.loc[:, 'source_lvl'] = df_profit_bus['unique_lvl']
-
-        df_profit_bus_hand = df_profit[df_profit['source_no'].isin(df_profit_bus_list)].merge(
-            df_profit_bus[['source_no', 'bus_line',
-                           'source_lvl', 'category', 'rate']],
-            on=['source_no'],
-            how='left'
+        # 利润表口径：分拆表的 unique_lvl 作为 source_lvl，明细保留原 unique_lvl
+        df_profit_bus_hand = allocate_manual(
+            df_profit, split_rows(df_upload_merge_all, '其他'), ['mo_amt'],
+            split_level_as='source_lvl'
         )
-        df_profit_bus_hand = df_profit_bus_hand.astype(
-            {'rate': 'float', 'mo_amt': 'float'})
-        df_profit_bus_hand['mo_amt'] = df_profit_bus_hand['mo_amt'] * \
-            df_profit_bus_hand['rate']
         df_profit_bus_hand = df_profit_bus_hand.drop(
             ['id'], axis=1, errors='ignore')
 
@@ -112,17 +101,12 @@ def process_auto_profit_task(
         ]['source_no'].tolist()
 
         # 不位于分拆表中的数据
-        df_profit_bus_auto = df_profit[
+        mask = (
             ((~df_profit['source_no'].isin(df_profit_bus_list)) &
              (~df_profit['unique_lvl'].str.contains('无归属', na=False))) |
             (df_profit['source_no'].isin(df_profit_bus_nan_list))
-        ].merge(df_org[['unique_lvl', 'bus_line']], on=['unique_lvl'], how='left')
-
-        df_profit_bus_auto['source_lvl'] = df_profit_bus_auto['unique_lvl']
-        df_profit_bus_auto['rate'] = 1
-        df_profit_bus_auto['category'] = df_profit_bus_auto['bus_line'].apply(
-            lambda x: '无' if x == '无' else '直接归属'
         )
+        df_profit_bus_auto = allocate_auto(df_profit, df_org, mask=mask)
 
         print(f"处理自动归属利润数据完成，共 {len(df_profit_bus_auto)} 条记录")
         return df_profit_bus_auto
@@ -187,12 +171,15 @@ def load_offset_data_task(date_range: pd.DatetimeIndex) -> pd.DataFrame:
         抵销数数据 DataFrame
     """
     try:
-        conn, cur = connect_to_db()
-        cur.execute(
-            "SELECT * FROM fact_offset WHERE subj_name NOT IN ('营业利润','净利润','利润总额')"
-        )
-        df_offset = pd.DataFrame(cur.fetchall(), columns=[
-                                 desc[0] for desc in cur.description])
+        with db_connection_slot():
+            conn, cur = connect_to_db()
+            try:
+                df_offset = fetch_dataframe(conn,
+                    "SELECT * FROM fact_offset WHERE subj_name NOT IN ('营业利润','净利润','利润总额')"
+                )
+            finally:
+                cur.close()
+                conn.close()
         df_offset['date'] = pd.to_datetime(df_offset['date'])
 
         # 关键修改：获取从年初到当前月份的所有数据，用于计算 diff()
@@ -257,21 +244,19 @@ def load_offset_data_task(date_range: pd.DatetimeIndex) -> pd.DataFrame:
             'source_no', 'unique_lvl', 'acct_period', 'prim_subj', 'amt', 'class', 'fin_con', 'fin_ind']]
 
         # 使用 delete_data_add_data_by_DateRange 保存，先删除当前月份的数据，再插入新数据
-        from mypackage.utilities import delete_data_add_data_by_DateRange
-        delete_data_add_data_by_DateRange(
-            table_name='fact_offset_by_month',
-            date_column='acct_period',
-            df=df_offset_to_save,
-            df_date_column='acct_period',
-            date_range=date_range
-        )
+        with db_connection_slot():
+            delete_data_add_data_by_DateRange(
+                table_name='fact_offset_by_month',
+                date_column='acct_period',
+                df=df_offset_to_save,
+                df_date_column='acct_period',
+                date_range=date_range
+            )
         print(
             f"抵销数数据已保存到 fact_offset_by_month 表，共 {len(df_offset_to_save)} 条记录")
 
         print(
             f"加载抵销数数据完成，共 {len(df_offset)} 条记录（计算时使用了从 {year}年1月到{max_date.strftime('%Y-%m')}的数据）")
-        cur.close()
-        conn.close()
         return df_offset
     except Exception as e:
         print(f"加载抵销数数据时发生错误: {str(e)}")
@@ -282,7 +267,8 @@ def load_offset_data_task(date_range: pd.DatetimeIndex) -> pd.DataFrame:
 def merge_profit_data_task(
     df_revenue_bus_all_to_profit: pd.DataFrame,
     df_expense_bus_all_to_profit: pd.DataFrame,
-    df_profit_bus_all: pd.DataFrame,
+    df_profit_bus_hand: pd.DataFrame,
+    df_profit_bus_auto: pd.DataFrame,
     df_offset: pd.DataFrame
 ) -> pd.DataFrame:
     """
@@ -291,18 +277,20 @@ def merge_profit_data_task(
     Args:
         df_revenue_bus_all_to_profit: 收入数据（利润表格式）
         df_expense_bus_all_to_profit: 费用数据（利润表格式）
-        df_profit_bus_all: 利润数据
+        df_profit_bus_hand: 手工分拆利润数据
+        df_profit_bus_auto: 自动归属利润数据
         df_offset: 抵销数数据
 
     Returns:
         合并后的利润数据
     """
     try:
-        # 获取利润表的列
+        # 合并手工分拆、自动归属的利润数据，并获取利润表的列
+        df_profit_bus_all = concat_aligned([df_profit_bus_hand, df_profit_bus_auto], ignore_index=True)
         profit_columns = df_profit_bus_all.columns.tolist()
 
         # 合并所有数据
-        df_profit_bus_all_to_profit = pd.concat(
+        df_profit_bus_all_to_profit = concat_aligned(
             [
                 df_revenue_bus_all_to_profit,
                 df_expense_bus_all_to_profit,
@@ -321,9 +309,9 @@ def merge_profit_data_task(
         ]
 
         # 无归属-其他调整-待摊事项统一调整为新国都本部-公共部门-公共部门
-        df_profit_bus_all_to_profit['unique_lvl'] = df_profit_bus_all_to_profit['unique_lvl'].replace(
-            '无归属-其他调整-待摊事项',
-            '新国都本部-公共部门-公共部门'
+        df_profit_bus_all_to_profit['unique_lvl'] = replace_values(
+            df_profit_bus_all_to_profit['unique_lvl'],
+            {'无归属-其他调整-待摊事项': '新国都本部-公共部门-公共部门'}
         )
 
         print(f"合并利润数据完成，共 {len(df_profit_bus_all_to_profit)} 条记录")
@@ -334,18 +322,20 @@ def merge_profit_data_task(
 
 
 @task(name="validate_profit_rate", log_prints=True)
-def validate_profit_rate_task(df: pd.DataFrame) -> None:
+def validate_profit_rate_task(df: pd.DataFrame) -> pd.DataFrame:
     """
-    验证利润数据比率
+    验证利润数据比率：各分组 rate 合计应为 1
 
     Args:
         df: 利润数据
+
+    Returns:
+        rate 合计不为 1 的分组（为空表示全部通过）
     """
     try:
-        col_agg_name = ['source_no', 'unique_lvl', 'prim_subj']
-        col_sum_name = 'rate'
-        val_dist(df, col_agg_name, col_sum_name)
-        print("利润数据比率验证完成")
+        violations = validate_rates(df, ['source_no', 'unique_lvl', 'prim_subj'], '利润')
+        print(f"利润数据比率验证完成，不满足的分组 {len(violations)} 组")
+        return violations
     except Exception as e:
         print(f"验证利润数据比率时发生错误: {str(e)}")
         raise
@@ -354,14 +344,18 @@ def validate_profit_rate_task(df: pd.DataFrame) -> None:
 @task(name="save_profit_detail", log_prints=True)
 def save_profit_detail_task(
     df: pd.DataFrame,
-    date_range: pd.DatetimeIndex
+    date_range: pd.DatetimeIndex,
+    df_shared_profit: Optional[pd.DataFrame] = None
 ) -> None:
     """
     保存利润明细到数据库
 
+    利润明细和公摊利润（process_shared_profit_task 的结果）合并后一次写入。
+
     Args:
         df: 利润数据
         date_range: 日期范围
+        df_shared_profit: 公摊利润数据（已是数据库列名）
     """
     try:
         table_name = 'fact_bus_profit_bd'
@@ -371,213 +365,139 @@ def save_profit_detail_task(
         # 删除 id 列（如果存在），让数据库自动生成，避免主键冲突和 NULL 值问题
         if 'id' in df.columns:
             df = df.drop(['id'], axis=1)
+        detail_count = len(df)
+        if df_shared_profit is not None and len(df_shared_profit) > 0:
+            df = concat_aligned(
+                [df, df_shared_profit.reindex(columns=df.columns)], ignore_index=True)
         df_date_column = 'date'
 
-        delete_data_add_data_by_DateRange(
-            table_name, date_column, df, df_date_column, date_range
-        )
-        print(f"保存利润明细到数据库完成，共 {len(df)} 条记录")
+        with db_connection_slot():
+            delete_data_add_data_by_DateRange(
+                table_name, date_column, df, df_date_column, date_range
+            )
+        print(f"保存利润明细到数据库完成，共 {len(df)} 条记录"
+              f"（明细 {detail_count} 条，公摊利润 {len(df) - detail_count} 条）")
     except Exception as e:
         print(f"保存利润明细到数据库时发生错误: {str(e)}")
         raise
 
 
+# 公摊利润的三类数据：{类型: (分摊 fin_ind, 冲销 fin_ind, category)}
+SHARED_PROFIT_KINDS = {
+    '公摊': ('公摊损益分摊', '公摊损益冲销', '公摊费用'),
+    '预提-综合比例': ('预提损益分摊', '预提损益冲销', '预提费用'),
+    '预提-特殊比例': ('预提损益分摊', '预提损益冲销', '预提费用'),
+}
+
+
 @task(name="process_shared_profit", log_prints=True)
 def process_shared_profit_task(
-    date_range: pd.DatetimeIndex
-) -> None:
+    df: pd.DataFrame,
+    df_upload_merge_all: pd.DataFrame
+) -> pd.DataFrame:
     """
     处理业务线为"无"的利润数据分摊
 
+    直接使用内存中的利润明细（merge_profit_data_task 的结果），三类数据一次计算：
+    - 公摊：不在预提分拆表中的数据，按当月公摊比例分摊
+    - 预提-综合比例：按当月公摊比例分摊
+    - 预提-特殊比例：按分拆表中该 source_no 的比例分摊
+    每条分摊记录同时生成一条业务线为"无"的冲销记录。
+    原实现从 fact_bus_profit_bd 读回已写入的明细计算，金额为数据库按列精度舍入后的值；
+    这里先把明细金额按 fact_bus_profit_bd.mo_amt 的小数位数舍入，汇总结果与读回计算一致。
+
     Args:
-        date_range: 日期范围
+        df: 利润数据（unique_lvl 为二次分配层级，source_lvl 为原层级）
+        df_upload_merge_all: 业务线比例数据
+
+    Returns:
+        公摊利润数据（已转换为数据库列名），由 save_profit_detail_task 与明细一起写入
     """
     try:
-        # 在 task 内部获取业务线比例数据（避免 DataFrame 序列化问题）
-        # 直接调用数据准备 tasks，避免导入 flow
-        from .data_preparation_tasks import calculate_person_weight_task
-        df_upload_merge_all, _ = calculate_person_weight_task()
-
-        conn, cur = connect_to_db()
-
-        # 获取预提类型为综合比例的其他
-        df_profit_bus_pro_list_z = df_upload_merge_all[
-            df_upload_merge_all['class'] == '预提-综合比例'
-        ]
-        df_profit_bus_pro_list_z = df_profit_bus_pro_list_z['source_no'].tolist(
-        )
-
-        # 获取预提类型为特殊比例的其他
-        df_profit_bus_pro_list_t = df_upload_merge_all[
+        list_z = df_upload_merge_all.loc[
+            df_upload_merge_all['class'] == '预提-综合比例', 'source_no']
+        df_rate_t = df_upload_merge_all[
             df_upload_merge_all['class'] == '预提-特殊比例'
-        ]
-        df_profit_bus_pro_list_t = df_profit_bus_pro_list_t['source_no'].tolist(
-        )
+        ][['source_no', 'bus_line', 'rate']]
 
         # 获取公摊比例
-        print("正在获取公摊比例数据...")
-        cur.execute("SELECT * FROM fact_bus_shared_rate")
-        df_shared_rate = pd.DataFrame(cur.fetchall(), columns=[
-                                      desc[0] for desc in cur.description])
-        df_shared_rate = df_shared_rate.drop(['id'], axis=1)
-
-        # 分摊利润表 - 只查询日期范围内的数据以提高性能
-        print(f"正在查询利润表数据（日期范围：{date_range.min()} 到 {date_range.max()}）...")
-        min_date = date_range.min()
-        max_date = date_range.max()
-        cur.execute("""
-            SELECT * FROM fact_bus_profit_bd 
-            WHERE date >= %s AND date <= %s
-        """, (min_date, max_date))
-        df_all = pd.DataFrame(cur.fetchall(), columns=[
-                              desc[0] for desc in cur.description])
-        print(f"查询到 {len(df_all)} 条利润数据")
-        df_all = df_all.rename(
-            columns={'unique_lvl': 'source_lvl', 'sec_dist_lvl': 'unique_lvl'})
+        df_shared_rate = get_reference_table('fact_bus_shared_rate')
+        df_shared_rate = df_shared_rate[['date', 'bus_line', 'rate']].assign(
+            date=pd.to_datetime(df_shared_rate['date']))
 
         # 定义逆透视的行标签列
         df_index = ['date', 'year', 'source_no',
                     'unique_lvl', 'source_lvl', 'prim_subj', 'mo_amt']
         df_groupby = df_index[:-1]
 
-        # 计算非预提费用的，无的净利润
-        df_shared = df_all[
-            (df_all['bus_line'] == '无') &
-            (~df_all['source_no'].isin(
-                df_profit_bus_pro_list_z + df_profit_bus_pro_list_t))
-        ]
-
-        if len(df_shared) > 0:
-            df_shared_profit = df_shared[df_index].groupby(
-                df_groupby).sum().reset_index()
-            df_shared_profit = df_shared_profit.merge(
-                df_shared_rate, how='left', on='date')
-
-            df_shared_profit['mo_amt'] = df_shared_profit['mo_amt'].astype(
-                float)
-            df_shared_profit['mo_amt'] = df_shared_profit['mo_amt'] * \
-                df_shared_profit['rate']
-            df_shared_profit['fin_con'] = '业报调整'
-            df_shared_profit['fin_ind'] = '公摊损益分摊'
-            df_shared_profit['category'] = '公摊费用'
-            df_shared_profit = df_shared_profit[
-                (df_shared_profit['mo_amt'] != 0) & (
-                    df_shared_profit['mo_amt'].notnull())
-            ]
-
-            df_shared_profit_adj = df_shared_profit.copy()
-            df_shared_profit_adj['mo_amt'] = df_shared_profit_adj['mo_amt'] * -1
-            df_shared_profit_adj['bus_line'] = '无'
-            df_shared_profit_adj['fin_ind'] = '公摊损益冲销'
-
-            df_shared_profit_all = pd.concat(
-                [df_shared_profit_adj, df_shared_profit], ignore_index=True)
-            df_shared_profit_all = df_shared_profit_all.rename(
-                columns={'unique_lvl': 'sec_dist_lvl',
-                         'source_lvl': 'unique_lvl'}
-            )
-            # 删除 id 列（如果存在），让数据库自动生成
-            if 'id' in df_shared_profit_all.columns:
-                df_shared_profit_all = df_shared_profit_all.drop(
-                    ['id'], axis=1)
-            add_data('fact_bus_profit_bd', df_shared_profit_all)
-            print(f"处理非预提费用公摊利润完成，共 {len(df_shared_profit_all)} 条记录")
-
-        # 计算预提费用的，业务线为无，适用综合比例
-        df_shared = df_all[
-            (df_all['bus_line'] == '无') &
-            (df_all['source_no'].isin(df_profit_bus_pro_list_z))
-        ]
+        # 业务线为"无"的数据按类型标记（同一 source_no 可同时属于两类预提）
+        # 金额按写入 fact_bus_profit_bd 后的精度舍入，与原来读回数据库中的明细计算一致
+        scale = get_numeric_scale('fact_bus_profit_bd', 'mo_amt')
+        df_wu = df.loc[df['bus_line'] == '无', df_index]
+        df_wu = df_wu.assign(date=pd.to_datetime(df_wu['date']),
+                             mo_amt=round_to_scale(df_wu['mo_amt'].astype(float), scale))
+        in_z = df_wu['source_no'].isin(list_z)
+        in_t = df_wu['source_no'].isin(df_rate_t['source_no'])
+        df_kinds = concat_aligned([
+            df_wu[~in_z & ~in_t].assign(kind='公摊'),
+            df_wu[in_z].assign(kind='预提-综合比例'),
+            df_wu[in_t].assign(kind='预提-特殊比例'),
+        ], ignore_index=True)
+        if df_kinds.empty:
+            print("没有需要分摊的公摊利润")
+            return pd.DataFrame()
+
+        df_shared_profit = df_kinds.groupby(
+            df_groupby + ['kind'], observed=True)['mo_amt'].sum().reset_index()
+        # 去掉浮点求和误差，与数据库中 numeric 精确求和的结果相同
+        df_shared_profit['mo_amt'] = round_to_scale(df_shared_profit['mo_amt'], scale)
+
+        # 比例表：按日期关联的两类共用公摊比例，特殊比例按 source_no 关联，统一为 (kind, key) 一次关联
+        df_rates = concat_aligned([
+            df_shared_rate.assign(kind='公摊'),
+            df_shared_rate.assign(kind='预提-综合比例'),
+            df_rate_t.assign(kind='预提-特殊比例'),
+        ], ignore_index=True)
+        df_rates['key'] = df_rates['source_no'].where(
+            df_rates['kind'] == '预提-特殊比例', df_rates['date'].dt.strftime('%Y-%m-%d'))
+        df_shared_profit['key'] = df_shared_profit['source_no'].astype(object).where(
+            df_shared_profit['kind'] == '预提-特殊比例',
+            df_shared_profit['date'].dt.strftime('%Y-%m-%d'))
+        df_shared_profit = df_shared_profit.merge(
+            df_rates[['kind', 'key', 'bus_line', 'rate']], how='left', on=['kind', 'key'])
+
+        df_shared_profit['rate'] = df_shared_profit['rate'].astype(float)
+        df_shared_profit['mo_amt'] = df_shared_profit['mo_amt'] * df_shared_profit['rate']
+        df_shared_profit = df_shared_profit[
+            (df_shared_profit['mo_amt'] != 0) & (df_shared_profit['mo_amt'].notnull())
+        ].drop(columns=['key'])
+
+        kinds = df_shared_profit['kind']
+        df_shared_profit['fin_con'] = '业报调整'
+        df_shared_profit['fin_ind'] = kinds.map({k: v[0] for k, v in SHARED_PROFIT_KINDS.items()})
+        df_shared_profit['category'] = kinds.map({k: v[2] for k, v in SHARED_PROFIT_KINDS.items()})
+        df_shared_profit['source_lvl'] = assign_where(
+            df_shared_profit['source_lvl'],
+            (kinds == '预提-特殊比例') & (df_shared_profit['source_lvl'] == '无归属-其他调整-待摊事项'),
+            '新国都本部-公共部门-公共部门'
+        )
 
-        if len(df_shared) > 0:
-            df_shared_profit = df_shared[df_index].groupby(
-                df_groupby).sum().reset_index()
-            df_shared_profit = df_shared_profit.merge(
-                df_shared_rate, how='left', on='date')
-
-            df_shared_profit['mo_amt'] = df_shared_profit['mo_amt'].astype(
-                float)
-            df_shared_profit['mo_amt'] = df_shared_profit['mo_amt'] * \
-                df_shared_profit['rate']
-            df_shared_profit['fin_con'] = '业报调整'
-            df_shared_profit['fin_ind'] = '预提损益分摊'
-            df_shared_profit['category'] = '预提费用'
-            df_shared_profit = df_shared_profit[
-                (df_shared_profit['mo_amt'] != 0) & (
-                    df_shared_profit['mo_amt'].notnull())
-            ]
-
-            df_shared_profit_adj = df_shared_profit.copy()
-            df_shared_profit_adj['mo_amt'] = df_shared_profit_adj['mo_amt'] * -1
-            df_shared_profit_adj['bus_line'] = '无'
-            df_shared_profit_adj['fin_ind'] = '预提损益冲销'
-
-            df_shared_profit_all = pd.concat(
-                [df_shared_profit_adj, df_shared_profit], ignore_index=True)
-            df_shared_profit_all = df_shared_profit_all.rename(
-                columns={'unique_lvl': 'sec_dist_lvl',
-                         'source_lvl': 'unique_lvl'}
-            )
-            # 删除 id 列（如果存在），让数据库自动生成
-            if 'id' in df_shared_profit_all.columns:
-                df_shared_profit_all = df_shared_profit_all.drop(
-                    ['id'], axis=1)
-            add_data('fact_bus_profit_bd', df_shared_profit_all)
-            print(f"处理预提费用综合比例公摊利润完成，共 {len(df_shared_profit_all)} 条记录")
-
-        # 计算预提费用的，业务线为无，适用特殊比例
-        df_shared_rate_t = df_upload_merge_all[
-            df_upload_merge_all['class'] == '预提-特殊比例'
-        ][['source_no', 'bus_line', 'rate']]
+        df_shared_profit_adj = df_shared_profit.assign(
+            mo_amt=-df_shared_profit['mo_amt'],
+            bus_line='无',
+            fin_ind=kinds.map({k: v[1] for k, v in SHARED_PROFIT_KINDS.items()})
+        )
 
-        df_shared = df_all[
-            (df_all['bus_line'] == '无') &
-            (df_all['source_no'].isin(df_profit_bus_pro_list_t))
-        ]
+        df_shared_profit_all = concat_aligned(
+            [df_shared_profit_adj, df_shared_profit], ignore_index=True)
+        for kind, count in df_shared_profit_all['kind'].value_counts().items():
+            print(f"处理{kind}公摊利润完成，共 {count} 条记录")
+        df_shared_profit_all = df_shared_profit_all.drop(columns=['kind']).rename(
+            columns={'unique_lvl': 'sec_dist_lvl', 'source_lvl': 'unique_lvl'}
+        )
 
-        if len(df_shared) > 0:
-            df_shared_profit = df_shared[df_index].groupby(
-                df_groupby).sum().reset_index()
-            df_shared_profit = df_shared_profit.merge(
-                df_shared_rate_t, how='left', on='source_no')
-
-            df_shared_profit['mo_amt'] = df_shared_profit['mo_amt'].astype(
-                float)
-            df_shared_profit['mo_amt'] = df_shared_profit['mo_amt'] * \
-                df_shared_profit['rate']
-            df_shared_profit['fin_con'] = '业报调整'
-            df_shared_profit['fin_ind'] = '预提损益分摊'
-            df_shared_profit['source_lvl'] = df_shared_profit.apply(
-                lambda x: '新国都本部-公共部门-公共部门' if x['source_lvl'] == '无归属-其他调整-待摊事项' else x['source_lvl'],
-                axis=1
-            )
-            df_shared_profit['category'] = '预提费用'
-            df_shared_profit = df_shared_profit[
-                (df_shared_profit['mo_amt'] != 0) & (
-                    df_shared_profit['mo_amt'].notnull())
-            ]
-
-            df_shared_profit_adj = df_shared_profit.copy()
-            df_shared_profit_adj['mo_amt'] = df_shared_profit_adj['mo_amt'] * -1
-            df_shared_profit_adj['bus_line'] = '无'
-            df_shared_profit_adj['fin_ind'] = '预提损益冲销'
-
-            df_shared_profit_all = pd.concat(
-                [df_shared_profit_adj, df_shared_profit], ignore_index=True)
-            df_shared_profit_all = df_shared_profit_all.rename(
-                columns={'unique_lvl': 'sec_dist_lvl',
-                         'source_lvl': 'unique_lvl'}
-            )
-            # 删除 id 列（如果存在），让数据库自动生成
-            if 'id' in df_shared_profit_all.columns:
-                df_shared_profit_all = df_shared_profit_all.drop(
-                    ['id'], axis=1)
-            add_data('fact_bus_profit_bd', df_shared_profit_all)
-            print(f"处理预提费用特殊比例公摊利润完成，共 {len(df_shared_profit_all)} 条记录")
-
-        cur.close()
-        conn.close()
-        print("处理公摊利润完成")
+        print(f"处理公摊利润完成，共 {len(df_shared_profit_all)} 条记录")
+        return df_shared_profit_all
     except Exception as e:
         print(f"处理公摊利润时发生错误: {str(e)}")
         raise
@@ -1,5 +1,4 @@
 """收入明细生成相关 Tasks"""
-from mypackage.utilities import connect_to_db, val_dist, delete_data_add_data_by_DateRange
 from prefect import task
 from typing import Tuple
 import pandas as pd
@@ -7,6 +6,25 @@ import sys
 import os
 # 添加根目录到路径（prefect目录）
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.bulk_writer import delete_data_add_data_by_DateRange
+from utils.validation import validate_rates
+from utils.db_utils import load_period_data, db_connection_slot
+from utils.allocation import allocate_auto, allocate_manual, split_rows
+from utils.frame_schema import SOURCE_COLUMNS, assign_where, concat_aligned
+from utils.ref_cache import get_reference_table
+
+# 收入明细中按比例分拆的金额列
+REVENUE_AMOUNT_COLUMNS = ['amt_tax_exc_loc', 'cost_amt',
+                          'freight_cost', 'soft_cost', 'tariff_cost']
+
+# 逆透视后金额列对应的科目名称
+REVENUE_SUBJECTS = {
+    'amt_tax_exc_loc': '营业收入',
+    'cost_amt': '营业成本',
+    'freight_cost': '营业成本',
+    'soft_cost': '营业成本',
+    'tariff_cost': '营业成本'
+}
 
 
 @task(name="load_revenue_data", log_prints=True)
@@ -21,23 +39,13 @@ def load_revenue_data_task(date_range: pd.DatetimeIndex) -> pd.DataFrame:
         收入数据 DataFrame
     """
     try:
-        conn, cur = connect_to_db()
-        cur.execute(
-            "SELECT * FROM fact_revenue WHERE unique_lvl NOT LIKE '%无归属%'")
-        df_revenue = pd.DataFrame(cur.fetchall(), columns=[
-                                  desc[0] for desc in cur.description])
-
-        # 删除最后更新时间
-        if 'last_modified' in df_revenue.columns:
-            df_revenue = df_revenue.drop(['last_modified'], axis=1)
-
-        # 按照日期筛选数据范围
-        df_revenue['acct_period'] = pd.to_datetime(df_revenue['acct_period'])
-        df_revenue = df_revenue[df_revenue['acct_period'].isin(date_range)]
+        # 日期范围和过滤条件在 SQL 中完成，只读取声明的列
+        df_revenue = load_period_data(
+            'fact_revenue', 'acct_period', date_range, SOURCE_COLUMNS['fact_revenue'],
+            where="unique_lvl NOT LIKE '%%无归属%%'"
+        )
 
         print(f"加载收入数据完成，共 {len(df_revenue)} 条记录")
-        cur.close()
-        conn.close()
         return df_revenue
     except Exception as e:
         print(f"加载收入数据时发生错误: {str(e)}")
@@ -60,35 +68,11 @@ def process_manual_revenue_task(
         处理后的手工分拆收入数据
     """
     try:
-        df_revenue_bus = df_upload_merge_all[df_upload_merge_all['class'] == '收入']
-        df_revenue_bus_list = df_revenue_bus['source_no'].tolist()
-
-        df_revenue_bus_hand = df_revenue[df_revenue['source_no'].isin(df_revenue_bus_list)].merge(
-            df_revenue_bus[['source_no', 'bus_line',
-                            'unique_lvl', 'category', 'rate']],
-            on=['source_no'],
-            how='left'
+        df_revenue_bus_hand = allocate_manual(
+            df_revenue, split_rows(df_upload_merge_all, '收入'), REVENUE_AMOUNT_COLUMNS
         )
-
-        # 应用比例
-        numeric_cols = ['amt_tax_exc_loc', 'cost_amt',
-                        'freight_cost', 'soft_cost', 'tariff_cost']
-        df_revenue_bus_hand = df_revenue_bus_hand.astype({
-            'rate': 'float',
-            **{col: 'float' for col in numeric_cols if col in df_revenue_bus_hand.columns}
-        })
-
-        for col in numeric_cols:
-            if col in df_revenue_bus_hand.columns:
-                df_revenue_bus_hand[col] = df_revenue_bus_hand[col] * \
-                    df_revenue_bus_hand['rate']
-
         df_revenue_bus_hand = df_revenue_bus_hand.drop(
             ['id'], axis=1, errors='ignore')
-        df_revenue_bus_hand = df_revenue_bus_hand.rename(
-            columns={'unique_lvl_x': 'source_lvl',
-                     'unique_lvl_y': 'unique_lvl'}
-        )
 
         print(f"处理手工分拆收入数据完成，共 {len(df_revenue_bus_hand)} 条记录")
         return df_revenue_bus_hand
@@ -115,19 +99,9 @@ def process_auto_revenue_task(
         处理后的自动归属收入数据
     """
     try:
-        df_revenue_bus = df_upload_merge_all[df_upload_merge_all['class'] == '收入']
-        df_revenue_bus_list = df_revenue_bus['source_no'].tolist()
-
         # 不位于分拆表中的数据
-        df_revenue_bus_auto = df_revenue[~df_revenue['source_no'].isin(df_revenue_bus_list)].merge(
-            df_org[['unique_lvl', 'bus_line']],
-            on=['unique_lvl'],
-            how='left'
-        )
-        df_revenue_bus_auto['source_lvl'] = df_revenue_bus_auto['unique_lvl']
-        df_revenue_bus_auto['rate'] = 1
-        df_revenue_bus_auto['category'] = df_revenue_bus_auto['bus_line'].apply(
-            lambda x: '无' if x == '无' else '直接归属'
+        df_revenue_bus_auto = allocate_auto(
+            df_revenue, df_org, split=split_rows(df_upload_merge_all, '收入')
         )
 
         print(f"处理自动归属收入数据完成，共 {len(df_revenue_bus_auto)} 条记录")
@@ -153,7 +127,7 @@ def merge_revenue_data_task(
         合并后的收入数据
     """
     try:
-        df_revenue_bus_all = pd.concat(
+        df_revenue_bus_all = concat_aligned(
             [df_revenue_bus_hand, df_revenue_bus_auto], ignore_index=True)
         print(f"合并收入数据完成，共 {len(df_revenue_bus_all)} 条记录")
         return df_revenue_bus_all
@@ -175,8 +149,7 @@ def pivot_revenue_data_task(df_revenue_bus_all: pd.DataFrame) -> pd.DataFrame:
     """
     try:
         # 去除需要逆透视的列，并更新透视后的列名
-        columns_to_remove = ['amt_tax_exc_loc', 'cost_amt',
-                             'freight_cost', 'soft_cost', 'tariff_cost']
+        columns_to_remove = REVENUE_AMOUNT_COLUMNS
         remaining_columns = [
             col for col in df_revenue_bus_all.columns if col not in columns_to_remove]
 
@@ -190,13 +163,8 @@ def pivot_revenue_data_task(df_revenue_bus_all: pd.DataFrame) -> pd.DataFrame:
         )
 
         # 替换科目名称
-        df_revenue_bus_all_to_profit['prim_subj'] = df_revenue_bus_all_to_profit['prim_subj'].replace({
-            'amt_tax_exc_loc': '营业收入',
-            'cost_amt': '营业成本',
-            'freight_cost': '营业成本',
-            'soft_cost': '营业成本',
-            'tariff_cost': '营业成本'
-        })
+        df_revenue_bus_all_to_profit['prim_subj'] = df_revenue_bus_all_to_profit['prim_subj'].replace(
+            REVENUE_SUBJECTS)
 
         # 去除透视中出现的空值
         df_revenue_bus_all_to_profit = df_revenue_bus_all_to_profit[
@@ -232,7 +200,7 @@ def update_energy_hardware_task(df: pd.DataFrame) -> pd.DataFrame:
         rows_to_change = mask.sum()
         if rows_to_change > 0:
             print(f"更新能源硬件为能源运营，共 {rows_to_change} 条记录")
-            df.loc[mask, 'bus_line'] = '能源运营'
+            df['bus_line'] = assign_where(df['bus_line'], mask, '能源运营')
 
         return df
     except Exception as e:
@@ -241,18 +209,20 @@ def update_energy_hardware_task(df: pd.DataFrame) -> pd.DataFrame:
 
 
 @task(name="validate_revenue_rate", log_prints=True)
-def validate_revenue_rate_task(df: pd.DataFrame) -> None:
+def validate_revenue_rate_task(df: pd.DataFrame) -> pd.DataFrame:
     """
-    验证收入数据比率
+    验证收入数据比率：各分组 rate 合计应为 1
 
     Args:
         df: 收入数据
+
+    Returns:
+        rate 合计不为 1 的分组（为空表示全部通过）
     """
     try:
-        col_agg_name = ['source_no', 'unique_lvl', 'prim_subj']
-        col_sum_name = 'rate'
-        val_dist(df, col_agg_name, col_sum_name)
-        print("收入数据比率验证完成")
+        violations = validate_rates(df, ['source_no', 'unique_lvl', 'prim_subj'], '收入')
+        print(f"收入数据比率验证完成，不满足的分组 {len(violations)} 组")
+        return violations
     except Exception as e:
         print(f"验证收入数据比率时发生错误: {str(e)}")
         raise
@@ -274,16 +244,11 @@ def apply_shared_rate_to_revenue_task(
         应用公摊比例后的收入数据
     """
     try:
-        conn, cur = connect_to_db()
-        cur.execute("SELECT * FROM fact_bus_shared_rate")
-        df_shared_rate = pd.DataFrame(cur.fetchall(), columns=[
-                                      desc[0] for desc in cur.description])
+        df_shared_rate = get_reference_table('fact_bus_shared_rate')
         df_shared_rate = df_shared_rate.drop(
             ['id'], axis=1).rename(columns={'date': 'acct_period'})
         df_shared_rate['acct_period'] = pd.to_datetime(
             df_shared_rate['acct_period'])
-        cur.close()
-        conn.close()
 
         # 分离业务线为"无"的数据和其他数据
         df_wu = df_revenue_bus_all_to_profit[df_revenue_bus_all_to_profit['bus_line'] == '无'].drop(
@@ -306,7 +271,7 @@ def apply_shared_rate_to_revenue_task(
                 df_wu[col] = df_wu[col].astype('float')
                 df_wu[col] = df_wu[col] * df_wu['rate']
 
-        df = pd.concat([df_wu, df_you], ignore_index=True)
+        df = concat_aligned([df_wu, df_you], ignore_index=True)
         df['acct_period'] = pd.to_datetime(df['acct_period'])
 
         print(f"应用公摊比例到收入数据完成，共 {len(df)} 条记录")
@@ -338,9 +303,10 @@ def save_revenue_detail_task(
             df = df.drop(['id'], axis=1)
         df_date_column = 'acct_period'
 
-        delete_data_add_data_by_DateRange(
-            table_name, date_column, df, df_date_column, date_range
-        )
+        with db_connection_slot():
+            delete_data_add_data_by_DateRange(
+                table_name, date_column, df, df_date_column, date_range
+            )
         print(f"保存收入明细到数据库完成，共 {len(df)} 条记录")
     except Exception as e:
         print(f"保存收入明细到数据库时发生错误: {str(e)}")
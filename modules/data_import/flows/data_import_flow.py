@@ -2,7 +2,10 @@
 import platform
 
 from ..tasks.data_import_tasks import (
+    sync_source_directory_task,
     read_excel_data_task,
+    partition_data_by_month_task,
+    check_existing_data_task,
     update_production_data_task,
     update_rd_data_task,
     update_purchase_data_task,
@@ -14,7 +17,8 @@ from ..tasks.data_import_tasks import (
 )
 from utils.date_utils import get_date_range_by_month, get_date_range_by_months, get_date_range_by_lastmonth
 from prefect import flow
-from typing import List, Optional
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 import pandas as pd
 import sys
@@ -24,6 +28,10 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
 
+from utils.db_utils import set_db_connection_budget
+from utils.flow_utils import wait_first
+from utils.memory_utils import peak_rss_mb
+
 # Windows 与 Rocky Linux 下 Excel 根目录默认路径（Rocky 路径请按实际挂载或数据目录修改）
 if platform.system() == "Windows":
     DEFAULT_ROOT_DIRECTORY = r"Z:\11-业务报表\1.补充数据"
@@ -43,6 +51,139 @@ def get_last_month() -> tuple:
     return last_month_year, last_month
 
 
+# 各写表任务负责的目标表，用于按表导入时只运行相关任务
+# excel_cross_border 不在 combined_table_mapping 中，由业务数据任务直接读取跨境周报模板
+WRITER_TABLES: Dict[str, List[str]] = {
+    "生产数据": ['excel_finished_goods_in', 'excel_finished_goods_adj'],
+    "研发数据": ['excel_labor_hours', 'excel_sample_molds', 'excel_tech_maintenance',
+               'excel_dev_projects', 'excel_material_usage_costs'],
+    "采购数据": ['excel_purchase_cost_red'],
+    "存货数据": ['excel_inventory_turn'],
+    "费控数据": ['excel_cost_control'],
+    "业务数据": ['excel_price_inc_profits', 'excel_esign_shipments', 'excel_sales_stats',
+               'excel_powerbank_fin', 'excel_powerbank_ops', 'excel_cross_border'],
+    "人力费用数据": ['fact_personnel'],
+    "手工刷新数据": ['fact_revenue', 'fact_expense', 'fact_cashflow', 'fact_receivable',
+                'fact_receipt', 'fact_inventory', 'fact_inventory_on_way', 'fact_offset',
+                'fact_profit_bd', 'fact_profit_stmt', 'fact_bus_wage_rate',
+                'excel_cashflow_intl', 'excel_exchange_rates'],
+}
+
+
+class WriterFailures(Exception):
+    """并发写表中存在失败任务，携带各表的执行结果用于汇总"""
+
+    def __init__(self, table_results: Dict[str, Dict[str, str]], failures: Dict[str, str]):
+        self.table_results = table_results
+        self.failures = failures
+        super().__init__(
+            "以下写表任务失败: " + "; ".join(f"{label}: {error}" for label, error in failures.items()))
+
+
+def _build_writers(
+    dfs_month: Dict[str, pd.DataFrame],
+    start_date: str,
+    end_date: str,
+    replace_existing: bool,
+    root_directory: str,
+    exists_map,
+    delta_load: bool = False,
+    tables: Optional[List[str]] = None
+) -> List[Tuple[str, Callable, Callable]]:
+    """
+    构建当月的写表任务列表，各任务写入的目标表互不相同
+
+    指定 tables 时只保留负责这些表的任务。
+
+    Returns:
+        [(名称, 顺序执行函数, 提交执行函数), ...]
+    """
+    args = (dfs_month, start_date, end_date, replace_existing)
+    task_list = [
+        ("生产数据", update_production_data_task, args),
+        ("研发数据", update_rd_data_task, args),
+        ("采购数据", update_purchase_data_task, args),
+        ("存货数据", update_inventory_data_task, args),
+        ("费控数据", update_cost_control_data_task, args),
+        ("业务数据", update_business_data_task, args + (
+            root_directory if tables is None or 'excel_cross_border' in tables else None,)),
+        ("人力费用数据", update_personnel_data_task, args),
+        ("手工刷新数据", update_manual_refresh_data_task, args),
+    ]
+    return [
+        (
+            label,
+            partial(task_fn, *task_args, exists_map=exists_map, delta_load=delta_load),
+            partial(task_fn.submit, *task_args, exists_map=exists_map, delta_load=delta_load),
+        )
+        for label, task_fn, task_args in task_list
+        if tables is None or set(WRITER_TABLES[label]) & set(tables)
+    ]
+
+
+def _run_writers_concurrently(
+    writers: List[Tuple[str, Callable, Callable]],
+    max_concurrent_writers: int
+) -> Dict[str, Dict[str, str]]:
+    """
+    并发提交写表任务，同时在途的任务数与数据库连接数均不超过 max_concurrent_writers
+
+    在途任务达到上限时等待任意一个任务结束后再提交下一个；连接上限在提交任务前设置，
+    此时不应有其他任务占用连接名额（否则 set_db_connection_budget 会拒绝调整）。
+    单个任务失败不会中断其余任务，全部结束后统一汇总；存在失败时抛出异常。
+
+    Returns:
+        {任务名称: {表名: 结果}}
+    """
+    set_db_connection_budget(max_concurrent_writers)
+
+    table_results: Dict[str, Dict[str, str]] = {}
+    failures: Dict[str, str] = {}
+    in_flight: List[Tuple[str, object]] = []
+
+    def collect(label, future):
+        result = future.result(raise_on_failure=False)
+        if isinstance(result, Exception):
+            failures[label] = str(result)
+        else:
+            table_results[label] = result or {}
+
+    for label, _, submit in writers:
+        if len(in_flight) >= max_concurrent_writers:
+            # 释放最先结束的名额，而不是按提交顺序等待最早提交的任务
+            collect(*in_flight.pop(wait_first([future for _, future in in_flight])))
+        in_flight.append((label, submit()))
+    for label, future in in_flight:
+        collect(label, future)
+
+    if failures:
+        for label, error in failures.items():
+            table_results[label] = {"(全部)": f"失败: {error}"}
+        raise WriterFailures(table_results, failures)
+    return table_results
+
+
+def _print_table_summary(
+    process_year: int,
+    process_month: int,
+    table_results: Dict[str, Dict[str, str]],
+    tables: Optional[List[str]] = None
+) -> None:
+    """打印当月各表的写入结果汇总（指定 tables 时只打印这些表）"""
+    print(f"\n{process_year}年{process_month}月 各表写入结果:")
+    for label, results in table_results.items():
+        if tables is not None:
+            results = {
+                table_name: status for table_name, status in results.items()
+                if table_name in tables or table_name == "(全部)"
+            }
+        if not results:
+            print(f"  [{label}] 无需处理的表")
+            continue
+        for table_name, status in results.items():
+            print(f"  [{label}] {table_name}: {status}")
+
+
 @flow(name="data_import_flow", log_prints=True)
 def data_import_flow(
     year: Optional[int] = None,
@@ -50,6 +191,13 @@ def data_import_flow(
     months: Optional[List[int]] = None,
     replace_existing: bool = False,
     root_directory: Optional[str] = None,
+    excel_workers: int = 1,
+    use_excel_cache: bool = True,
+    max_concurrent_writers: int = 1,
+    delta_load: bool = False,
+    tables: Optional[List[str]] = None,
+    use_local_mirror: bool = True,
+    memory_lean: bool = False,
 ) -> None:
     """
     数据导入流程
@@ -62,6 +210,17 @@ def data_import_flow(
         months: 月份列表（1-12），如果提供则按月循环处理多个月份，例如 [10, 11, 12]
         replace_existing: 是否替换已存在的数据，默认 False（不替换）。如果为 True，则替换已存在的数据
         root_directory: Excel 文件根目录路径；不传则按系统自动选择（Windows: Z:\\11-业务报表\\1.补充数据，Rocky: /mnt/业务报表/1.补充数据）
+        excel_workers: 并行解析 Excel 的进程数，默认 1（顺序读取）；大于 1 时使用进程池并行解析并输出各工作簿耗时
+        use_excel_cache: 是否使用本地 Parquet 缓存，默认 True（只重新解析有变化的工作簿）；为 False 时全部重新解析
+        max_concurrent_writers: 同时写库的任务数（即数据库连接上限），默认 1（按顺序写入）；大于 1 时各表并发写入，单表失败不影响其余表，最后汇总并报错
+        delta_load: 替换模式下是否按行哈希增量写入，默认 False；为 True 时只删除/写入有变化的行，
+            目标表会自动补充 row_hash 列，首次增量写入等同于全量替换
+        tables: 只导入这些表（如 ['excel_inventory_turn']），只解析对应的工作簿、只运行相关的写表任务；
+            不传则导入全部表
+        use_local_mirror: 是否先把 Excel 根目录增量同步到本地镜像目录再解析，默认 True（只复制有变化的文件）；
+            本地镜像目录可通过 PREFECT_EXCEL_MIRROR_DIR 设置
+        memory_lean: 省内存模式，默认 False；为 True 时逐表解析并立即裁剪未使用的列、字符串列转为 category，
+            并打印每张表的内存占用与进程峰值内存，适合整年回补
 
     Examples:
         # 处理上个月的数据（默认）
@@ -75,6 +234,24 @@ def data_import_flow(
 
         # 替换已存在的数据
         data_import_flow(year=2025, month=12, replace_existing=True)
+
+        # 使用 4 个进程并行解析 Excel
+        data_import_flow(year=2025, month=12, excel_workers=4)
+
+        # 不使用本地缓存，全部重新解析
+        data_import_flow(year=2025, month=12, use_excel_cache=False)
+
+        # 最多 4 个任务同时写库
+        data_import_flow(year=2025, month=12, max_concurrent_writers=4)
+
+        # 替换已存在的数据，但只写入有变化的行
+        data_import_flow(year=2025, month=12, replace_existing=True, delta_load=True)
+
+        # 只重新导入修正过的存货周转表
+        data_import_flow(year=2025, month=12, replace_existing=True, tables=['excel_inventory_turn'])
+
+        # 整年回补，使用省内存模式
+        data_import_flow(year=2025, months=list(range(1, 13)), replace_existing=True, memory_lean=True)
     """
     if root_directory is None:
         root_directory = DEFAULT_ROOT_DIRECTORY
@@ -90,6 +267,13 @@ def data_import_flow(
     print(f"  - months: {months if months is not None else '未指定'}")
     print(f"  - replace_existing: {replace_existing}")
     print(f"  - root_directory: {root_directory}")
+    print(f"  - excel_workers: {excel_workers}")
+    print(f"  - use_excel_cache: {use_excel_cache}")
+    print(f"  - max_concurrent_writers: {max_concurrent_writers}")
+    print(f"  - delta_load: {delta_load}")
+    print(f"  - tables: {tables if tables is not None else '全部'}")
+    print(f"  - use_local_mirror: {use_local_mirror}")
+    print(f"  - memory_lean: {memory_lean}")
     print()
 
     # 确定要处理的年份和月份
@@ -133,11 +317,33 @@ def data_import_flow(
     if not replace_existing:
         print("注意: 如果数据已存在，将跳过更新")
     print(f"Excel 文件目录: {root_directory}")
+
+    if tables is not None:
+        known_tables = {table for names in WRITER_TABLES.values() for table in names}
+        unknown_tables = [table for table in tables if table not in known_tables]
+        if unknown_tables:
+            raise ValueError(f"未知的表名: {unknown_tables}，可选: {sorted(known_tables)}")
     print("=" * 60)
 
+    # 先把共享盘目录同步到本地，后续解析都读本地副本
+    if use_local_mirror:
+        root_directory = sync_source_directory_task(root_directory)
+
     # 读取 Excel 数据（只读取一次，所有月份共享）
     print("\n开始读取 Excel 数据...")
-    dfs = read_excel_data_task(root_directory)
+    dfs = read_excel_data_task(
+        root_directory, max_workers=excel_workers, use_cache=use_excel_cache, tables=tables,
+        memory_lean=memory_lean)
+
+    # 每张表的日期列只转换一次，并按月切分，各月份只处理当月数据
+    month_dfs = partition_data_by_month_task(dfs, month_list)
+    # 切分后各月份只引用自己的数据，释放完整数据
+    del dfs
+
+    # 不替换模式下，一次查询判断所有表、所有月份是否已存在数据
+    exists_map = None
+    if not replace_existing:
+        exists_map = check_existing_data_task(month_list, tables)
 
     # 按月循环执行数据导入
     for idx, (process_year, process_month) in enumerate(month_list, 1):
@@ -151,50 +357,26 @@ def data_import_flow(
         start_date = date_range.min().strftime('%Y-%m-%d')
         end_date = date_range.max().strftime('%Y-%m-%d')
         print(f"日期范围: {start_date} 到 {end_date}")
+        dfs_month = month_dfs[(process_year, process_month)]
 
         try:
-            # 1. 更新生产数据
-            update_production_data_task(
-                dfs, start_date, end_date, replace_existing
-            )
-
-            # 2. 更新研发数据
-            update_rd_data_task(
-                dfs, start_date, end_date, replace_existing
-            )
-
-            # 3. 更新采购数据
-            update_purchase_data_task(
-                dfs, start_date, end_date, replace_existing
-            )
-
-            # 4. 更新存货数据
-            update_inventory_data_task(
-                dfs, start_date, end_date, replace_existing
-            )
-
-            # 5. 更新费控数据
-            update_cost_control_data_task(
-                dfs, start_date, end_date, replace_existing
-            )
-
-            # 6. 更新业务数据
-            update_business_data_task(
-                dfs, start_date, end_date, replace_existing, root_directory
-            )
-
-            # 7. 更新人力费用数据
-            update_personnel_data_task(
-                dfs, start_date, end_date, replace_existing
-            )
-
-            # 8. 更新手工刷新数据
-            update_manual_refresh_data_task(
-                dfs, start_date, end_date, replace_existing
-            )
+            writers = _build_writers(
+                dfs_month, start_date, end_date, replace_existing, root_directory, exists_map,
+                delta_load, tables)
+            if max_concurrent_writers > 1:
+                table_results = _run_writers_concurrently(writers, max_concurrent_writers)
+            else:
+                table_results = {label: writer() for label, writer, _ in writers}
+            _print_table_summary(process_year, process_month, table_results, tables)
 
             print(f"\n✓ {process_year}年{process_month}月 数据导入完成")
+            if memory_lean and peak_rss_mb() is not None:
+                print(f"进程峰值内存: {peak_rss_mb():.0f} MB")
+                if excel_workers > 1:
+                    print(f"解析子进程峰值内存: {peak_rss_mb(children=True):.0f} MB")
         except Exception as e:
+            if isinstance(e, WriterFailures):
+                _print_table_summary(process_year, process_month, e.table_results, tables)
             error_msg = f"{process_year}年{process_month}月 数据导入失败: {str(e)}"
             print(f"\n❌ {error_msg}")
             # 打印完整的错误堆栈信息
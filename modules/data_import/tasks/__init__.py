@@ -1,6 +1,9 @@
 """数据导入任务模块"""
 from .data_import_tasks import (
+    sync_source_directory_task,
     read_excel_data_task,
+    partition_data_by_month_task,
+    check_existing_data_task,
     update_production_data_task,
     update_rd_data_task,
     update_purchase_data_task,
@@ -12,7 +15,10 @@ from .data_import_tasks import (
 )
 
 __all__ = [
+    "sync_source_directory_task",
     "read_excel_data_task",
+    "partition_data_by_month_task",
+    "check_existing_data_task",
     "update_production_data_task",
     "update_rd_data_task",
     "update_purchase_data_task",
@@ -1,23 +1,93 @@
 """数据导入相关 Tasks"""
 from mypackage.mapping import combined_table_mapping, combined_column_mapping
-from mypackage.utilities import (
-    read_and_map_excel,
-    update_full_table,
-    update_between_dates,
-    add_data,
-    url_to_db,
-)
+from mypackage.utilities import read_and_map_excel
 from prefect import task
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 import sys
 import os
+import time
 from datetime import datetime
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 
 # 添加根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from utils.excel_utils import (
+    group_table_mapping,
+    isolated_directory,
+    list_workbooks,
+    match_workbooks,
+    read_and_map_excel_parallel,
+    print_read_timings,
+    read_excel_sheets,
+    excel_engine,
+    resolve_excel_engine,
+)
+from utils.excel_cache import ExcelParquetCache, parquet_available, EXCEL_EXTENSIONS
+from utils.file_sync import mirror_directory
+from utils.bulk_writer import (
+    update_full_table,
+    update_between_dates,
+    add_data,
+    delta_update_between_dates,
+    delta_update_full_table,
+)
+from utils.db_utils import get_engine, check_data_exists_batch, db_connection_slot
+from utils.date_utils import get_date_range_by_month
+from utils.memory_utils import peak_rss_since_reset_mb, reset_peak_rss, frame_memory_mb, prune_columns, to_categoricals
+
+
+# 按月更新的表及其日期列（表中日期列与 DataFrame 日期列同名）
+# 全表更新的表（excel_labor_hours、excel_finished_goods_adj）不在此列，按月分区时整表保留
+MONTHLY_TABLE_DATE_COLUMNS: Dict[str, str] = {
+    'excel_finished_goods_in': 'term',
+    'excel_sample_molds': 'bus_date',
+    'excel_tech_maintenance': 'date',
+    'excel_dev_projects': 'date',
+    'excel_material_usage_costs': 'date',
+    'excel_purchase_cost_red': 'date',
+    'excel_inventory_turn': 'date',
+    'excel_cost_control': 'submission_date',
+    'excel_price_inc_profits': 'date',
+    'excel_esign_shipments': 'month',
+    'excel_sales_stats': 'date',
+    'excel_powerbank_fin': 'month',
+    'excel_powerbank_ops': 'month',
+    'fact_personnel': 'date',
+    'excel_exchange_rates': 'effective_date',
+    'fact_profit_stmt': 'date',
+    'fact_receipt': 'date',
+    'fact_profit_bd': 'date',
+    'fact_expense': 'acct_period',
+    'fact_inventory': 'acct_period',
+    'fact_receivable': 'acct_period',
+    'fact_revenue': 'acct_period',
+    'fact_inventory_on_way': 'acct_period',
+    'fact_offset': 'date',
+    'fact_bus_wage_rate': 'date',
+    'fact_cashflow': 'date',
+    'excel_cashflow_intl': 'date',
+    'excel_cross_border': 'date',
+}
+
+# 各表后续处理实际用到的列（memory_lean 模式下解析后立即裁剪），未声明的表保留全部映射列
+TABLE_NEEDED_COLUMNS: Dict[str, List[str]] = {
+    'excel_finished_goods_adj': ['bus_date', 'work_order_number', 'product_code', 'amt', 'quantity'],
+    'excel_labor_hours': ['proj_name', 'product_sub_category', 'year'] + [f'{m}月' for m in range(1, 13)],
+    'excel_cost_control': ['submission_date', 'description', 'budget_department_code',
+                           'budget_department_name', 'document_number', 'submitter_code',
+                           'submitter_name'],
+}
+
+# memory_lean 模式下不转换为 category 的列（后续需要做字符串拼接）
+NON_CATEGORICAL_COLUMNS: Dict[str, List[str]] = {
+    'excel_finished_goods_adj': ['work_order_number', 'product_code'],
+}
+
+# 已存在数据的判断结果：{(表名, 开始日期, 结束日期): 是否存在}
+ExistsMap = Dict[Tuple[str, str, str], bool]
 
 
 def _check_data_exists(
@@ -39,10 +109,7 @@ def _check_data_exists(
         如果存在数据返回 True，否则返回 False
     """
     try:
-        db_url = url_to_db()
-        engine = create_engine(db_url)
-
-        with engine.connect() as connection:
+        with get_engine().connect() as connection:
             query = text(
                 f"SELECT COUNT(*) FROM {table_name} "
                 f"WHERE {table_date_column} >= :start_date "
@@ -68,21 +135,292 @@ def _check_data_exists(
         return False
 
 
+def _data_exists(
+    exists_map: Optional[ExistsMap],
+    table_name: str,
+    table_date_column: str,
+    start_date: str,
+    end_date: str
+) -> bool:
+    """
+    判断指定日期范围内是否存在数据，优先使用批量预检查的结果（辅助函数）
+
+    Args:
+        exists_map: check_existing_data_task 返回的结果，为 None 或未包含该表时单独查询
+        table_name: 表名
+        table_date_column: 日期列名
+        start_date: 开始日期 (格式: 'YYYY-MM-DD')
+        end_date: 结束日期 (格式: 'YYYY-MM-DD')
+
+    Returns:
+        如果存在数据返回 True，否则返回 False
+    """
+    key = (table_name, start_date, end_date)
+    if exists_map is not None and key in exists_map:
+        exists = exists_map[key]
+        status = "已存在数据" if exists else "不存在数据"
+        print(f"{table_name}: 在 {start_date} 到 {end_date} 范围内{status}（批量预检查）")
+        return exists
+    return _check_data_exists(table_name, table_date_column, start_date, end_date)
+
+
+@task(name="check_existing_data", log_prints=True)
+def check_existing_data_task(
+    month_list: List[Tuple[int, int]],
+    tables: Optional[List[str]] = None
+) -> ExistsMap:
+    """
+    一次查询判断所有按月更新的表在各月份是否已存在数据
+
+    Args:
+        month_list: 需要处理的 (年, 月) 列表
+        tables: 只检查这些表，不传则检查全部按月更新的表
+
+    Returns:
+        {(表名, 开始日期, 结束日期): 是否存在}
+    """
+    try:
+        checks = []
+        for process_year, process_month in month_list:
+            date_range = get_date_range_by_month(process_year, process_month)
+            start_date = date_range.min().strftime('%Y-%m-%d')
+            end_date = date_range.max().strftime('%Y-%m-%d')
+            for table_name, table_date_column in MONTHLY_TABLE_DATE_COLUMNS.items():
+                if tables is not None and table_name not in tables:
+                    continue
+                checks.append((table_name, table_date_column, start_date, end_date))
+
+        result = check_data_exists_batch(checks)
+        exists_map = {
+            (table_name, start_date, end_date): exists
+            for (table_name, _, start_date, end_date), exists in result.items()
+        }
+        print(f"批量检查完成：共 {len(exists_map)} 项，已存在数据 {sum(exists_map.values())} 项")
+        return exists_map
+    except Exception as e:
+        print(f"批量检查数据是否存在时发生错误，将改为逐表检查: {str(e)}")
+        return {}
+
+
+def _select_table_mapping(tables: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    按目标表筛选工作簿映射（辅助函数）
+
+    Args:
+        tables: 目标表名列表，为 None 时返回完整的 combined_table_mapping
+
+    Returns:
+        只包含这些表对应工作簿的映射
+    """
+    if tables is None:
+        return combined_table_mapping
+    return {
+        workbook: table_name
+        for workbook, table_name in combined_table_mapping.items()
+        if table_name in tables
+    }
+
+
+def _lean_table(table_name: str, df: pd.DataFrame, parse_peak_mb: Optional[float] = None) -> pd.DataFrame:
+    """
+    裁剪不需要的列，并把重复度高的字符串列转为 category，打印内存占用（辅助函数）
+
+    parse_peak_mb 为解析该表时的峰值内存：并行模式下是解析其工作簿的子进程的峰值（取各文件最大值），
+    顺序模式下是解析前重置后本进程的峰值；无法单独统计（非 Linux）时为 None。
+    """
+    df = prune_columns(df, TABLE_NEEDED_COLUMNS.get(table_name), table_name)
+    exclude = list(NON_CATEGORICAL_COLUMNS.get(table_name, []))
+    if table_name in MONTHLY_TABLE_DATE_COLUMNS:
+        exclude.append(MONTHLY_TABLE_DATE_COLUMNS[table_name])
+    df = to_categoricals(df, exclude)
+
+    peak_text = f"{parse_peak_mb:.0f} MB" if parse_peak_mb is not None else "未知"
+    print(f"{table_name}: {len(df)} 行 {len(df.columns)} 列，占用 {frame_memory_mb(df):.1f} MB，"
+          f"解析峰值内存 {peak_text}")
+    return df
+
+
+def _parse_excel(
+    root_directory: str,
+    table_mapping: Dict[str, str],
+    max_workers: int = 1,
+    memory_lean: bool = False,
+    engine: Optional[str] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    解析工作簿并映射数据（辅助函数）
+
+    Args:
+        root_directory: Excel 文件根目录路径
+        table_mapping: 需要解析的工作簿映射
+        max_workers: 并行解析的进程数，大于 1 时使用进程池
+        memory_lean: 是否逐表解析并立即裁剪列、转换 category，避免同时持有所有表的完整数据
+        engine: Excel 解析引擎，不传则使用 PREFECT_EXCEL_ENGINE
+
+    Returns:
+        映射后的数据字典
+    """
+    if max_workers > 1:
+        print(f"并行读取模式，进程数: {max_workers}")
+        start = time.perf_counter()
+        dfs, timings = read_and_map_excel_parallel(
+            root_directory, table_mapping, combined_column_mapping,
+            max_workers=max_workers,
+            engine=engine,
+            keep_columns=TABLE_NEEDED_COLUMNS if memory_lean else None)
+        print_read_timings(timings)
+        print(f"并行读取总耗时: {time.perf_counter() - start:.2f} 秒")
+        if memory_lean:
+            table_peaks: Dict[str, float] = {}
+            for item in timings:
+                if item['peak_mb'] is None:
+                    continue
+                for table_name in item['tables']:
+                    table_peaks[table_name] = max(table_peaks.get(table_name, 0.0), item['peak_mb'])
+            dfs = {
+                table_name: _lean_table(table_name, df, table_peaks.get(table_name))
+                for table_name, df in dfs.items()
+            }
+        return dfs
+    with excel_engine(engine) as engine:
+        print(f"Excel 解析引擎: {engine}")
+        if not memory_lean:
+            return read_and_map_excel(root_directory, table_mapping, combined_column_mapping)
+
+        dfs: Dict[str, pd.DataFrame] = {}
+        for subset in group_table_mapping(table_mapping).values():
+            measured = reset_peak_rss()
+            part = read_and_map_excel(root_directory, subset, combined_column_mapping)
+            parse_peak = peak_rss_since_reset_mb() if measured else None
+            for table_name, df in part.items():
+                dfs[table_name] = _lean_table(table_name, df, parse_peak)
+            del part
+        return dfs
+
+
+def _read_excel_with_cache(
+    root_directory: str,
+    table_mapping: Dict[str, str],
+    max_workers: int = 1,
+    cache_dir: Optional[str] = None,
+    memory_lean: bool = False
+) -> Dict[str, pd.DataFrame]:
+    """
+    优先从本地 Parquet 缓存加载，只解析发生变化的工作簿（辅助函数）
+
+    缓存键包含 match_workbooks 匹配到的全部文件（可能被读取的文件的并集），
+    需要重新解析的表只在包含这些文件的临时目录中解析，缓存内容只可能来自缓存键中的文件；
+    新增、改名的文件只要可能被匹配到，就会改变缓存键。
+    有工作簿名称匹配不到任何文件的表无法确定读取的文件集合，不使用缓存，直接在根目录中解析。
+    memory_lean 模式下缓存的是裁剪后的数据，与普通模式分开存放；不同解析引擎的结果也分开存放。
+    """
+    engine = resolve_excel_engine()
+    cache = ExcelParquetCache(cache_dir)
+    workbooks = list_workbooks(root_directory)
+
+    dfs: Dict[str, pd.DataFrame] = {}
+    miss_mapping: Dict[str, str] = {}
+    miss_keys: Dict[str, str] = {}
+    miss_paths = set()
+    uncached_mapping: Dict[str, str] = {}
+    for table_name, subset in group_table_mapping(table_mapping).items():
+        matched = [match_workbooks(workbooks, workbook) for workbook in subset]
+        if not all(matched):
+            uncached_mapping.update(subset)
+            continue
+        paths = sorted({path for paths in matched for path in paths})
+        key = cache.entry_key(table_name, subset, combined_column_mapping,
+                              [os.path.join(root_directory, path) for path in paths],
+                              engine, variant="lean" if memory_lean else "")
+        df = cache.load(key)
+        if df is None:
+            miss_mapping.update(subset)
+            miss_keys[table_name] = key
+            miss_paths.update(paths)
+        else:
+            dfs[table_name] = df
+    cache.save_hash_index()
+
+    print(f"Excel 缓存命中 {len(dfs)} 个表，需要重新解析 {len(miss_keys)} 个表")
+    if miss_mapping:
+        with isolated_directory(root_directory, sorted(miss_paths)) as directory:
+            parsed = _parse_excel(directory, miss_mapping, max_workers, memory_lean, engine)
+        for table_name, df in parsed.items():
+            dfs[table_name] = df
+            if table_name in miss_keys:
+                cache.store(miss_keys[table_name], df)
+    if uncached_mapping:
+        print(f"[WARN] 以下表的工作簿无法按文件名定位，不使用缓存: "
+              f"{sorted(set(uncached_mapping.values()))}")
+        dfs.update(_parse_excel(root_directory, uncached_mapping, max_workers, memory_lean, engine))
+
+    removed = cache.evict()
+    if removed:
+        print(f"Excel 缓存超出容量，已淘汰 {removed} 个最久未使用的缓存文件")
+    return dfs
+
+
+@task(name="sync_source_directory", log_prints=True)
+def sync_source_directory_task(root_directory: str) -> str:
+    """
+    把共享盘上的 Excel 根目录增量同步到本地镜像目录
+
+    Args:
+        root_directory: 共享盘上的 Excel 文件根目录
+
+    Returns:
+        本地镜像目录；同步失败时返回原目录（直接读共享盘）
+    """
+    try:
+        report = mirror_directory(root_directory, extensions=EXCEL_EXTENSIONS)
+        return report["target_directory"]
+    except Exception as e:
+        print(f"警告: 同步到本地失败，直接读取共享盘: {str(e)}")
+        return root_directory
+
+
 @task(name="read_excel_data", log_prints=True)
-def read_excel_data_task(root_directory: str) -> Dict[str, pd.DataFrame]:
+def read_excel_data_task(
+    root_directory: str,
+    max_workers: int = 1,
+    use_cache: bool = True,
+    cache_dir: Optional[str] = None,
+    tables: Optional[List[str]] = None,
+    memory_lean: bool = False
+) -> Dict[str, pd.DataFrame]:
     """
     读取 Excel 文件并映射数据
 
     Args:
         root_directory: Excel 文件根目录路径
+        max_workers: 并行解析的进程数，默认 1（单进程顺序读取）；大于 1 时每个工作簿文件作为一个任务并行解析
+        use_cache: 是否使用本地 Parquet 缓存，默认 True；为 False 时全部重新解析
+        cache_dir: 缓存目录，不传则使用默认目录（可通过 PREFECT_EXCEL_CACHE_DIR 设置）
+        tables: 只读取这些表对应的工作簿，不传则读取全部
+        memory_lean: 是否启用省内存模式：逐表解析，立即裁剪未使用的列（见 TABLE_NEEDED_COLUMNS），
+            字符串列转为 category，并打印每张表的内存占用与进程峰值内存
 
     Returns:
         包含所有映射后数据的字典
     """
     try:
         print(f"开始读取 Excel 数据，目录: {root_directory}")
-        dfs = read_and_map_excel(
-            root_directory, combined_table_mapping, combined_column_mapping)
+        table_mapping = _select_table_mapping(tables)
+        if not table_mapping:
+            print("没有需要从 Excel 映射读取的表")
+            return {}
+        if tables is not None:
+            print(f"按表读取模式，需要解析 {len(table_mapping)} 个工作簿")
+
+        if use_cache and not parquet_available():
+            print("警告: 未安装 pyarrow，无法使用 Excel 缓存，将全部重新解析")
+            use_cache = False
+
+        if use_cache:
+            dfs = _read_excel_with_cache(
+                root_directory, table_mapping, max_workers, cache_dir, memory_lean)
+        else:
+            dfs = _parse_excel(root_directory, table_mapping, max_workers, memory_lean)
         print(f"Excel 数据读取完成，共 {len(dfs)} 个表")
         print(f"表名列表: {list(dfs.keys())}")
         return dfs
@@ -91,6 +429,86 @@ def read_excel_data_task(root_directory: str) -> Dict[str, pd.DataFrame]:
         raise
 
 
+def _split_by_month(
+    df: pd.DataFrame,
+    date_column: str
+) -> Tuple[pd.DataFrame, Dict[Tuple[int, int], np.ndarray]]:
+    """
+    将 DataFrame 的日期列统一转换为 date 类型，并按 (年, 月) 建立分区索引（辅助函数）
+
+    Args:
+        df: 数据 DataFrame
+        date_column: 日期列名
+
+    Returns:
+        (日期列已转换的 DataFrame, {(年, 月): 行位置数组})，日期为空的行不进入任何分区
+    """
+    dates = pd.to_datetime(df[date_column])
+    df = df.copy(deep=False)
+    df[date_column] = dates.dt.date
+    month_keys = dates.dt.year * 100 + dates.dt.month
+    positions = {
+        (int(key) // 100, int(key) % 100): pos
+        for key, pos in df.groupby(month_keys.values).indices.items()
+    }
+    return df, positions
+
+
+@task(name="partition_data_by_month", log_prints=True)
+def partition_data_by_month_task(
+    dfs: Dict[str, pd.DataFrame],
+    month_list: List[Tuple[int, int]]
+) -> Dict[Tuple[int, int], Dict[str, pd.DataFrame]]:
+    """
+    按月切分 Excel 数据：每张表的日期列只转换一次，之后每个月只取该月的行
+
+    全表更新的表以及缺少日期列的表保持原样，交由各更新任务按原逻辑处理。
+
+    Args:
+        dfs: read_excel_data_task 返回的数据字典
+        month_list: 需要处理的 (年, 月) 列表
+
+    Returns:
+        {(年, 月): 该月的数据字典}，每个月的字典与 dfs 拥有相同的表名
+    """
+    month_dfs: Dict[Tuple[int, int], Dict[str, pd.DataFrame]] = {
+        key: {} for key in month_list
+    }
+
+    for table_name, df in dfs.items():
+        date_column = MONTHLY_TABLE_DATE_COLUMNS.get(table_name)
+        if date_column is None or df.empty or date_column not in df.columns:
+            for key in month_list:
+                month_dfs[key][table_name] = df
+            continue
+
+        try:
+            df, positions = _split_by_month(df, date_column)
+        except Exception as e:
+            print(f"警告: {table_name} 日期列 '{date_column}' 转换失败，按原数据处理: {str(e)}")
+            for key in month_list:
+                month_dfs[key][table_name] = df
+            continue
+
+        for key in month_list:
+            pos = positions.get(key)
+            month_dfs[key][table_name] = df.iloc[pos] if pos is not None else df.iloc[0:0]
+
+        month_rows = sum(len(month_dfs[key][table_name]) for key in month_list)
+        print(f"{table_name}: 共 {len(df)} 条数据，目标月份内 {month_rows} 条")
+
+    print(f"按月切分完成，共 {len(dfs)} 个表，{len(month_list)} 个月")
+    return month_dfs
+
+
+def _write_full_table(table_name: str, df: pd.DataFrame, delta_load: bool = False) -> None:
+    """全表更新，delta_load=True 时只写入变化的行（辅助函数）"""
+    if delta_load:
+        delta_update_full_table(table_name, df)
+    else:
+        update_full_table(table_name, df)
+
+
 @task(name="update_data_by_date_range", log_prints=True)
 def update_data_by_date_range_task(
     table_name: str,
@@ -99,7 +517,9 @@ def update_data_by_date_range_task(
     df_date_column: str,
     start_date: str,
     end_date: str,
-    replace_existing: bool = True
+    replace_existing: bool = True,
+    exists_map: Optional[ExistsMap] = None,
+    delta_load: bool = False
 ) -> None:
     """
     按日期范围更新数据
@@ -112,6 +532,8 @@ def update_data_by_date_range_task(
         start_date: 开始日期 (格式: 'YYYY-MM-DD')
         end_date: 结束日期 (格式: 'YYYY-MM-DD')
         replace_existing: 是否替换已存在的数据，默认 True
+        exists_map: 批量预检查的已存在数据结果（replace_existing=False 时使用）
+        delta_load: 是否按行哈希增量写入（只写入变化的行），默认 False
     """
     try:
         # 先检查 DataFrame 中是否有数据
@@ -125,9 +547,8 @@ def update_data_by_date_range_task(
                 f"警告: {table_name} 的 DataFrame 中不存在日期列 '{df_date_column}'，跳过更新操作")
             return
 
-        # 过滤出指定日期范围内的数据
-        df[df_date_column] = pd.to_datetime(df[df_date_column])
-        df[df_date_column] = df[df_date_column].dt.date
+        # 过滤出指定日期范围内的数据（按月切分后传入的通常只有当月数据）
+        df = df.assign(**{df_date_column: pd.to_datetime(df[df_date_column]).dt.date})
         filtered_df = df[
             (df[df_date_column] >= pd.to_datetime(start_date).date()) &
             (df[df_date_column] <= pd.to_datetime(end_date).date())
@@ -142,19 +563,25 @@ def update_data_by_date_range_task(
         if replace_existing:
             print(
                 f"✓ 更新 {table_name} 数据（替换模式）: {start_date} 到 {end_date}，共 {len(filtered_df)} 条数据")
-            update_between_dates(table_name, table_date_column,
-                                 df, df_date_column, start_date, end_date)
+            with db_connection_slot():
+                if delta_load:
+                    delta_update_between_dates(table_name, table_date_column,
+                                               filtered_df, df_date_column, start_date, end_date)
+                else:
+                    update_between_dates(table_name, table_date_column,
+                                         filtered_df, df_date_column, start_date, end_date)
         else:
             # 检查是否已存在数据
-            exists = _check_data_exists(
-                table_name, table_date_column, start_date, end_date)
+            exists = _data_exists(
+                exists_map, table_name, table_date_column, start_date, end_date)
             if exists:
                 print(f"⊘ 跳过 {table_name} 数据更新（已存在数据，replace_existing=False）")
             else:
                 print(
                     f"✓ 更新 {table_name} 数据（追加模式）: {start_date} 到 {end_date}，共 {len(filtered_df)} 条数据")
-                update_between_dates(table_name, table_date_column,
-                                     df, df_date_column, start_date, end_date)
+                with db_connection_slot():
+                    update_between_dates(table_name, table_date_column,
+                                         filtered_df, df_date_column, start_date, end_date)
     except Exception as e:
         error_msg = f"更新 {table_name} 数据时发生错误: {str(e)}"
         print(f"❌ {error_msg}")
@@ -170,8 +597,10 @@ def update_production_data_task(
     dfs: Dict[str, pd.DataFrame],
     start_date: str,
     end_date: str,
-    replace_existing: bool = True
-) -> None:
+    replace_existing: bool = True,
+    exists_map: Optional[ExistsMap] = None,
+    delta_load: bool = False
+) -> Dict[str, str]:
     """
     更新生产数据
 
@@ -180,6 +609,11 @@ def update_production_data_task(
         start_date: 开始日期
         end_date: 结束日期
         replace_existing: 是否替换已存在的数据
+        exists_map: 批量预检查的已存在数据结果（replace_existing=False 时使用）
+        delta_load: 是否按行哈希增量写入（只写入变化的行），默认 False
+
+    Returns:
+        各表的处理结果 {表名: '已更新' / '已跳过'}
     """
     print("=" * 60)
     print("开始更新生产数据")
@@ -187,37 +621,42 @@ def update_production_data_task(
 
     updated_count = 0
     skipped_count = 0
+    results: Dict[str, str] = {}
 
     # 1. 更新完工入库表
     table_name = 'excel_finished_goods_in'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         # 先检查 DataFrame 是否为空
         if df.empty:
             print(f"跳过 {table_name}（DataFrame 为空，无数据需要更新）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, 'term', start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, 'term', start_date, end_date)
                 if exists:
                     print(f"跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                 else:
                     update_data_by_date_range_task(
-                        table_name, 'term', df, 'term', start_date, end_date, replace_existing
+                        table_name, 'term', df, 'term', start_date, end_date, replace_existing, exists_map, delta_load
                     )
                     updated_count += 1
+                    results[table_name] = '已更新'
             else:
                 update_data_by_date_range_task(
-                    table_name, 'term', df, 'term', start_date, end_date, replace_existing
+                    table_name, 'term', df, 'term', start_date, end_date, replace_existing, exists_map, delta_load
                 )
                 updated_count += 1
+                results[table_name] = '已更新'
 
     # 2. 更新物料调整表（全表更新）
     table_name = 'excel_finished_goods_adj'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         df['work_order_material_number'] = (
             df['bus_date'].dt.year.astype(str) +
             df['bus_date'].dt.month.astype(str) + '-' +
@@ -235,10 +674,13 @@ def update_production_data_task(
         if df.empty:
             print(f"警告: {table_name} 的 DataFrame 为空，跳过全表更新操作（避免清空历史数据）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             print(f"更新 {table_name}（全表更新），共 {len(df)} 条数据")
-            update_full_table(table_name, df)
+            with db_connection_slot():
+                _write_full_table(table_name, df, delta_load)
             updated_count += 1
+            results[table_name] = '已更新'
 
     # 输出总结
     if updated_count > 0 and skipped_count > 0:
@@ -250,14 +692,18 @@ def update_production_data_task(
     else:
         print("生产数据检查完成：无数据需要更新")
 
+    return results
+
 
 @task(name="update_rd_data", log_prints=True)
 def update_rd_data_task(
     dfs: Dict[str, pd.DataFrame],
     start_date: str,
     end_date: str,
-    replace_existing: bool = True
-) -> None:
+    replace_existing: bool = True,
+    exists_map: Optional[ExistsMap] = None,
+    delta_load: bool = False
+) -> Dict[str, str]:
     """
     更新研发数据
 
@@ -266,6 +712,11 @@ def update_rd_data_task(
         start_date: 开始日期
         end_date: 结束日期
         replace_existing: 是否替换已存在的数据
+        exists_map: 批量预检查的已存在数据结果（replace_existing=False 时使用）
+        delta_load: 是否按行哈希增量写入（只写入变化的行），默认 False
+
+    Returns:
+        各表的处理结果 {表名: '已更新' / '已跳过'}
     """
     print("=" * 60)
     print("开始更新研发数据")
@@ -273,11 +724,12 @@ def update_rd_data_task(
 
     updated_count = 0
     skipped_count = 0
+    results: Dict[str, str] = {}
 
     # 1. 工时统计表（全表更新）
     table_name = 'excel_labor_hours'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         # 执行逆透视操作
         df = pd.melt(
             df,
@@ -299,13 +751,17 @@ def update_rd_data_task(
         if df.empty:
             print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             print(f"✓ 更新 {table_name}（全表更新），共 {len(df)} 条数据")
-            update_full_table(table_name, df)
+            with db_connection_slot():
+                _write_full_table(table_name, df, delta_load)
             updated_count += 1
+            results[table_name] = '已更新'
     else:
         print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
         skipped_count += 1
+        results[table_name] = '已跳过'
 
     # 2. 打样模具、技术维护、研发项目、领料费用
     tables_config = [
@@ -317,29 +773,33 @@ def update_rd_data_task(
 
     for table_name, table_date_column, df_date_column in tables_config:
         if table_name in dfs:
-            df = dfs[table_name].copy()
+            df = dfs[table_name].copy(deep=False)
             # 先检查 DataFrame 是否为空
             if df.empty:
                 print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
                 skipped_count += 1
+                results[table_name] = '已跳过'
                 continue
 
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, table_date_column, start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, table_date_column, start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                     continue
 
             update_data_by_date_range_task(
                 table_name, table_date_column, df, df_date_column,
-                start_date, end_date, replace_existing
+                start_date, end_date, replace_existing, exists_map, delta_load
             )
             updated_count += 1
+            results[table_name] = '已更新'
         else:
             print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
             skipped_count += 1
+            results[table_name] = '已跳过'
 
     # 输出总结
     if updated_count > 0 and skipped_count > 0:
@@ -351,14 +811,18 @@ def update_rd_data_task(
     else:
         print("研发数据检查完成：无数据需要更新")
 
+    return results
+
 
 @task(name="update_purchase_data", log_prints=True)
 def update_purchase_data_task(
     dfs: Dict[str, pd.DataFrame],
     start_date: str,
     end_date: str,
-    replace_existing: bool = True
-) -> None:
+    replace_existing: bool = True,
+    exists_map: Optional[ExistsMap] = None,
+    delta_load: bool = False
+) -> Dict[str, str]:
     """
     更新采购数据
 
@@ -367,6 +831,11 @@ def update_purchase_data_task(
         start_date: 开始日期
         end_date: 结束日期
         replace_existing: 是否替换已存在的数据
+        exists_map: 批量预检查的已存在数据结果（replace_existing=False 时使用）
+        delta_load: 是否按行哈希增量写入（只写入变化的行），默认 False
+
+    Returns:
+        各表的处理结果 {表名: '已更新' / '已跳过'}
     """
     print("=" * 60)
     print("开始更新采购数据")
@@ -374,34 +843,40 @@ def update_purchase_data_task(
 
     updated_count = 0
     skipped_count = 0
+    results: Dict[str, str] = {}
 
     table_name = 'excel_purchase_cost_red'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         # 先检查 DataFrame 是否为空
         if df.empty:
             print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, 'date', start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, 'date', start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                 else:
                     update_data_by_date_range_task(
-                        table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                        table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                     )
                     updated_count += 1
+                    results[table_name] = '已更新'
             else:
                 update_data_by_date_range_task(
-                    table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                    table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                 )
                 updated_count += 1
+                results[table_name] = '已更新'
     else:
         print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
         skipped_count += 1
+        results[table_name] = '已跳过'
 
     # 输出总结
     if updated_count > 0 and skipped_count > 0:
@@ -413,14 +888,18 @@ def update_purchase_data_task(
     else:
         print("采购数据检查完成：无数据需要更新")
 
+    return results
+
 
 @task(name="update_inventory_data", log_prints=True)
 def update_inventory_data_task(
     dfs: Dict[str, pd.DataFrame],
     start_date: str,
     end_date: str,
-    replace_existing: bool = True
-) -> None:
+    replace_existing: bool = True,
+    exists_map: Optional[ExistsMap] = None,
+    delta_load: bool = False
+) -> Dict[str, str]:
     """
     更新存货数据
 
@@ -429,6 +908,11 @@ def update_inventory_data_task(
         start_date: 开始日期
         end_date: 结束日期
         replace_existing: 是否替换已存在的数据
+        exists_map: 批量预检查的已存在数据结果（replace_existing=False 时使用）
+        delta_load: 是否按行哈希增量写入（只写入变化的行），默认 False
+
+    Returns:
+        各表的处理结果 {表名: '已更新' / '已跳过'}
     """
     print("=" * 60)
     print("开始更新存货数据")
@@ -436,34 +920,40 @@ def update_inventory_data_task(
 
     updated_count = 0
     skipped_count = 0
+    results: Dict[str, str] = {}
 
     table_name = 'excel_inventory_turn'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         # 先检查 DataFrame 是否为空
         if df.empty:
             print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, 'date', start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, 'date', start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                 else:
                     update_data_by_date_range_task(
-                        table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                        table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                     )
                     updated_count += 1
+                    results[table_name] = '已更新'
             else:
                 update_data_by_date_range_task(
-                    table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                    table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                 )
                 updated_count += 1
+                results[table_name] = '已更新'
     else:
         print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
         skipped_count += 1
+        results[table_name] = '已跳过'
 
     # 输出总结
     if updated_count > 0 and skipped_count > 0:
@@ -475,14 +965,18 @@ def update_inventory_data_task(
     else:
         print("存货数据检查完成：无数据需要更新")
 
+    return results
+
 
 @task(name="update_cost_control_data", log_prints=True)
 def update_cost_control_data_task(
     dfs: Dict[str, pd.DataFrame],
     start_date: str,
     end_date: str,
-    replace_existing: bool = True
-) -> None:
+    replace_existing: bool = True,
+    exists_map: Optional[ExistsMap] = None,
+    delta_load: bool = False
+) -> Dict[str, str]:
     """
     更新费控数据
 
@@ -491,6 +985,11 @@ def update_cost_control_data_task(
         start_date: 开始日期
         end_date: 结束日期
         replace_existing: 是否替换已存在的数据
+        exists_map: 批量预检查的已存在数据结果（replace_existing=False 时使用）
+        delta_load: 是否按行哈希增量写入（只写入变化的行），默认 False
+
+    Returns:
+        各表的处理结果 {表名: '已更新' / '已跳过'}
     """
     print("=" * 60)
     print("开始更新费控数据")
@@ -498,14 +997,16 @@ def update_cost_control_data_task(
 
     updated_count = 0
     skipped_count = 0
+    results: Dict[str, str] = {}
 
     table_name = 'excel_cost_control'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         # 先检查 DataFrame 是否为空
         if df.empty:
             print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             # 处理数据
             df['submission_date'] = pd.to_datetime(df['submission_date'])
@@ -515,26 +1016,30 @@ def update_cost_control_data_task(
                      'submitter_name', 'year']]
 
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, 'submission_date', start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, 'submission_date', start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                 else:
                     update_data_by_date_range_task(
                         table_name, 'submission_date', df, 'submission_date',
-                        start_date, end_date, replace_existing
+                        start_date, end_date, replace_existing, exists_map, delta_load
                     )
                     updated_count += 1
+                    results[table_name] = '已更新'
             else:
                 update_data_by_date_range_task(
                     table_name, 'submission_date', df, 'submission_date',
-                    start_date, end_date, replace_existing
+                    start_date, end_date, replace_existing, exists_map, delta_load
                 )
                 updated_count += 1
+                results[table_name] = '已更新'
     else:
         print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
         skipped_count += 1
+        results[table_name] = '已跳过'
 
     # 输出总结
     if updated_count > 0 and skipped_count > 0:
@@ -546,6 +1051,8 @@ def update_cost_control_data_task(
     else:
         print("费控数据检查完成：无数据需要更新")
 
+    return results
+
 
 @task(name="update_business_data", log_prints=True)
 def update_business_data_task(
@@ -553,8 +1060,10 @@ def update_business_data_task(
     start_date: str,
     end_date: str,
     replace_existing: bool = False,
-    root_directory: Optional[str] = None
-) -> None:
+    root_directory: Optional[str] = None,
+    exists_map: Optional[ExistsMap] = None,
+    delta_load: bool = False
+) -> Dict[str, str]:
     """
     更新业务数据
 
@@ -564,6 +1073,11 @@ def update_business_data_task(
         end_date: 结束日期
         replace_existing: 是否替换已存在的数据
         root_directory: Excel 文件根目录（用于读取跨境数据）
+        exists_map: 批量预检查的已存在数据结果（replace_existing=False 时使用）
+        delta_load: 是否按行哈希增量写入（只写入变化的行），默认 False
+
+    Returns:
+        各表的处理结果 {表名: '已更新' / '已跳过'}
     """
     print("=" * 60)
     print("开始更新业务数据")
@@ -571,6 +1085,7 @@ def update_business_data_task(
 
     updated_count = 0
     skipped_count = 0
+    results: Dict[str, str] = {}
 
     # 更新常规业务数据表
     tables_config = [
@@ -583,29 +1098,33 @@ def update_business_data_task(
 
     for table_name, table_date_column, df_date_column in tables_config:
         if table_name in dfs:
-            df = dfs[table_name].copy()
+            df = dfs[table_name].copy(deep=False)
             # 先检查 DataFrame 是否为空
             if df.empty:
                 print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
                 skipped_count += 1
+                results[table_name] = '已跳过'
                 continue
 
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, table_date_column, start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, table_date_column, start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                     continue
 
             update_data_by_date_range_task(
                 table_name, table_date_column, df, df_date_column,
-                start_date, end_date, replace_existing
+                start_date, end_date, replace_existing, exists_map, delta_load
             )
             updated_count += 1
+            results[table_name] = '已更新'
         else:
             print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
             skipped_count += 1
+            results[table_name] = '已跳过'
 
     # 更新跨境业务数据（需要特殊处理）
     if root_directory:
@@ -614,18 +1133,20 @@ def update_business_data_task(
             file_path = os.path.join(
                 root_directory, '7.业务数据', '跨境', '周报取数模板.xlsx')
             if os.path.exists(file_path):
-                df_user = pd.read_excel(file_path, sheet_name='用户数').drop(
-                    ['周'], axis=1).groupby(['年', '月']).sum().reset_index()
-                df_amt = pd.read_excel(file_path, sheet_name='入账提现金额').loc[:, [
-                    '年', '月', '入账笔数', '入账成功总金额', '电商入账笔数', '电商入账成功总金额']].groupby(['年', '月']).sum().reset_index()
-                df_curr = pd.read_excel(file_path, sheet_name='入账金额分币种').drop(
-                    ['周', '入账成功总金额'], axis=1).groupby(['年', '月']).sum().reset_index()
-                df_qr = pd.read_excel(file_path, sheet_name='码付').drop(
-                    ['周', '单笔均额-码付', '费率-码付'], axis=1).groupby(['年', '月']).sum().reset_index()
-
-                df = pd.merge(df_user, df_amt, on=['年', '月'], how='outer')
-                df = pd.merge(df, df_curr, on=['年', '月'], how='outer')
-                df = pd.merge(df, df_qr, on=['年', '月'], how='outer')
+                # 一次打开工作簿读取四个工作表，各自按年月汇总后按年月索引横向拼接
+                sheets = read_excel_sheets(
+                    file_path, ['用户数', '入账提现金额', '入账金额分币种', '码付'])
+                keys = ['年', '月']
+                parts = [
+                    sheets['用户数'].drop(['周'], axis=1),
+                    sheets['入账提现金额'].loc[:, keys + [
+                        '入账笔数', '入账成功总金额', '电商入账笔数', '电商入账成功总金额']],
+                    sheets['入账金额分币种'].drop(['周', '入账成功总金额'], axis=1),
+                    sheets['码付'].drop(['周', '单笔均额-码付', '费率-码付'], axis=1),
+                ]
+                df = pd.concat(
+                    [part.groupby(keys).sum() for part in parts], axis=1, join='outer'
+                ).sort_index().reset_index()
 
                 if df['月'].isnull().any():
                     print("合并后的年月存在空值")
@@ -638,23 +1159,26 @@ def update_business_data_task(
 
                 table_name = 'excel_cross_border'
                 if not replace_existing:
-                    exists = _check_data_exists(
-                        table_name, 'date', start_date, end_date)
+                    exists = _data_exists(
+                        exists_map, table_name, 'date', start_date, end_date)
                     if exists:
                         print(f"⊘ 跳过 {table_name}（已存在数据）")
                         skipped_count += 1
+                        results[table_name] = '已跳过'
                     else:
                         update_data_by_date_range_task(
                             table_name, 'date', df, 'date',
-                            start_date, end_date, replace_existing
+                            start_date, end_date, replace_existing, exists_map, delta_load
                         )
                         updated_count += 1
+                        results[table_name] = '已更新'
                 else:
                     update_data_by_date_range_task(
                         table_name, 'date', df, 'date',
-                        start_date, end_date, replace_existing
+                        start_date, end_date, replace_existing, exists_map, delta_load
                     )
                     updated_count += 1
+                    results[table_name] = '已更新'
         except Exception as e:
             print(f"更新跨境业务数据时发生错误: {str(e)}")
 
@@ -668,14 +1192,18 @@ def update_business_data_task(
     else:
         print("业务数据检查完成：无数据需要更新")
 
+    return results
+
 
 @task(name="update_personnel_data", log_prints=True)
 def update_personnel_data_task(
     dfs: Dict[str, pd.DataFrame],
     start_date: str,
     end_date: str,
-    replace_existing: bool = True
-) -> None:
+    replace_existing: bool = True,
+    exists_map: Optional[ExistsMap] = None,
+    delta_load: bool = False
+) -> Dict[str, str]:
     """
     更新人力费用数据
 
@@ -684,6 +1212,11 @@ def update_personnel_data_task(
         start_date: 开始日期
         end_date: 结束日期
         replace_existing: 是否替换已存在的数据
+        exists_map: 批量预检查的已存在数据结果（replace_existing=False 时使用）
+        delta_load: 是否按行哈希增量写入（只写入变化的行），默认 False
+
+    Returns:
+        各表的处理结果 {表名: '已更新' / '已跳过'}
     """
     print("=" * 60)
     print("开始更新人力费用数据")
@@ -691,34 +1224,40 @@ def update_personnel_data_task(
 
     updated_count = 0
     skipped_count = 0
+    results: Dict[str, str] = {}
 
     table_name = 'fact_personnel'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         # 先检查 DataFrame 是否为空
         if df.empty:
             print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, 'date', start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, 'date', start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                 else:
                     update_data_by_date_range_task(
-                        table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                        table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                     )
                     updated_count += 1
+                    results[table_name] = '已更新'
             else:
                 update_data_by_date_range_task(
-                    table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                    table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                 )
                 updated_count += 1
+                results[table_name] = '已更新'
     else:
         print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
         skipped_count += 1
+        results[table_name] = '已跳过'
 
     # 输出总结
     if updated_count > 0 and skipped_count > 0:
@@ -730,14 +1269,18 @@ def update_personnel_data_task(
     else:
         print("人力费用数据检查完成：无数据需要更新")
 
+    return results
+
 
 @task(name="update_manual_refresh_data", log_prints=True)
 def update_manual_refresh_data_task(
     dfs: Dict[str, pd.DataFrame],
     start_date: str,
     end_date: str,
-    replace_existing: bool = True
-) -> None:
+    replace_existing: bool = True,
+    exists_map: Optional[ExistsMap] = None,
+    delta_load: bool = False
+) -> Dict[str, str]:
     """
     更新手工刷新数据
 
@@ -746,6 +1289,11 @@ def update_manual_refresh_data_task(
         start_date: 开始日期
         end_date: 结束日期
         replace_existing: 是否替换已存在的数据
+        exists_map: 批量预检查的已存在数据结果（replace_existing=False 时使用）
+        delta_load: 是否按行哈希增量写入（只写入变化的行），默认 False
+
+    Returns:
+        各表的处理结果 {表名: '已更新' / '已跳过'}
     """
     print("=" * 60)
     print("开始更新手工刷新数据")
@@ -753,66 +1301,77 @@ def update_manual_refresh_data_task(
 
     updated_count = 0
     skipped_count = 0
+    results: Dict[str, str] = {}
 
     # 更新汇率表
     table_name = 'excel_exchange_rates'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         # 先检查 DataFrame 是否为空
         if df.empty:
             print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, 'effective_date', start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, 'effective_date', start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                 else:
                     update_data_by_date_range_task(
                         table_name, 'effective_date', df, 'effective_date',
-                        start_date, end_date, replace_existing
+                        start_date, end_date, replace_existing, exists_map, delta_load
                     )
                     updated_count += 1
+                    results[table_name] = '已更新'
             else:
                 update_data_by_date_range_task(
                     table_name, 'effective_date', df, 'effective_date',
-                    start_date, end_date, replace_existing
+                    start_date, end_date, replace_existing, exists_map, delta_load
                 )
                 updated_count += 1
+                results[table_name] = '已更新'
     else:
         print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
         skipped_count += 1
+        results[table_name] = '已跳过'
 
     # 更新利润表
     table_name = 'fact_profit_stmt'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         # 先检查 DataFrame 是否为空
         if df.empty:
             print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, 'date', start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, 'date', start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                 else:
                     update_data_by_date_range_task(
-                        table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                        table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                     )
                     updated_count += 1
+                    results[table_name] = '已更新'
             else:
                 update_data_by_date_range_task(
-                    table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                    table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                 )
                 updated_count += 1
+                results[table_name] = '已更新'
     else:
         print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
         skipped_count += 1
+        results[table_name] = '已跳过'
 
     # 更新其他明细表
     tables_config = [
@@ -827,87 +1386,101 @@ def update_manual_refresh_data_task(
 
     for table_name, table_date_column, df_date_column in tables_config:
         if table_name in dfs:
-            df = dfs[table_name].copy()
+            df = dfs[table_name].copy(deep=False)
             # 先检查 DataFrame 是否为空
             if df.empty:
                 print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
                 skipped_count += 1
+                results[table_name] = '已跳过'
                 continue
 
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, table_date_column, start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, table_date_column, start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                     continue
 
             update_data_by_date_range_task(
                 table_name, table_date_column, df, df_date_column,
-                start_date, end_date, replace_existing
+                start_date, end_date, replace_existing, exists_map, delta_load
             )
             updated_count += 1
+            results[table_name] = '已更新'
         else:
             print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
             skipped_count += 1
+            results[table_name] = '已跳过'
 
     # 更新抵消表
     table_name = 'fact_offset'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         # 先检查 DataFrame 是否为空
         if df.empty:
             print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, 'date', start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, 'date', start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                 else:
                     update_data_by_date_range_task(
-                        table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                        table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                     )
                     updated_count += 1
+                    results[table_name] = '已更新'
             else:
                 update_data_by_date_range_task(
-                    table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                    table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                 )
                 updated_count += 1
+                results[table_name] = '已更新'
     else:
         print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
         skipped_count += 1
+        results[table_name] = '已跳过'
 
     # 更新业务线工资比重
     table_name = 'fact_bus_wage_rate'
     if table_name in dfs:
-        df = dfs[table_name].copy()
+        df = dfs[table_name].copy(deep=False)
         # 先检查 DataFrame 是否为空
         if df.empty:
             print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
             skipped_count += 1
+            results[table_name] = '已跳过'
         else:
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, 'date', start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, 'date', start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                 else:
                     update_data_by_date_range_task(
-                        table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                        table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                     )
                     updated_count += 1
+                    results[table_name] = '已更新'
             else:
                 update_data_by_date_range_task(
-                    table_name, 'date', df, 'date', start_date, end_date, replace_existing
+                    table_name, 'date', df, 'date', start_date, end_date, replace_existing, exists_map, delta_load
                 )
                 updated_count += 1
+                results[table_name] = '已更新'
     else:
         print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
         skipped_count += 1
+        results[table_name] = '已跳过'
 
     # 更新现金流量表
     tables_config = [
@@ -917,29 +1490,33 @@ def update_manual_refresh_data_task(
 
     for table_name, table_date_column, df_date_column in tables_config:
         if table_name in dfs:
-            df = dfs[table_name].copy()
+            df = dfs[table_name].copy(deep=False)
             # 先检查 DataFrame 是否为空
             if df.empty:
                 print(f"⊘ 跳过 {table_name}（DataFrame 为空，无数据需要更新）")
                 skipped_count += 1
+                results[table_name] = '已跳过'
                 continue
 
             if not replace_existing:
-                exists = _check_data_exists(
-                    table_name, table_date_column, start_date, end_date)
+                exists = _data_exists(
+                    exists_map, table_name, table_date_column, start_date, end_date)
                 if exists:
                     print(f"⊘ 跳过 {table_name}（已存在数据）")
                     skipped_count += 1
+                    results[table_name] = '已跳过'
                     continue
 
             update_data_by_date_range_task(
                 table_name, table_date_column, df, df_date_column,
-                start_date, end_date, replace_existing
+                start_date, end_date, replace_existing, exists_map, delta_load
             )
             updated_count += 1
+            results[table_name] = '已更新'
         else:
             print(f"⚠️  警告: {table_name} 不在数据字典中，跳过处理")
             skipped_count += 1
+            results[table_name] = '已跳过'
 
     # 输出总结
     if updated_count > 0 and skipped_count > 0:
@@ -950,3 +1527,5 @@ def update_manual_refresh_data_task(
         print(f"手工刷新数据检查完成：跳过 {skipped_count} 个表（已存在数据或无数据需要更新）")
     else:
         print("手工刷新数据检查完成：无数据需要更新")
+
+    return results
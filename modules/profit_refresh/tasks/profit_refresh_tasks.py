@@ -6,6 +6,9 @@ import os
 # 添加根目录到路径（prefect目录）
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from mypackage.utilities import connect_to_db
+from utils.bulk_writer import delete_data_add_data, delete_data_add_data_by_DateRange
+from utils.db_utils import fetch_dataframe
+from utils.frame_schema import apply_schema, concat_aligned
 
 
 @task(name="load_revenue_for_profit", log_prints=True)
@@ -21,8 +24,7 @@ def load_revenue_for_profit_task(date_range: pd.DatetimeIndex) -> pd.DataFrame:
     """
     try:
         conn, cur = connect_to_db()
-        cur.execute("SELECT * FROM fact_revenue")
-        df = pd.DataFrame(cur.fetchall(), columns=[desc[0] for desc in cur.description])
+        df = apply_schema(fetch_dataframe(conn, "SELECT * FROM fact_revenue"), 'fact_revenue')
         
         # 筛选日期范围
         df['acct_period'] = pd.to_datetime(df['acct_period'])
@@ -65,7 +67,7 @@ def load_expense_other_for_profit_task(date_range: pd.DatetimeIndex) -> pd.DataF
     """
     try:
         conn, cur = connect_to_db()
-        cur.execute("""
+        df = fetch_dataframe(conn, """
             SELECT source_no, fin_con, fin_ind, unique_lvl, acct_period, prim_subj, exp_amt as amt, '费用' as class 
             FROM fact_expense
             WHERE acct_period >= %s AND acct_period <= %s
@@ -75,7 +77,7 @@ def load_expense_other_for_profit_task(date_range: pd.DatetimeIndex) -> pd.DataF
             WHERE prim_subj NOT IN ('营业收入','营业成本','管理费用','销售费用','财务费用','研发费用','营业利润','净利润','利润总额','政府补贴','分摊税费','分摊收益','退税收入')
             AND date >= %s AND date <= %s
         """, (date_range.min(), date_range.max(), date_range.min(), date_range.max()))
-        df = pd.DataFrame(cur.fetchall(), columns=[desc[0] for desc in cur.description])
+        df = apply_schema(df)
         
         # 筛选日期范围
         df['acct_period'] = pd.to_datetime(df['acct_period'])
@@ -110,15 +112,12 @@ def refresh_offset_by_month_task(date_range: pd.DatetimeIndex) -> pd.DataFrame:
                                         acct_period, prim_subj, amt, class）
     """
     try:
-        from mypackage.utilities import delete_data_add_data
-
         conn, cur = connect_to_db()
         # 全量读取累计抵销数，排除汇总科目（与 Notebook 保持一致）
-        cur.execute("""
+        df = fetch_dataframe(conn, """
             SELECT * FROM fact_offset
             WHERE subj_name NOT IN ('营业利润', '净利润', '利润总额')
         """)
-        df = pd.DataFrame(cur.fetchall(), columns=[desc[0] for desc in cur.description])
         cur.close()
         conn.close()
 
@@ -183,7 +182,7 @@ def merge_profit_data_task(
         合并后的数据 DataFrame
     """
     try:
-        df_t = pd.concat([df_revenue, df_expense_other, df_offset], axis=0, ignore_index=True)
+        df_t = concat_aligned([df_revenue, df_expense_other, df_offset], axis=0, ignore_index=True)
         df_t['acct_period'] = pd.to_datetime(df_t['acct_period'])
         df_t = df_t[(df_t['amt'].notna()) & (df_t['amt'].notnull()) & (df_t['amt'] != 0)]
         
@@ -206,17 +205,16 @@ def calculate_profit_indicators_task(df_profit: pd.DataFrame) -> pd.DataFrame:
         包含利润指标的数据 DataFrame
     """
     try:
-        # 数据聚合
-        df_index = df_profit.columns.tolist()[1:-1]  # 排除第一列和最后一列
-        df_profit_agg = df_profit[df_index].groupby(df_index[:-1]).sum().reset_index()
-        
         # 数据透视
         df_profit_pivot = df_profit.pivot_table(
             index=['fin_con', 'fin_ind', 'unique_lvl', 'acct_period'],
             columns='prim_subj',
             values='amt',
-            aggfunc='sum'
+            aggfunc='sum',
+            observed=True
         ).fillna(0).reset_index()
+        # 科目列名来自 category，转为普通列名以便补列
+        df_profit_pivot.columns = list(df_profit_pivot.columns)
         
         # 补全科目
         account_list = [
@@ -261,12 +259,12 @@ def calculate_profit_indicators_task(df_profit: pd.DataFrame) -> pd.DataFrame:
             value_name='amt'
         )
         df_profit_melt = df_profit_melt.groupby(
-            ['fin_con', 'fin_ind', 'unique_lvl', 'acct_period', 'prim_subj']
+            ['fin_con', 'fin_ind', 'unique_lvl', 'acct_period', 'prim_subj'], observed=True
         ).sum().reset_index()
         df_profit_melt['source_no'] = 'C' + df_profit_melt.index.astype(str)
         
         # 合并原始数据和计算出的利润指标
-        df_upload = pd.concat([df_profit, df_profit_melt], axis=0, ignore_index=True)
+        df_upload = concat_aligned([df_profit, df_profit_melt], axis=0, ignore_index=True)
         
         print(f"计算利润指标完成，共 {len(df_upload)} 条记录")
         return df_upload
@@ -285,8 +283,6 @@ def save_profit_table_task(df_profit: pd.DataFrame, date_range: pd.DatetimeIndex
         date_range: 日期范围（用于删除指定月份的数据）
     """
     try:
-        from mypackage.utilities import delete_data_add_data_by_DateRange
-        
         # 使用 delete_data_add_data_by_DateRange，只删除计算月份的数据
         delete_data_add_data_by_DateRange(
             table_name='fact_profit',
@@ -314,13 +310,13 @@ def load_bus_profit_data_task(date_range: pd.DatetimeIndex) -> pd.DataFrame:
     """
     try:
         conn, cur = connect_to_db()
-        cur.execute("""
+        df = fetch_dataframe(conn, """
             SELECT source_no, fin_con, fin_ind, unique_lvl, date as acct_period, prim_subj, mo_amt as amt, bus_line 
             FROM fact_bus_profit_bd 
             WHERE prim_subj NOT IN ('营业利润','净利润','利润总额','政府补贴','分摊税费','分摊收益','退税收入')
             AND date >= %s AND date <= %s
         """, (date_range.min(), date_range.max()))
-        df = pd.DataFrame(cur.fetchall(), columns=[desc[0] for desc in cur.description])
+        df = apply_schema(df)
         
         # 筛选日期范围
         df['acct_period'] = pd.to_datetime(df['acct_period'])
@@ -348,17 +344,16 @@ def calculate_bus_profit_indicators_task(df_bus_profit: pd.DataFrame) -> pd.Data
         包含利润指标的业务线利润数据 DataFrame
     """
     try:
-        # 数据聚合
-        df_index = df_bus_profit.columns.tolist()[1:-1]  # 排除第一列和最后一列
-        df_profit_agg = df_bus_profit[df_index].groupby(df_index[:-1]).sum().reset_index()
-        
         # 数据透视
         df_profit_pivot = df_bus_profit.pivot_table(
             index=['fin_con', 'fin_ind', 'unique_lvl', 'acct_period', 'bus_line'],
             columns='prim_subj',
             values='amt',
-            aggfunc='sum'
+            aggfunc='sum',
+            observed=True
         ).fillna(0).reset_index()
+        # 科目列名来自 category，转为普通列名以便补列
+        df_profit_pivot.columns = list(df_profit_pivot.columns)
         
         # 补全科目
         account_list = [
@@ -405,12 +400,12 @@ def calculate_bus_profit_indicators_task(df_bus_profit: pd.DataFrame) -> pd.Data
             value_name='amt'
         )
         df_profit_melt = df_profit_melt.groupby(
-            ['fin_con', 'fin_ind', 'unique_lvl', 'acct_period', 'prim_subj', 'bus_line']
+            ['fin_con', 'fin_ind', 'unique_lvl', 'acct_period', 'prim_subj', 'bus_line'], observed=True
         ).sum().reset_index()
         df_profit_melt['source_no'] = 'C' + df_profit_melt.index.astype(str)
         
         # 合并原始数据和计算出的利润指标
-        df_upload = pd.concat([df_bus_profit, df_profit_melt], axis=0, ignore_index=True)
+        df_upload = concat_aligned([df_bus_profit, df_profit_melt], axis=0, ignore_index=True)
         
         print(f"计算业务线利润指标完成，共 {len(df_upload)} 条记录")
         return df_upload
@@ -429,8 +424,6 @@ def save_bus_profit_table_task(df_bus_profit: pd.DataFrame, date_range: pd.Datet
         date_range: 日期范围（用于删除指定月份的数据）
     """
     try:
-        from mypackage.utilities import delete_data_add_data_by_DateRange
-        
         # 使用 delete_data_add_data_by_DateRange，只删除计算月份的数据
         delete_data_add_data_by_DateRange(
             table_name='fact_bus_profit',
@@ -30,13 +30,14 @@ from ..tasks.recon_calc_tasks import (
 
 
 @flow(name="recon_flow", log_prints=True)
-def recon_flow(target_date: Optional[str] = None) -> None:
+def recon_flow(target_date: Optional[str] = None, use_local_mirror: bool = True) -> None:
     """
     内部往来对账完整流程（阶段1采集 + 阶段2核对）
 
     Args:
         target_date: 目标月份，格式 YYYY-MM-DD（如 "2026-02-01"）。
                      不传则自动使用上个自然月（相对于运行日期）。
+        use_local_mirror: 是否先把共享盘数据源目录增量同步到本地再扫描，默认 True。
 
     流程说明：
         阶段1 - 数据采集与存库：
@@ -64,7 +65,8 @@ def recon_flow(target_date: Optional[str] = None) -> None:
     df_mysql = fetch_recon_from_mysql_task(target_date=target_date)
 
     # Step 2: 从 Excel 扫描（失败不中断）
-    df_excel = collect_recon_from_excel_task(target_date=target_date)
+    df_excel = collect_recon_from_excel_task(
+        target_date=target_date, use_local_mirror=use_local_mirror)
 
     # Step 3: 删除旧数据
     del_result = delete_old_recon_data_task(target_date=target_date)
@@ -14,6 +14,7 @@ import pandas as pd
 from prefect import task
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.excel_utils import resolve_excel_engine
 
 
 def _get_mapping_path() -> str:
@@ -44,15 +45,16 @@ def load_mapping_config_task() -> Tuple[
     print(f"--> 加载映射配置表: {mapping_excel}")
 
     try:
+        engine = resolve_excel_engine()
         df_params = pd.read_excel(
             mapping_excel, sheet_name="参数表",
-            usecols=["项目", "统一名称"]
+            usecols=["项目", "统一名称"], engine=engine
         ).dropna(how="all")
         df_params["统一名称"] = df_params["统一名称"].fillna("")
 
         df_units = pd.read_excel(
             mapping_excel, sheet_name="单位简称",
-            usecols=["单位编号", "单位全称", "单位简称", "合并名称", "业报合并名称"]
+            usecols=["单位编号", "单位全称", "单位简称", "合并名称", "业报合并名称"], engine=engine
         ).dropna(how="all")
         df_unit_map = (
             df_units[["合并名称", "单位简称"]]
@@ -67,7 +69,7 @@ def load_mapping_config_task() -> Tuple[
 
         # 往来差异说明
         try:
-            df_diff_wanglai = pd.read_excel(mapping_excel, sheet_name="往来差异说明")
+            df_diff_wanglai = pd.read_excel(mapping_excel, sheet_name="往来差异说明", engine=engine)
             if not df_diff_wanglai.empty:
                 df_diff_wanglai["统一日期"] = pd.to_datetime(
                     df_diff_wanglai["统一日期"], errors="coerce")
@@ -84,7 +86,7 @@ def load_mapping_config_task() -> Tuple[
 
         # 销售差异说明
         try:
-            df_diff_xiaoshou = pd.read_excel(mapping_excel, sheet_name="销售差异说明")
+            df_diff_xiaoshou = pd.read_excel(mapping_excel, sheet_name="销售差异说明", engine=engine)
             if not df_diff_xiaoshou.empty:
                 df_diff_xiaoshou["唯一日期"] = pd.to_datetime(
                     df_diff_xiaoshou["唯一日期"], errors="coerce")
@@ -101,7 +103,7 @@ def load_mapping_config_task() -> Tuple[
 
         # 现金流差异说明
         try:
-            df_diff_xianjinliu = pd.read_excel(mapping_excel, sheet_name="现金流差异说明")
+            df_diff_xianjinliu = pd.read_excel(mapping_excel, sheet_name="现金流差异说明", engine=engine)
             if not df_diff_xianjinliu.empty:
                 df_diff_xianjinliu["唯一日期"] = pd.to_datetime(
                     df_diff_xianjinliu["唯一日期"], errors="coerce")
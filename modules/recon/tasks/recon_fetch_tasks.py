@@ -14,6 +14,8 @@ from prefect import task
 
 # 添加 prefect 根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.excel_utils import resolve_excel_engine
+from utils.file_sync import mirror_directory
 
 
 # ──────────────────────────────────────────────
@@ -118,13 +120,17 @@ def fetch_recon_from_mysql_task(target_date: Optional[str] = None) -> pd.DataFra
 # ──────────────────────────────────────────────
 
 @task(name="collect_recon_from_excel", log_prints=True)
-def collect_recon_from_excel_task(target_date: Optional[str] = None) -> pd.DataFrame:
+def collect_recon_from_excel_task(
+    target_date: Optional[str] = None,
+    use_local_mirror: bool = True
+) -> pd.DataFrame:
     """
     扫描共享盘指定目录，读取"内部往来填报表"子表，映射列名为英文。
     按日期列内容过滤目标月份数据（而非文件名）。
 
     Args:
         target_date: 格式 YYYY-MM-DD；None 时取上个自然月。
+        use_local_mirror: 是否先把扫描目录增量同步到本地再读取，默认 True；同步失败时直接读共享盘。
 
     Returns:
         列名已映射为英文的 DataFrame，若无数据则返回空 DataFrame。
@@ -160,7 +166,14 @@ def collect_recon_from_excel_task(target_date: Optional[str] = None) -> pd.DataF
         print(f"[WARN] 共享盘路径不存在: {scan_path}，跳过 Excel 采集")
         return pd.DataFrame()
 
+    if use_local_mirror:
+        try:
+            scan_path = mirror_directory(scan_path, extensions=(".xlsx", ".xlsm"))["target_directory"]
+        except Exception as e:
+            print(f"[WARN] 同步到本地失败，直接读取共享盘: {e}")
+
     filter_date = pd.to_datetime(lastmonth_str).date()  # 目标日期对象
+    engine = resolve_excel_engine()
 
     # 使用 os.walk 递归扫描子目录（原始 recon_tool.py 使用 rglob，等价于此）
     for root, dirs, files in os.walk(scan_path):
@@ -171,7 +184,7 @@ def collect_recon_from_excel_task(target_date: Optional[str] = None) -> pd.DataF
                 continue
             filepath = os.path.join(root, filename)
             try:
-                xls = pd.ExcelFile(filepath)
+                xls = pd.ExcelFile(filepath, engine=engine)
                 if sheet_name not in xls.sheet_names:
                     continue  # 没有目标子表，静默跳过
                 df = pd.read_excel(xls, sheet_name=sheet_name)
@@ -270,7 +283,7 @@ def insert_recon_data_task(
     Returns:
         {'success': bool, 'message': str, 'count': int}
     """
-    from mypackage.utilities import engine_to_db
+    from utils.bulk_writer import add_data
 
     try:
         # 合并
@@ -319,8 +332,7 @@ def insert_recon_data_task(
             print(f"[INFO] 已过滤 {before_count - len(df)} 条 major_cat 为空的无效行，剩余 {len(df)} 条")
 
         # 写入数据库
-        engine = engine_to_db()
-        df.to_sql("excel_account_recon", con=engine, if_exists="append", index=False)
+        add_data("excel_account_recon", df)
         print(f"--> 成功写入 excel_account_recon，共 {len(df)} 条记录")
         return {"success": True, "message": f"写入完成", "count": len(df)}
 
@@ -9,6 +9,8 @@ from dateutil.relativedelta import relativedelta
 # 添加根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from mypackage.utilities import connect_to_db
+from utils.bulk_writer import add_data
+from utils.ref_cache import invalidate_reference_table
 
 @task(name="fetch_latest_budget_rate", log_prints=True)
 def fetch_latest_budget_rate_task(start_date: datetime, end_date: datetime) -> pd.DataFrame:
@@ -107,10 +109,10 @@ def update_fact_bus_shared_rate_task(df_final: pd.DataFrame, start_date: datetim
         
     if not df_final.empty:
         # 第二步：使用封装好的 add_data 插入新数据
-        from mypackage.utilities import add_data
         # 确保 date 列如果是 datetime 对象可以转换为字符串
         df_final['date'] = pd.to_datetime(df_final['date']).dt.strftime('%Y-%m-%d')
         add_data('fact_bus_shared_rate', df_final)
         print(f"已成功写入 {len(df_final)} 条新综合比例数据。")
     else:
         print("无有效数据插入。")
+    invalidate_reference_table('fact_bus_shared_rate')
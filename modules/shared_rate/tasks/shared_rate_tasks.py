@@ -1,11 +1,14 @@
 """综合比例计算相关 Tasks"""
-from mypackage.utilities import connect_to_db, delete_data_add_data_by_DateRange
+from mypackage.utilities import connect_to_db
 from prefect import task
 import pandas as pd
 import sys
 import os
 # 添加根目录到路径（prefect目录）
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.bulk_writer import delete_data_add_data_by_DateRange
+from utils.db_utils import fetch_dataframe
+from utils.ref_cache import invalidate_reference_table
 
 
 @task(name="load_bus_profit_for_shared_rate", log_prints=True)
@@ -23,7 +26,7 @@ def load_bus_profit_for_shared_rate_task(date_range: pd.DatetimeIndex) -> pd.Dat
         conn, cur = connect_to_db()
 
         # 查询业务线利润数据，排除"无"和"抵销数"，通过关联 dim_org_struc 表筛选前台和中台
-        cur.execute("""
+        df = fetch_dataframe(conn, """
             SELECT p.acct_period as date, p.bus_line, p.prim_subj, p.amt as amt
             FROM fact_bus_profit p
             LEFT JOIN dim_org_struc d ON d.unique_lvl = p.unique_lvl
@@ -32,9 +35,6 @@ def load_bus_profit_for_shared_rate_task(date_range: pd.DatetimeIndex) -> pd.Dat
             AND p.acct_period >= %s AND p.acct_period <= %s
             AND p.prim_subj IN ('营业收入', '毛利润', '净利润')
         """, (date_range.min(), date_range.max()))
-
-        df = pd.DataFrame(cur.fetchall(), columns=[
-                          desc[0] for desc in cur.description])
         df['date'] = pd.to_datetime(df['date'])
         df = df[df['date'].isin(date_range)]
 
@@ -66,7 +66,7 @@ def load_personnel_for_shared_rate_task(date_range: pd.DatetimeIndex) -> pd.Data
         conn, cur = connect_to_db()
 
         # 查询发薪人数数据，通过关联 dim_org_struc 表筛选前台和中台
-        cur.execute("""
+        df = fetch_dataframe(conn, """
             SELECT p.date, p.unique_lvl, 
                    SUM(p.num_people) as person_count
             FROM fact_personnel p
@@ -77,9 +77,6 @@ def load_personnel_for_shared_rate_task(date_range: pd.DatetimeIndex) -> pd.Data
             GROUP BY p.date, p.unique_lvl
         """, (date_range.min(), date_range.max()))
 
-        df = pd.DataFrame(cur.fetchall(), columns=[
-                          desc[0] for desc in cur.description])
-
         df['date'] = pd.to_datetime(df['date'])
         df = df[df['date'].isin(date_range)]
 
@@ -107,7 +104,7 @@ def load_human_cost_for_shared_rate_task(date_range: pd.DatetimeIndex) -> pd.Dat
         conn, cur = connect_to_db()
 
         # 关联 dim_exp_item 表筛选人力费用，关联 dim_org_struc 表筛选前台和中台
-        cur.execute("""
+        df = fetch_dataframe(conn, """
             SELECT 
                 e.acct_period as date,
                 e.unique_lvl,
@@ -122,9 +119,6 @@ def load_human_cost_for_shared_rate_task(date_range: pd.DatetimeIndex) -> pd.Dat
             GROUP BY e.acct_period, e.unique_lvl, e.bus_line
         """, (date_range.min(), date_range.max()))
 
-        df = pd.DataFrame(cur.fetchall(), columns=[
-                          desc[0] for desc in cur.description])
-
         df['date'] = pd.to_datetime(df['date'])
         df = df[df['date'].isin(date_range)]
 
@@ -400,6 +394,7 @@ def save_shared_rate_task(
             df_date_column='date',
             date_range=date_range
         )
+        invalidate_reference_table('fact_bus_shared_rate')
 
         print(f"保存综合比例到数据库完成，共 {len(df_shared_rate)} 条记录")
     except Exception as e:
@@ -0,0 +1,131 @@
+"""比较业务线分摊引擎与原逐列实现的速度与结果一致性
+
+用法（在项目根目录执行）：
+    python scripts/bench_allocation.py                 # 默认 50 万行，23 个金额列（应收口径）
+    python scripts/bench_allocation.py --rows 200000 --amount-columns 5 --repeat 5
+
+使用随机生成的一个月明细数据（约 5% 的 source_no 为手工分拆，每个拆 2~3 条业务线），
+分别用原来的 merge + 逐列 astype/相乘 + apply 实现和 utils.allocation.allocate 计算，
+输出耗时、加速比，并检查两者结果是否一致。
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.allocation import allocate, split_rows
+
+
+def make_month(rows: int, amount_columns: int, seed: int = 0):
+    """生成一个月的明细、分拆表和组织架构"""
+    rng = np.random.default_rng(seed)
+    levels = [f"公司{i // 40}-部门{i // 8}-组{i}" for i in range(400)]
+    bus_lines = ["能源运营", "能源硬件", "支付", "金融科技", "无"]
+    org = pd.DataFrame({
+        "unique_lvl": levels,
+        "bus_line": rng.choice(bus_lines, size=len(levels)),
+    })
+
+    source_count = rows // 2
+    fact = pd.DataFrame({
+        "id": np.arange(rows),
+        "source_no": rng.integers(0, source_count, size=rows).astype(str),
+        "unique_lvl": rng.choice(levels, size=rows),
+        "acct_period": pd.Timestamp("2025-12-31"),
+    })
+    columns = [f"amt_{i}" for i in range(amount_columns)]
+    for col in columns:
+        fact[col] = rng.normal(10000, 3000, size=rows).round(2)
+
+    split_sources = rng.choice(source_count, size=source_count // 20, replace=False).astype(str)
+    parts = rng.integers(2, 4, size=len(split_sources))
+    split_source_no = np.repeat(split_sources, parts)
+    split_rate = np.concatenate([rng.dirichlet(np.ones(n)) for n in parts])
+    split = pd.DataFrame({
+        "class": "应收",
+        "source_no": split_source_no,
+        "bus_line": rng.choice(bus_lines[:-1], size=len(split_source_no)),
+        "unique_lvl": rng.choice(levels, size=len(split_source_no)),
+        "category": "间接归属",
+        "rate": split_rate,
+    })
+    return fact, split, org, columns
+
+
+def legacy_allocate(fact, split_table, org, amount_columns):
+    """原 process_receivable_task 的实现"""
+    df_bus = split_table[split_table["class"] == "应收"]
+    bus_list = df_bus["source_no"].tolist()
+
+    hand = fact[fact["source_no"].isin(bus_list)].merge(
+        df_bus[["source_no", "bus_line", "unique_lvl", "category", "rate"]],
+        on=["source_no"], how="left")
+    for col in amount_columns:
+        if col in hand.columns:
+            hand[col] = hand[col].astype(float)
+            hand[col] = hand[col] * hand["rate"]
+    hand = hand.drop(["id"], axis=1, errors="ignore")
+    hand = hand.rename(columns={"unique_lvl_x": "source_lvl", "unique_lvl_y": "unique_lvl"})
+    hand = hand.dropna(axis=1, how="all")
+
+    auto = fact[~fact["source_no"].isin(bus_list)].merge(
+        org[["unique_lvl", "bus_line"]], on=["unique_lvl"], how="left")
+    auto["source_lvl"] = auto["unique_lvl"]
+    auto["rate"] = 1
+    auto["category"] = auto["bus_line"].apply(lambda x: "无" if x == "无" else "直接归属")
+    auto = auto.dropna(axis=1, how="all")
+
+    all_columns = list(set(hand.columns) | set(auto.columns))
+    out = pd.concat([hand.reindex(columns=all_columns), auto.reindex(columns=all_columns)],
+                    ignore_index=True)
+    return out.drop(columns=["id"], axis=1, errors="ignore")
+
+
+def engine_allocate(fact, split_table, org, amount_columns):
+    return allocate(fact, split_rows(split_table, "应收"), org, amount_columns)
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    df = df[sorted(df.columns)]
+    df = df.astype({"rate": float})
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def _time(fn, repeat: int, *args):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较业务线分摊实现")
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--amount-columns", type=int, default=23)
+    parser.add_argument("--repeat", type=int, default=3, help="每种实现运行次数，取最快一次")
+    args = parser.parse_args()
+
+    fact, split_table, org, columns = make_month(args.rows, args.amount_columns)
+    print(f"明细 {len(fact)} 行，金额列 {len(columns)} 个，分拆行 {len(split_table)} 条，"
+          f"组织架构 {len(org)} 条\n")
+
+    legacy_seconds, legacy = _time(legacy_allocate, args.repeat, fact, split_table, org, columns)
+    engine_seconds, result = _time(engine_allocate, args.repeat, fact, split_table, org, columns)
+    print(f"原实现:   {legacy_seconds:.2f} 秒")
+    print(f"分摊引擎: {engine_seconds:.2f} 秒")
+    print(f"加速比:   {legacy_seconds / engine_seconds:.2f}x")
+
+    pd.testing.assert_frame_equal(_normalize(legacy), _normalize(result), check_dtype=False)
+    print("\n两种实现结果一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""比较不同 Excel 解析引擎的速度与结果一致性
+
+用法（在项目根目录执行）：
+    python scripts/bench_excel_backends.py                      # 使用默认 Excel 根目录
+    python scripts/bench_excel_backends.py /path/to/补充数据 --limit 20
+    python scripts/bench_excel_backends.py /path/to/补充数据 --mapped   # 同时比较 read_and_map_excel 的整体结果
+
+对每个工作簿分别用 openpyxl 与 calamine 读取全部工作表，输出耗时、加速比，
+并检查各工作表的行数、列名和列类型是否一致。
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.excel_utils import calamine_available, excel_engine, list_workbooks
+
+
+def _frame_signature(df: pd.DataFrame):
+    return len(df), [str(col) for col in df.columns], [str(dtype) for dtype in df.dtypes]
+
+
+def _compare(name: str, left: dict, right: dict) -> list:
+    """比较两个引擎的结果，返回差异描述列表"""
+    diffs = []
+    for key in sorted(set(left) | set(right), key=str):
+        if key not in left or key not in right:
+            diffs.append(f"{name} / {key}: 只有一个引擎读到该表")
+            continue
+        sig_left, sig_right = _frame_signature(left[key]), _frame_signature(right[key])
+        if sig_left != sig_right:
+            diffs.append(f"{name} / {key}: 行数/列/类型不一致 {sig_left} != {sig_right}")
+    return diffs
+
+
+def bench_workbooks(paths: list, engines: list) -> list:
+    """逐个工作簿读取全部工作表，打印耗时并返回差异"""
+    diffs = []
+    totals = {engine: 0.0 for engine in engines}
+    print(f"{'工作簿':<50} " + " ".join(f"{engine:>10}" for engine in engines))
+    for path in paths:
+        results, seconds = {}, {}
+        for engine in engines:
+            start = time.perf_counter()
+            results[engine] = pd.read_excel(path, sheet_name=None, engine=engine)
+            seconds[engine] = time.perf_counter() - start
+            totals[engine] += seconds[engine]
+        print(f"{os.path.basename(path)[:50]:<50} " +
+              " ".join(f"{seconds[engine]:>9.2f}s" for engine in engines))
+        if len(engines) == 2:
+            diffs += _compare(os.path.basename(path), results[engines[0]], results[engines[1]])
+
+    print(f"{'合计':<50} " + " ".join(f"{totals[engine]:>9.2f}s" for engine in engines))
+    if len(engines) == 2 and totals[engines[1]] > 0:
+        print(f"加速比（{engines[0]} / {engines[1]}）: {totals[engines[0]] / totals[engines[1]]:.2f}x")
+    return diffs
+
+
+def bench_mapped(root_directory: str, engines: list) -> list:
+    """用 read_and_map_excel 读取全部映射表，比较整体耗时与映射结果"""
+    from mypackage.mapping import combined_table_mapping, combined_column_mapping
+    from mypackage.utilities import read_and_map_excel
+
+    results = {}
+    for engine in engines:
+        start = time.perf_counter()
+        with excel_engine(engine):
+            results[engine] = read_and_map_excel(
+                root_directory, combined_table_mapping, combined_column_mapping)
+        print(f"read_and_map_excel [{engine}]: {time.perf_counter() - start:.2f} 秒，"
+              f"{len(results[engine])} 个表")
+    if len(engines) == 2:
+        return _compare("read_and_map_excel", results[engines[0]], results[engines[1]])
+    return []
+
+
+def main():
+    from modules.data_import.flows.data_import_flow import DEFAULT_ROOT_DIRECTORY
+
+    parser = argparse.ArgumentParser(description="比较 Excel 解析引擎")
+    parser.add_argument("root_directory", nargs="?", default=DEFAULT_ROOT_DIRECTORY)
+    parser.add_argument("--limit", type=int, default=0, help="最多测试的工作簿数量，0 表示全部")
+    parser.add_argument("--mapped", action="store_true", help="同时比较 read_and_map_excel 的结果")
+    args = parser.parse_args()
+
+    engines = ["openpyxl"]
+    if calamine_available():
+        engines.append("calamine")
+    else:
+        print("calamine 不可用（需要 python-calamine 且 pandas >= 2.2），只测试 openpyxl")
+
+    paths = [
+        os.path.join(args.root_directory, path) for path in list_workbooks(args.root_directory)
+        if path.lower().endswith((".xlsx", ".xlsm"))
+    ]
+    if args.limit:
+        paths = paths[:args.limit]
+    print(f"共 {len(paths)} 个工作簿，目录: {args.root_directory}\n")
+
+    diffs = bench_workbooks(paths, engines)
+    if args.mapped:
+        print()
+        diffs += bench_mapped(args.root_directory, engines)
+
+    print()
+    if diffs:
+        print(f"发现 {len(diffs)} 处差异:")
+        for diff in diffs:
+            print(f"  - {diff}")
+    else:
+        print("各引擎结果一致")
+
+
+if __name__ == "__main__":
+    main()
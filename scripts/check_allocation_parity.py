@@ -0,0 +1,157 @@
+"""核对收入、费用明细的数据库内执行结果与 pandas 路径是否一致
+
+用法（在项目根目录执行）：
+    python scripts/check_allocation_parity.py --year 2025 --month 12
+    python scripts/check_allocation_parity.py --year 2025 --month 12 --rtol 1e-12   # 允许浮点误差
+
+用同一份分拆表、组织架构分别执行：
+1. pandas 路径：依次调用 revenue_tasks / expense_tasks 中各 task 的函数体
+2. 数据库路径：db_allocation_tasks 生成同样的查询，只读取结果，事务最后回滚（不写入任何表）
+比较写入明细表的数据以及读回给利润表的数据，默认要求逐位一致。
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.date_utils import get_date_range_by_month
+from utils.db_utils import fetch_dataframe, get_engine, get_table_columns
+from modules.bus_line_cal.tasks.data_preparation_tasks import calculate_person_weight_task
+from modules.bus_line_cal.tasks import revenue_tasks, expense_tasks
+from modules.bus_line_cal.tasks.db_allocation_tasks import (
+    EXPENSE_FINAL,
+    REVENUE_STAGE,
+    SAVE_RENAMES,
+    detail_select,
+    prepare_expense,
+    prepare_revenue,
+    profit_select,
+)
+
+
+def pandas_revenue(date_range, df_upload_merge_all, df_org):
+    """pandas 路径：返回 (公摊比例还原前的数据, 公摊比例还原后的数据)"""
+    df = revenue_tasks.load_revenue_data_task.fn(date_range)
+    hand = revenue_tasks.process_manual_revenue_task.fn(df, df_upload_merge_all)
+    auto = revenue_tasks.process_auto_revenue_task.fn(df, df_upload_merge_all, df_org)
+    df = revenue_tasks.merge_revenue_data_task.fn(hand, auto)
+    df = revenue_tasks.pivot_revenue_data_task.fn(df)
+    df = revenue_tasks.update_energy_hardware_task.fn(df)
+    return df, revenue_tasks.apply_shared_rate_to_revenue_task.fn(df, date_range)
+
+
+def pandas_expense(date_range, df_upload_merge_all, df_org):
+    """pandas 路径：返回公摊比例还原后的数据"""
+    df = expense_tasks.load_expense_data_task.fn(date_range)
+    gap = expense_tasks.process_gap_expense_task.fn(df, df_upload_merge_all)
+    hand = expense_tasks.process_manual_expense_task.fn(df, df_upload_merge_all)
+    auto = expense_tasks.process_auto_expense_task.fn(df, df_upload_merge_all, df_org)
+    df = expense_tasks.merge_expense_data_task.fn(hand, auto, gap)
+    df = expense_tasks.update_energy_hardware_expense_task.fn(df)
+    return expense_tasks.apply_shared_rate_to_expense_task.fn(df, date_range)
+
+
+def database_results(date_range, df_upload_merge_all, df_org) -> dict:
+    """数据库路径：只读取各查询结果，事务回滚"""
+    conn = get_engine().raw_connection()
+    try:
+        cur = conn.cursor()
+        results = {}
+
+        stage_columns, final_sql = prepare_revenue(cur, date_range, df_upload_merge_all, df_org)
+        sql, _ = detail_select('fact_bus_revenue', f"({final_sql}) f", stage_columns)
+        results['fact_bus_revenue'] = fetch_dataframe(conn, sql)
+        results['收入（利润表格式）'] = fetch_dataframe(
+            conn, profit_select(REVENUE_STAGE, stage_columns, {'acct_period': 'date'}))
+
+        stage_columns = prepare_expense(cur, date_range, df_upload_merge_all, df_org)
+        sql, _ = detail_select('fact_bus_expense', EXPENSE_FINAL, stage_columns)
+        results['fact_bus_expense'] = fetch_dataframe(conn, sql)
+        results['费用（利润表格式）'] = fetch_dataframe(
+            conn, profit_select(EXPENSE_FINAL, stage_columns, {'exp_amt': 'mo_amt', 'acct_period': 'date'}))
+        return results
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def _as_saved(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    """按 save_*_detail_task 的方式改名，只保留目标表中存在的列"""
+    df = df.rename(columns=SAVE_RENAMES).drop(['id'], axis=1, errors='ignore')
+    return df[[col for col in df.columns if col in get_table_columns(table_name, ['id'])]]
+
+
+def _normalize(df: pd.DataFrame, numeric_columns) -> pd.DataFrame:
+    """统一列顺序、类型和行顺序后再比较"""
+    df = df[sorted(df.columns)].copy()
+    for col in df.columns:
+        if col in ('acct_period', 'date'):
+            df[col] = pd.to_datetime(df[col])
+        elif col in numeric_columns:
+            df[col] = pd.to_numeric(df[col]).astype(float)
+        else:
+            # 分类列、混合类型列统一按文本比较，空值保持为空
+            values = df[col].astype(object)
+            df[col] = values.where(values.notna(), None).map(lambda v: None if v is None else str(v))
+    return df.sort_values(list(df.columns), na_position='last').reset_index(drop=True)
+
+
+def compare(name: str, expected: pd.DataFrame, actual: pd.DataFrame, rtol: float) -> bool:
+    """比较一组结果，返回是否一致"""
+    missing = sorted(set(actual.columns) - set(expected.columns))
+    extra = sorted(set(expected.columns) - set(actual.columns))
+    if missing or extra:
+        print(f"✗ {name}: 列不一致，数据库路径多出 {missing}，缺少 {extra}")
+        return False
+    # 以数据库返回的类型为准确定数值列（pandas 路径中 rate 等列可能为 object）
+    numeric_columns = {
+        col for col in actual.columns
+        if pd.api.types.is_numeric_dtype(actual[col]) and not pd.api.types.is_bool_dtype(actual[col])
+    }
+    try:
+        pd.testing.assert_frame_equal(
+            _normalize(expected, numeric_columns), _normalize(actual, numeric_columns),
+            check_dtype=False, check_exact=rtol == 0, rtol=rtol or 1e-5
+        )
+    except AssertionError as e:
+        print(f"✗ {name}: 结果不一致（pandas {len(expected)} 行，数据库 {len(actual)} 行）\n{e}")
+        return False
+    print(f"✓ {name}: 一致，共 {len(actual)} 行")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="核对收入、费用明细的数据库内执行结果")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--month", type=int, required=True)
+    parser.add_argument("--rtol", type=float, default=0.0, help="金额相对误差容忍度，默认 0（逐位一致）")
+    args = parser.parse_args()
+
+    date_range = get_date_range_by_month(args.year, args.month)
+    df_upload_merge_all, df_org = calculate_person_weight_task.fn()
+
+    revenue_to_profit, revenue_final = pandas_revenue(date_range, df_upload_merge_all, df_org)
+    expense_final = pandas_expense(date_range, df_upload_merge_all, df_org)
+    actual = database_results(date_range, df_upload_merge_all, df_org)
+
+    # 利润表格式只比较数据库路径读回的列（其余列在 merge_profit_data_task 中会被丢弃）
+    def read_back_columns(df: pd.DataFrame, name: str) -> pd.DataFrame:
+        return df[[col for col in actual[name].columns if col in df.columns]]
+
+    expected = {
+        'fact_bus_revenue': _as_saved(revenue_final, 'fact_bus_revenue'),
+        '收入（利润表格式）': read_back_columns(revenue_to_profit, '收入（利润表格式）'),
+        'fact_bus_expense': _as_saved(expense_final, 'fact_bus_expense'),
+        '费用（利润表格式）': read_back_columns(expense_final, '费用（利润表格式）'),
+    }
+    ok = all([compare(name, expected[name], actual[name], args.rtol) for name in expected])
+    if not ok:
+        sys.exit(1)
+    print(f"\n{args.year}年{args.month}月 数据库内执行结果与 pandas 路径一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""核对增量写入补充行哈希列后，按期间读取的数据不包含行哈希列、可以直接写入明细表
+
+用法（在项目根目录执行）：
+    python scripts/check_row_hash_load.py
+
+在当前 schema 中创建两张临时检查表（源表、明细表，结束时删除）：
+1. 源表写入一个月的数据后调用 ensure_row_hash_column（与 data_import_flow(delta_load=True) 相同）
+2. 用 load_period_data 读取该月数据，确认结果中没有 row_hash 列
+3. 把读取结果用 delete_data_add_data_by_DateRange 写入没有 row_hash 列的明细表，确认不报错且行数一致
+"""
+import os
+import sys
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.bulk_writer import delete_data_add_data_by_DateRange, ensure_row_hash_column
+from utils.date_utils import get_date_range_by_month
+from utils.db_utils import ROW_HASH_COLUMN, get_engine, get_table_columns, load_period_data
+
+
+def _execute(*statements) -> None:
+    conn = get_engine().raw_connection()
+    try:
+        cur = conn.cursor()
+        for sql, params in statements:
+            cur.execute(sql, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    suffix = uuid.uuid4().hex[:8]
+    source_table = f"tmp_row_hash_source_{suffix}"
+    detail_table = f"tmp_row_hash_detail_{suffix}"
+    date_range = get_date_range_by_month(2025, 1)
+
+    _execute(
+        (f"CREATE TABLE {source_table} (acct_period date, unique_lvl text, "
+         f"mo_amt numeric(18, 2), last_modified timestamp DEFAULT now())", None),
+        (f"CREATE TABLE {detail_table} (acct_period date, unique_lvl text, mo_amt numeric(18, 2))", None),
+        (f"INSERT INTO {source_table} (acct_period, unique_lvl, mo_amt) VALUES "
+         f"(%s, '公司-部门-组1', 100.25), (%s, '公司-部门-组2', -3.5)",
+         ('2025-01-01', '2025-01-31')),
+    )
+    try:
+        ensure_row_hash_column(source_table)
+        _execute((f"UPDATE {source_table} SET {ROW_HASH_COLUMN} = 1", None))
+
+        columns = get_table_columns(source_table)
+        assert ROW_HASH_COLUMN not in columns, f"get_table_columns 返回了 {ROW_HASH_COLUMN}: {columns}"
+
+        df = load_period_data(
+            source_table, 'acct_period', date_range, ['acct_period', 'unique_lvl', 'mo_amt'])
+        assert ROW_HASH_COLUMN not in df.columns, f"load_period_data 读取了 {ROW_HASH_COLUMN}"
+        assert len(df) == 2, f"应读取 2 行，实际 {len(df)} 行"
+
+        delete_data_add_data_by_DateRange(detail_table, 'acct_period', df, 'acct_period', date_range)
+        conn = get_engine().raw_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(f"SELECT count(*) FROM {detail_table}")
+            written = cur.fetchone()[0]
+            conn.rollback()
+        finally:
+            conn.close()
+        assert written == len(df), f"明细表应写入 {len(df)} 行，实际 {written} 行"
+    finally:
+        _execute(
+            (f"DROP TABLE IF EXISTS {source_table}", None),
+            (f"DROP TABLE IF EXISTS {detail_table}", None),
+        )
+
+    print(f"✓ 补充 {ROW_HASH_COLUMN} 列后按期间读取、写入明细表正常")
+
+
+if __name__ == "__main__":
+    main()
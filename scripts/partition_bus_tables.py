@@ -0,0 +1,217 @@
+"""把业务线明细表改为按月范围分区
+
+用法（在项目根目录执行）：
+    python scripts/partition_bus_tables.py --dry-run              # 只打印将要执行的 SQL
+    python scripts/partition_bus_tables.py                        # 转换全部明细表，旧表保留为 <表名>_unpartitioned
+    python scripts/partition_bus_tables.py --tables fact_bus_revenue --drop-old
+
+每张表在一个事务内完成：
+1. 旧表改名为 <表名>_unpartitioned
+2. 按旧表结构新建同名分区表（PARTITION BY RANGE (日期列)），自增序列改归新表所有
+3. 按旧表数据中出现的月份以及本月、下月建立月分区（<表名>_pYYYYMM），另建默认分区承接空日期
+4. 复制数据并核对行数
+5. 重建旧表的索引（分区表上的唯一索引必须包含日期列，不包含的跳过并提示）
+
+有视图依赖旧表时跳过该表（改名后视图仍会指向旧表），需先处理视图。
+转换后 utils.bulk_writer.delete_data_add_data_by_DateRange 会自动改用月分区替换。
+"""
+import argparse
+import os
+import re
+import sys
+from datetime import date
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.bulk_writer import partition_name
+from utils.db_utils import get_engine
+
+# {表名: 分区日期列}
+BUS_DETAIL_TABLES = {
+    "fact_bus_revenue": "acct_period",
+    "fact_bus_expense": "acct_period",
+    "fact_bus_profit_bd": "date",
+    "fact_bus_receivable": "acct_period",
+    "fact_bus_inventory": "acct_period",
+    "fact_bus_inventory_on_way": "acct_period",
+}
+
+
+class _Executor:
+    """执行或（--dry-run 时）只打印 DDL"""
+
+    def __init__(self, cur, dry_run: bool):
+        self.cur = cur
+        self.dry_run = dry_run
+
+    def __call__(self, sql: str, params=()):
+        if self.dry_run:
+            print(f"  {self.cur.mogrify(sql, params).decode() if params else sql};")
+        else:
+            self.cur.execute(sql, params)
+
+
+def _dependent_views(cur, table_name: str) -> list:
+    cur.execute(
+        """
+        SELECT DISTINCT v.relname
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.refobjid = to_regclass(%s) AND v.oid <> d.refobjid
+        """,
+        (table_name,)
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def _sequence_columns(cur, table_name: str) -> list:
+    """旧表中默认值为 nextval 的列及其序列"""
+    cur.execute(
+        """
+        SELECT a.attname, pg_get_serial_sequence(%s, a.attname)
+        FROM pg_attribute a
+        WHERE a.attrelid = to_regclass(%s) AND a.attnum > 0 AND NOT a.attisdropped
+        """,
+        (table_name, table_name)
+    )
+    return [(column, sequence) for column, sequence in cur.fetchall() if sequence]
+
+
+def _identity_columns(cur, table_name: str) -> list:
+    cur.execute(
+        "SELECT attname FROM pg_attribute "
+        "WHERE attrelid = to_regclass(%s) AND attidentity <> ''",
+        (table_name,)
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def _index_definitions(cur, table_name: str) -> list:
+    cur.execute(
+        "SELECT pg_get_indexdef(indexrelid), indisunique FROM pg_index "
+        "WHERE indrelid = to_regclass(%s)",
+        (table_name,)
+    )
+    return cur.fetchall()
+
+
+def _months(cur, table_name: str, date_column: str) -> list:
+    cur.execute(
+        f"SELECT DISTINCT date_trunc('month', {date_column})::date FROM {table_name} "
+        f"WHERE {date_column} IS NOT NULL"
+    )
+    months = {pd.Period(row[0], freq="M") for row in cur.fetchall()}
+    this_month = pd.Period(date.today(), freq="M")
+    return sorted(months | {this_month, this_month + 1})
+
+
+def convert_table(conn, table_name: str, date_column: str, drop_old: bool, dry_run: bool) -> bool:
+    """
+    把一张表改为按月分区
+
+    Returns:
+        是否已转换
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table_name,))
+    row = cur.fetchone()
+    if row is None:
+        print(f"[SKIP] {table_name}: 表不存在")
+        return False
+    if row[0] == "p":
+        print(f"[SKIP] {table_name}: 已是分区表")
+        return False
+    views = _dependent_views(cur, table_name)
+    if views:
+        print(f"[SKIP] {table_name}: 以下视图依赖该表，请先删除或改写后再转换: {views}")
+        return False
+
+    old_table = f"{table_name}_unpartitioned"
+    execute = _Executor(cur, dry_run)
+    sequences = _sequence_columns(cur, table_name)
+    identities = _identity_columns(cur, table_name)
+    indexes = _index_definitions(cur, table_name)
+    months = _months(cur, table_name, date_column)
+    print(f"[{table_name}] 月分区 {len(months)} 个（{months[0]} ~ {months[-1]}），索引 {len(indexes)} 个")
+
+    execute(f"ALTER TABLE {table_name} RENAME TO {old_table}")
+    execute(
+        f"CREATE TABLE {table_name} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+        f"INCLUDING STORAGE INCLUDING COMMENTS) PARTITION BY RANGE ({date_column})"
+    )
+    # serial 列：序列改归新表所有，删除旧表时不会连带删除
+    for column, sequence in sequences:
+        if column in identities:
+            continue
+        execute(f"ALTER SEQUENCE {sequence} OWNED BY {table_name}.{column}")
+    # identity 列：LIKE 不复制 identity，改为共用一个新序列，从旧表最大值继续
+    for column in identities:
+        sequence = f"{table_name}_{column}_seq"
+        execute(f"CREATE SEQUENCE IF NOT EXISTS {sequence} OWNED BY {table_name}.{column}")
+        execute(f"SELECT setval('{sequence}', COALESCE((SELECT max({column}) FROM {old_table}), 0) + 1, false)")
+        execute(f"ALTER TABLE {table_name} ALTER COLUMN {column} SET DEFAULT nextval('{sequence}')")
+
+    for month in months:
+        start = month.start_time.strftime("%Y-%m-%d")
+        end = (month + 1).start_time.strftime("%Y-%m-%d")
+        execute(
+            f"CREATE TABLE {partition_name(table_name, month)} PARTITION OF {table_name} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            (start, end)
+        )
+    execute(f"CREATE TABLE {table_name}_default PARTITION OF {table_name} DEFAULT")
+
+    execute(f"INSERT INTO {table_name} SELECT * FROM {old_table}")
+    if not dry_run:
+        cur.execute(f"SELECT (SELECT count(*) FROM {table_name}), (SELECT count(*) FROM {old_table})")
+        new_count, old_count = cur.fetchone()
+        if new_count != old_count:
+            raise RuntimeError(f"{table_name} 行数不一致：新表 {new_count}，旧表 {old_count}")
+        print(f"  已复制 {new_count} 行")
+
+    # 数据写入后再建索引
+    for definition, is_unique in indexes:
+        columns = re.search(r"\((.*)\)", definition).group(1)
+        if is_unique and date_column not in re.findall(r"\w+", columns):
+            print(f"  [WARN] 唯一索引不包含 {date_column}，分区表上无法保留，已跳过: {definition}")
+            continue
+        # 去掉原索引名（由数据库自动命名），表名换成新表
+        execute(re.sub(r"^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+", rf"\1 ON {table_name}", definition))
+    if drop_old:
+        execute(f"DROP TABLE {old_table}")
+    execute(f"ANALYZE {table_name}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把业务线明细表改为按月范围分区")
+    parser.add_argument("--tables", nargs="+", choices=sorted(BUS_DETAIL_TABLES),
+                        default=list(BUS_DETAIL_TABLES), help="需要转换的表，默认全部")
+    parser.add_argument("--drop-old", action="store_true", help="转换成功后删除旧表")
+    parser.add_argument("--dry-run", action="store_true", help="只打印 SQL，不执行")
+    args = parser.parse_args()
+
+    for table_name in args.tables:
+        conn = get_engine().raw_connection()
+        try:
+            converted = convert_table(
+                conn, table_name, BUS_DETAIL_TABLES[table_name], args.drop_old, args.dry_run)
+            if args.dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+                if converted:
+                    print(f"✓ {table_name} 已转换为按月分区表")
+        except Exception as e:
+            conn.rollback()
+            print(f"✗ {table_name} 转换失败，已回滚: {str(e)}")
+            raise
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
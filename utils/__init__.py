@@ -4,9 +4,19 @@ from .date_utils import (
     get_date_range_by_months,
     get_date_range_by_year_from_month,
 )
+from .excel_utils import (
+    read_and_map_excel_parallel,
+    print_read_timings,
+    read_excel_sheets,
+    excel_engine,
+)
 
 __all__ = [
     "get_date_range_by_month",
     "get_date_range_by_months",
     "get_date_range_by_year_from_month",
+    "read_and_map_excel_parallel",
+    "print_read_timings",
+    "read_excel_sheets",
+    "excel_engine",
 ]
@@ -0,0 +1,207 @@
+"""业务线分摊引擎
+
+收入、费用、利润、应收、存货、在途存货的业务线归属规则相同：
+- 手工分拆：source_no 位于分拆表中的数据，按分拆表逐行展开，金额 × rate
+- 自动归属：其余数据按 unique_lvl 关联组织架构取 bus_line，rate = 1
+- 比例缺口：分拆表中 Σrate < 1 的 source_no，缺口 1 − Σrate 归入公摊
+
+这里统一实现：分拆只对 (行号, source_no) 做一次关联再按行号取数，组织架构通过索引映射，
+所有金额列用一次二维 numpy 广播乘以 rate，不再逐列 astype/相乘，也不再用 apply 计算 category。
+"""
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .frame_schema import concat_aligned
+from .validation import RATE_TOLERANCE
+
+SPLIT_COLUMNS = ["source_no", "bus_line", "unique_lvl", "category", "rate"]
+
+
+def split_rows(split_table: pd.DataFrame, class_name: str) -> pd.DataFrame:
+    """
+    取分拆表中指定类型的行
+
+    Args:
+        split_table: 业务线比例数据（df_upload_merge_all / fact_bus_line）
+        class_name: 类型，如 '收入'、'费用'、'应收'
+
+    Returns:
+        该类型的分拆行
+    """
+    return split_table[split_table["class"] == class_name]
+
+
+def scale_amounts(df: pd.DataFrame, amount_columns: List[str], rate) -> pd.DataFrame:
+    """
+    所有金额列一次性乘以比例（原地修改并返回 df）
+
+    Args:
+        df: 数据
+        amount_columns: 金额列，不存在的列忽略
+        rate: 与 df 等长的比例
+
+    Returns:
+        金额列转为 float 并乘以比例后的 df
+    """
+    columns = [col for col in amount_columns if col in df.columns]
+    if columns and len(df):
+        rate = np.asarray(rate, dtype=float)
+        df[columns] = df[columns].to_numpy(dtype=float) * rate[:, None]
+    elif columns:
+        df[columns] = df[columns].astype(float)
+    return df
+
+
+def allocate_manual(
+    fact: pd.DataFrame,
+    split: pd.DataFrame,
+    amount_columns: List[str],
+    split_level_as: str = "unique_lvl"
+) -> pd.DataFrame:
+    """
+    手工分拆：source_no 位于分拆表中的数据按分拆行展开并乘以比例
+
+    结果与 fact.merge(split[SPLIT_COLUMNS], on='source_no', how='left') 的行顺序一致。
+
+    Args:
+        fact: 明细数据
+        split: 该类型的分拆行（split_rows 的结果）
+        amount_columns: 需要乘以比例的金额列
+        split_level_as: 分拆表 unique_lvl 在结果中的列名；
+            'unique_lvl'（默认）时明细原 unique_lvl 改名为 source_lvl，
+            'source_lvl' 时明细保留原 unique_lvl（利润表的口径）
+
+    Returns:
+        分拆后的数据，包含 bus_line、category、rate、unique_lvl、source_lvl
+    """
+    fact_level_as = "source_lvl" if split_level_as == "unique_lvl" else "unique_lvl"
+    in_split = fact["source_no"].isin(split["source_no"]).to_numpy()
+    keys = pd.DataFrame({
+        "_pos": np.flatnonzero(in_split),
+        "source_no": fact["source_no"].to_numpy()[in_split],
+    }).merge(split[SPLIT_COLUMNS], on="source_no", how="left")
+
+    out = fact.drop(columns=["bus_line", "category", "rate"], errors="ignore")
+    out = out.iloc[keys["_pos"].to_numpy()].reset_index(drop=True)
+    out = out.rename(columns={"unique_lvl": fact_level_as})
+    out["bus_line"] = keys["bus_line"].to_numpy()
+    out[split_level_as] = keys["unique_lvl"].to_numpy()
+    out["category"] = keys["category"].to_numpy()
+    out["rate"] = keys["rate"].to_numpy(dtype=float)
+    return scale_amounts(out, amount_columns, out["rate"])
+
+
+def allocate_auto(
+    fact: pd.DataFrame,
+    org: pd.DataFrame,
+    split: Optional[pd.DataFrame] = None,
+    mask: Optional[pd.Series] = None,
+    none_category: str = "无"
+) -> pd.DataFrame:
+    """
+    自动归属：按 unique_lvl 从组织架构取业务线，rate = 1
+
+    Args:
+        fact: 明细数据
+        org: 组织架构（需包含 unique_lvl、bus_line）
+        split: 该类型的分拆行，不传 mask 时取不在分拆表中的数据
+        mask: 需要自动归属的行（优先于 split）
+        none_category: 业务线为 '无' 时的 category，其余为 '直接归属'
+
+    Returns:
+        自动归属后的数据，包含 bus_line、source_lvl、rate、category
+    """
+    if mask is None:
+        mask = ~fact["source_no"].isin(split["source_no"])
+    org = org[["unique_lvl", "bus_line"]]
+    if org["unique_lvl"].is_unique:
+        out = fact[mask].reset_index(drop=True)
+        out["bus_line"] = out["unique_lvl"].map(org.set_index("unique_lvl")["bus_line"])
+    else:
+        out = fact[mask].merge(org, on=["unique_lvl"], how="left")
+    out["source_lvl"] = out["unique_lvl"]
+    out["rate"] = 1
+    out["category"] = np.where(out["bus_line"].eq("无"), none_category, "直接归属")
+    return out
+
+
+def split_gaps(split: pd.DataFrame) -> pd.Series:
+    """
+    分拆表中比例不完整的 source_no 及其缺口 1 − Σrate
+
+    rate 转为 float 后求和，合计恰好为 1 的分拆可能得到 0.9999999999999999，
+    因此按 RATE_TOLERANCE 判断，避免产生比例接近 0 的缺口行。
+
+    Args:
+        split: 该类型的分拆行
+
+    Returns:
+        以 source_no 为索引的缺口比例
+    """
+    total = split["rate"].astype(float).groupby(split["source_no"]).sum()
+    return (1 - total[total < 1 - RATE_TOLERANCE]).rename("rate")
+
+
+def allocate_gap(
+    fact: pd.DataFrame,
+    split: pd.DataFrame,
+    amount_columns: List[str],
+    bus_line: str = "无",
+    category: str = "公摊费用"
+) -> pd.DataFrame:
+    """
+    比例缺口：分拆表中 Σrate < 1 的 source_no，按 1 − Σrate 归入公摊（见 split_gaps）
+
+    Args:
+        fact: 明细数据
+        split: 该类型的分拆行
+        amount_columns: 需要乘以比例的金额列
+        bus_line: 缺口部分的业务线
+        category: 缺口部分的 category
+
+    Returns:
+        缺口部分的数据
+    """
+    gap = split_gaps(split)
+    out = fact[fact["source_no"].isin(gap.index)].reset_index(drop=True)
+    out["rate"] = out["source_no"].map(gap).astype(float)
+    scale_amounts(out, amount_columns, out["rate"])
+    out["bus_line"] = bus_line
+    out["source_lvl"] = out["unique_lvl"]
+    out["category"] = category
+    return out
+
+
+def allocate(
+    fact: pd.DataFrame,
+    split: pd.DataFrame,
+    org: pd.DataFrame,
+    amount_columns: List[str],
+    none_category: str = "无"
+) -> pd.DataFrame:
+    """
+    手工分拆 + 自动归属，合并为一张表（资产类明细使用）
+
+    两部分各自去掉全空列后按列名对齐合并，并删除 id 列。
+
+    Args:
+        fact: 明细数据
+        split: 该类型的分拆行
+        org: 组织架构
+        amount_columns: 需要乘以比例的金额列
+        none_category: 自动归属部分业务线为 '无' 时的 category
+
+    Returns:
+        分摊后的全部数据
+    """
+    hand = allocate_manual(fact, split, amount_columns).drop(columns=["id"], errors="ignore")
+    auto = allocate_auto(fact, org, split=split, none_category=none_category)
+    # 删除空列或全 NA 列，避免拼接警告
+    hand = hand.dropna(axis=1, how="all")
+    auto = auto.dropna(axis=1, how="all")
+    columns = list(hand.columns) + [col for col in auto.columns if col not in hand.columns]
+    out = concat_aligned(
+        [hand.reindex(columns=columns), auto.reindex(columns=columns)], ignore_index=True)
+    return out.drop(columns=["id"], errors="ignore")
@@ -0,0 +1,885 @@
+"""基于 COPY 的批量写库工具
+
+与 mypackage.utilities 中的写库函数同名、同参数，调用方只需替换导入即可：
+先删除目标范围内的旧数据，再用 COPY FROM STDIN（CSV 格式，内存缓冲）写入新数据，
+删除与写入在同一个事务内完成，任一步失败整体回滚。
+df 中有目标表不存在的列时报错（与原实现的 to_sql 相同），确需忽略时传 ignore_extra_columns=True。
+
+设置环境变量 PREFECT_BULK_COPY=0 可退回 mypackage.utilities 的原始实现。
+
+delta_update_between_dates / delta_update_full_table 按行哈希比对，只写入变化的行。
+
+目标表按月范围分区（见 scripts/partition_bus_tables.py）时，delete_data_add_data_by_DateRange
+把每个月写入新的暂存表，再用 DETACH/ATTACH 在一个短事务内替换该月分区，不再逐行删除。
+建立暂存表、替换分区等 DDL 与写入使用同一个连接（依次提交的短事务），每个连接名额只占用一个数据库连接。
+设置环境变量 PREFECT_PARTITION_SWAP=0 可关闭分区替换；需要父表锁的 DDL 等锁超过
+PREFECT_PARTITION_LOCK_TIMEOUT（默认 5s）时回滚重试，最多 PREFECT_PARTITION_LOCK_RETRIES 次（默认 5）。
+"""
+import io
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from .db_utils import ROW_HASH_COLUMN, get_engine
+
+BULK_COPY_ENABLED = os.environ.get("PREFECT_BULK_COPY", "1") != "0"
+PARTITION_SWAP_ENABLED = os.environ.get("PREFECT_PARTITION_SWAP", "1") != "0"
+PARTITION_LOCK_TIMEOUT = os.environ.get("PREFECT_PARTITION_LOCK_TIMEOUT", "5s")
+PARTITION_LOCK_RETRIES = int(os.environ.get("PREFECT_PARTITION_LOCK_RETRIES", "5"))
+
+_NULL = r"\N"
+_INTEGER_TYPES = {"smallint", "integer", "bigint"}
+
+
+def _split_table_name(table_name: str) -> Tuple[Optional[str], str]:
+    if "." in table_name:
+        schema, name = table_name.split(".", 1)
+        return schema, name
+    return None, table_name
+
+
+def _table_columns(cur, table_name: str) -> Dict[str, str]:
+    """读取目标表的列名及类型，表不存在时返回空字典（辅助函数）"""
+    schema, name = _split_table_name(table_name)
+    cur.execute(
+        """
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_name = %s AND table_schema = COALESCE(%s, current_schema())
+        ORDER BY ordinal_position
+        """,
+        (name, schema)
+    )
+    return {column: data_type for column, data_type in cur.fetchall()}
+
+
+def _frame_to_csv(
+    df: pd.DataFrame,
+    table_columns: Dict[str, str],
+    ignore_extra_columns: bool = False
+) -> Tuple[io.StringIO, List[str]]:
+    """
+    将 DataFrame 转为 COPY 所需的 CSV 缓冲区（辅助函数）
+
+    df 中有目标表不存在的列时报错（与 to_sql 相同），ignore_extra_columns=True 时只写入目标表中存在的列；
+    整数列中的缺失值会使 pandas 转成浮点数（如 1.0），这里统一转为可空整数类型，避免 COPY 报类型错误，
+    有非整数值时报错并指出列名。
+    """
+    columns = [col for col in df.columns if col in table_columns]
+    ignored = [col for col in df.columns if col not in table_columns]
+    if ignored:
+        if not ignore_extra_columns:
+            raise ValueError(f"以下列在目标表中不存在: {ignored}")
+        print(f"[WARN] 以下列在目标表中不存在，已忽略: {ignored}")
+
+    out = df[columns]
+    int_columns = [
+        col for col in columns
+        if table_columns[col] in _INTEGER_TYPES and pd.api.types.is_float_dtype(out[col])
+    ]
+    for col in int_columns:
+        values = out[col].dropna()
+        fractional = values[(values != values.round()) | values.isin([float('inf'), float('-inf')])]
+        if len(fractional):
+            raise ValueError(
+                f"列 {col} 写入整数类型（{table_columns[col]}），但有 {len(fractional)} 个非整数值，"
+                f"例如: {fractional.head(3).tolist()}"
+            )
+    if int_columns:
+        out = out.astype({col: "Int64" for col in int_columns})
+
+    buffer = io.StringIO()
+    out.to_csv(buffer, index=False, header=False, na_rep=_NULL)
+    buffer.seek(0)
+    return buffer, columns
+
+
+def _copy_replace(
+    table_name: str,
+    df: pd.DataFrame,
+    delete_sql: Optional[str] = None,
+    delete_params: Tuple = (),
+    ignore_extra_columns: bool = False
+) -> bool:
+    """
+    在同一事务中执行删除与 COPY 写入（辅助函数）
+
+    Returns:
+        是否已写入；目标表不存在时返回 False，由调用方退回原始实现（自动建表）
+    """
+    start = time.perf_counter()
+    conn = get_engine().raw_connection()
+    try:
+        cur = conn.cursor()
+        table_columns = _table_columns(cur, table_name)
+        if not table_columns:
+            conn.rollback()
+            return False
+
+        if delete_sql is not None:
+            cur.execute(delete_sql, delete_params)
+            deleted = cur.rowcount
+        else:
+            deleted = 0
+
+        copy_frame(cur, table_name, df, table_columns, ignore_extra_columns)
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    seconds = time.perf_counter() - start
+    rate = len(df) / seconds if seconds > 0 else 0
+    print(f"[COPY] {table_name}: 删除 {deleted} 行，写入 {len(df)} 行，"
+          f"耗时 {seconds:.2f} 秒（{rate:,.0f} 行/秒）")
+    return True
+
+
+def copy_frame(
+    cur,
+    table_name: str,
+    df: pd.DataFrame,
+    table_columns: Dict[str, str],
+    ignore_extra_columns: bool = False
+) -> None:
+    """
+    在调用方的事务中用 COPY 写入 DataFrame
+
+    Args:
+        cur: 游标
+        table_name: 目标表名
+        df: 要写入的数据
+        table_columns: 目标表的 {列名: 类型}
+        ignore_extra_columns: df 中有 table_columns 以外的列时忽略这些列（默认报错）
+    """
+    if df.empty:
+        return
+    buffer, columns = _frame_to_csv(df, table_columns, ignore_extra_columns)
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    cur.copy_expert(
+        f"COPY {table_name} ({column_list}) FROM STDIN "
+        f"WITH (FORMAT csv, NULL '{_NULL}')",
+        buffer
+    )
+
+
+def _next_day(value) -> str:
+    return (pd.Timestamp(value).normalize() + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def _day(value) -> str:
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+def add_data(table_name: str, df: pd.DataFrame, ignore_extra_columns: bool = False) -> None:
+    """
+    追加写入数据
+
+    Args:
+        table_name: 目标表名
+        df: 要写入的数据
+        ignore_extra_columns: 忽略 df 中目标表不存在的列（默认报错）
+    """
+    if BULK_COPY_ENABLED and _copy_replace(
+        table_name, df, ignore_extra_columns=ignore_extra_columns
+    ):
+        return
+    from mypackage.utilities import add_data as _add_data
+    _add_data(table_name, df)
+
+
+def update_full_table(table_name: str, df: pd.DataFrame, ignore_extra_columns: bool = False) -> None:
+    """
+    全量覆盖整张表
+
+    Args:
+        table_name: 目标表名
+        df: 新的全量数据
+        ignore_extra_columns: 忽略 df 中目标表不存在的列（默认报错）
+    """
+    if BULK_COPY_ENABLED and _copy_replace(
+        table_name, df, f"DELETE FROM {table_name}", ignore_extra_columns=ignore_extra_columns
+    ):
+        return
+    from mypackage.utilities import update_full_table as _update_full_table
+    _update_full_table(table_name, df)
+
+
+def delete_data_add_data(table_name: str, df: pd.DataFrame, ignore_extra_columns: bool = False) -> None:
+    """
+    删除整张表数据后写入（与 update_full_table 相同）
+
+    Args:
+        table_name: 目标表名
+        df: 新的全量数据
+        ignore_extra_columns: 忽略 df 中目标表不存在的列（默认报错）
+    """
+    if BULK_COPY_ENABLED and _copy_replace(
+        table_name, df, f"DELETE FROM {table_name}", ignore_extra_columns=ignore_extra_columns
+    ):
+        return
+    from mypackage.utilities import delete_data_add_data as _delete_data_add_data
+    _delete_data_add_data(table_name, df)
+
+
+def update_between_dates(
+    table_name: str,
+    table_date_column: str,
+    df: pd.DataFrame,
+    df_date_column: str,
+    start_date: str,
+    end_date: str,
+    ignore_extra_columns: bool = False
+) -> None:
+    """
+    替换日期范围内的数据：删除表中 [start_date, end_date] 的数据，写入 df 中同一范围的数据
+
+    Args:
+        table_name: 目标表名
+        table_date_column: 表中的日期列名
+        df: 新数据
+        df_date_column: df 中的日期列名
+        start_date: 开始日期（'YYYY-MM-DD'，包含）
+        end_date: 结束日期（'YYYY-MM-DD'，包含）
+        ignore_extra_columns: 忽略 df 中目标表不存在的列（默认报错）
+    """
+    if BULK_COPY_ENABLED:
+        dates = pd.to_datetime(df[df_date_column])
+        mask = (dates >= pd.Timestamp(start_date)) & (dates < pd.Timestamp(_next_day(end_date)))
+        if _copy_replace(
+            table_name,
+            df[mask],
+            f"DELETE FROM {table_name} WHERE {table_date_column} >= %s AND {table_date_column} < %s",
+            (_day(start_date), _next_day(end_date)),
+            ignore_extra_columns
+        ):
+            return
+    from mypackage.utilities import update_between_dates as _update_between_dates
+    _update_between_dates(table_name, table_date_column, df, df_date_column, start_date, end_date)
+
+
+def delete_data_add_data_by_DateRange(
+    table_name: str,
+    date_column: str,
+    df: pd.DataFrame,
+    df_date_column: str,
+    date_range: pd.DatetimeIndex,
+    ignore_extra_columns: bool = False
+) -> None:
+    """
+    按日期范围替换数据：删除表中 date_range 覆盖的日期的数据，再写入 df
+
+    目标表按月分区且 date_range 恰好覆盖整月时，改为替换月分区（见 _swap_month_partitions）。
+
+    Args:
+        table_name: 目标表名
+        date_column: 表中的日期列名
+        df: 新数据
+        df_date_column: df 中的日期列名
+        date_range: 日期范围
+        ignore_extra_columns: 忽略 df 中目标表不存在的列（默认报错）
+    """
+    if BULK_COPY_ENABLED and PARTITION_SWAP_ENABLED and _swap_month_partitions(
+        table_name, date_column, df, df_date_column, date_range, ignore_extra_columns
+    ):
+        return
+    if BULK_COPY_ENABLED and _copy_replace(
+        table_name,
+        df,
+        f"DELETE FROM {table_name} WHERE {date_column} >= %s AND {date_column} < %s",
+        (_day(date_range.min()), _next_day(date_range.max())),
+        ignore_extra_columns
+    ):
+        return
+    from mypackage.utilities import delete_data_add_data_by_DateRange as _by_date_range
+    _by_date_range(table_name, date_column, df, df_date_column, date_range)
+
+
+def update_report_data(
+    table_name: str,
+    df: pd.DataFrame,
+    column: str,
+    value,
+    ignore_extra_columns: bool = False
+) -> None:
+    """
+    替换某一版本的数据：删除表中 column = value 的数据，再写入 df
+
+    Args:
+        table_name: 目标表名
+        df: 新数据
+        column: 版本列名（如 report_date、bud_version）
+        value: 版本值
+        ignore_extra_columns: 忽略 df 中目标表不存在的列（默认报错）
+    """
+    if BULK_COPY_ENABLED and _copy_replace(
+        table_name,
+        df,
+        f"DELETE FROM {table_name} WHERE {column} = %s",
+        (value,),
+        ignore_extra_columns
+    ):
+        return
+    from mypackage.utilities import update_report_data as _update_report_data
+    _update_report_data(table_name, df, column, value)
+
+
+# ---------- 月分区替换 ----------
+
+def partition_name(table_name: str, month: pd.Period) -> str:
+    """月分区的表名，如 fact_bus_revenue_p202512"""
+    return f"{table_name}_p{month.strftime('%Y%m')}"
+
+
+def _is_partitioned(cur, table_name: str) -> bool:
+    """目标表是否为分区表（辅助函数）"""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table_name,))
+    row = cur.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def _whole_months(date_range: pd.DatetimeIndex) -> Optional[List[pd.Period]]:
+    """date_range 恰好由若干整月组成时返回这些月份，否则返回 None（辅助函数）"""
+    days = pd.DatetimeIndex(date_range).normalize().unique()
+    months = sorted(days.to_period("M").unique())
+    if len(days) != sum(month.days_in_month for month in months):
+        return None
+    return months
+
+
+def _month_bounds(month: pd.Period) -> Tuple[str, str]:
+    return month.start_time.strftime("%Y-%m-%d"), (month + 1).start_time.strftime("%Y-%m-%d")
+
+
+def _is_lock_timeout(error: Exception) -> bool:
+    """是否为 lock_timeout 导致的错误（SQLSTATE 55P03）"""
+    return getattr(error, "pgcode", None) == "55P03"
+
+
+def _run_locked(conn, table_name: str, action: str, work: Callable) -> None:
+    """
+    在调用方连接上用单独的短事务执行需要父表锁的 DDL（辅助函数）
+
+    设置 lock_timeout：父表上有长查询时 DDL 不会一直排队（排队期间之后的读取也会被阻塞），
+    而是回滚后等待一段时间重试。conn 上不能有未结束的事务（调用前先提交或回滚），
+    DDL 与写入共用同一个连接，每个连接名额只占用一个数据库连接。
+
+    Args:
+        conn: 数据库连接（没有未结束的事务）
+        table_name: 父表名（仅用于提示）
+        action: 操作名称（仅用于提示）
+        work: 接收游标的函数，返回后提交
+    """
+    for attempt in range(1, PARTITION_LOCK_RETRIES + 1):
+        cur = conn.cursor()
+        try:
+            cur.execute("SET LOCAL lock_timeout = %s", (PARTITION_LOCK_TIMEOUT,))
+            work(cur)
+            conn.commit()
+            return
+        except Exception as e:
+            conn.rollback()
+            if not _is_lock_timeout(e) or attempt == PARTITION_LOCK_RETRIES:
+                raise
+            wait = min(2 ** attempt, 30)
+            print(f"[WARN] {table_name}: {action}等待表锁超时（第 {attempt} 次），{wait} 秒后重试")
+            time.sleep(wait)
+        finally:
+            cur.close()
+
+
+def _missing_partitions(cur, table_name: str, months: Iterable[pd.Period]) -> List[pd.Period]:
+    """尚未建立的月分区（只查系统表，不取表锁）（辅助函数）"""
+    missing = []
+    for month in sorted(set(months)):
+        cur.execute("SELECT to_regclass(%s) IS NULL", (partition_name(table_name, month),))
+        if cur.fetchone()[0]:
+            missing.append(month)
+    return missing
+
+
+def ensure_month_partitions(cur, table_name: str, months: Iterable[pd.Period]) -> None:
+    """
+    补建缺少的月分区
+
+    已存在的分区直接跳过；建立分区需要父表的 ACCESS EXCLUSIVE 锁，应在单独的短事务中调用
+    （见 _ensure_partitions）。
+
+    Args:
+        cur: 游标（调用方负责提交）
+        table_name: 分区表名
+        months: 需要的月份
+    """
+    for month in _missing_partitions(cur, table_name, months):
+        start, end = _month_bounds(month)
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(table_name, month)} "
+            f"PARTITION OF {table_name} FOR VALUES FROM (%s) TO (%s)",
+            (start, end)
+        )
+
+
+def _ensure_partitions(conn, table_name: str, months: Iterable[pd.Period]) -> None:
+    """缺少月分区时在 conn 上用单独的短事务补建，conn 上不能有未结束的事务（辅助函数）"""
+    months = list(months)
+    cur = conn.cursor()
+    missing = _missing_partitions(cur, table_name, months)
+    conn.rollback()
+    if missing:
+        _run_locked(conn, table_name, "补建月分区",
+                    lambda ddl_cur: ensure_month_partitions(ddl_cur, table_name, months))
+
+
+def _create_staging_tables(
+    conn,
+    table_name: str,
+    date_column: str,
+    months: List[pd.Period]
+) -> List[Tuple[pd.Period, str]]:
+    """
+    新建与父表结构、索引一致的月分区暂存表，并加上月份范围的 CHECK 约束（辅助函数）
+
+    CREATE TABLE ... (LIKE 父表) 会对父表加 ACCESS SHARE 锁并持有到事务结束，
+    因此暂存表在单独的短事务中建立并立即提交，之后写入暂存表时不再持有父表的任何锁。
+    CHECK 约束使 ATTACH 时无需再扫描校验。
+
+    Returns:
+        [(月份, 暂存表名)]
+    """
+    staged = [(month, f"{partition_name(table_name, month)}_stg") for month in months]
+
+    def create(cur):
+        for month, staging in staged:
+            month_start, month_end = _month_bounds(month)
+            cur.execute(f"DROP TABLE IF EXISTS {staging}")
+            cur.execute(
+                f"CREATE TABLE {staging} (LIKE {table_name} "
+                f"INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING INDEXES)"
+            )
+            cur.execute(
+                f"ALTER TABLE {staging} ADD CONSTRAINT {_split_table_name(staging)[1]}_bound "
+                f"CHECK ({date_column} >= %s AND {date_column} < %s)",
+                (month_start, month_end)
+            )
+
+    _run_locked(conn, table_name, "建立暂存表", create)
+    return staged
+
+
+def _swap_staged(conn, table_name: str, staged: List[Tuple[pd.Period, str]]) -> None:
+    """
+    用已提交数据的暂存表替换月分区（辅助函数）
+
+    各月份在同一个短事务中 DETACH 并删除旧分区、ATTACH 暂存表，只有这一步持有父表的锁；
+    拿不到锁时按 lock_timeout 回滚重试。
+    """
+    def swap(cur):
+        for month, staging in staged:
+            partition = partition_name(table_name, month)
+            month_start, month_end = _month_bounds(month)
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (partition,))
+            if cur.fetchone()[0]:
+                cur.execute(f"ALTER TABLE {table_name} DETACH PARTITION {partition}")
+                cur.execute(f"DROP TABLE {partition}")
+            cur.execute(f"ALTER TABLE {staging} RENAME TO {_split_table_name(partition)[1]}")
+            cur.execute(
+                f"ALTER TABLE {table_name} ATTACH PARTITION {partition} "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                (month_start, month_end)
+            )
+            cur.execute(
+                f"ALTER TABLE {partition} DROP CONSTRAINT {_split_table_name(staging)[1]}_bound")
+
+    _run_locked(conn, table_name, "替换月分区", swap)
+
+
+def _drop_staging_tables(conn, staged: List[Tuple[pd.Period, str]]) -> None:
+    """失败时回滚 conn 上的事务并删除已建立的暂存表（辅助函数，尽力而为）"""
+    conn.rollback()
+    try:
+        cur = conn.cursor()
+        for _, staging in staged:
+            cur.execute(f"DROP TABLE IF EXISTS {staging}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"[WARN] 删除暂存表失败: {str(e)}")
+
+
+def _swap_month_partitions(
+    table_name: str,
+    date_column: str,
+    df: pd.DataFrame,
+    df_date_column: str,
+    date_range: pd.DatetimeIndex,
+    ignore_extra_columns: bool = False
+) -> bool:
+    """
+    按月替换分区（辅助函数）
+
+    在同一个连接上分三个事务完成，多个月份并发写入同一张表时不会互相等待：
+    1. 短事务：建立各月暂存表（结构、索引与父表一致，带月份范围的 CHECK 约束）
+    2. COPY 写入暂存表，不持有父表的任何锁
+    3. 短事务（lock_timeout + 重试）：DETACH 并删除旧分区、ATTACH 暂存表
+    读取方只在第 3 步短暂等待，也不会因逐行删除产生表膨胀；任一步失败时删除暂存表，原分区不变。
+
+    Returns:
+        是否已写入；目标表不是分区表、date_range 不是整月或 df 中有范围外的日期时返回 False，
+        由调用方按日期删除后写入（此时会先补建缺少的月分区）
+    """
+    start = time.perf_counter()
+    conn = get_engine().raw_connection()
+    staged = []
+    try:
+        cur = conn.cursor()
+        if not _is_partitioned(cur, table_name):
+            conn.rollback()
+            return False
+
+        months = _whole_months(date_range)
+        df_months = pd.to_datetime(df[df_date_column]).dt.to_period("M")
+        if months is None or not df_months.isin(months).all():
+            conn.rollback()
+            _ensure_partitions(
+                conn, table_name,
+                set(pd.DatetimeIndex(date_range).to_period("M")) | set(df_months.dropna()))
+            return False
+
+        table_columns = _table_columns(cur, table_name)
+        conn.rollback()
+        staged = _create_staging_tables(conn, table_name, date_column, months)
+        for month, staging in staged:
+            copy_frame(cur, staging, df[(df_months == month).to_numpy()], table_columns,
+                       ignore_extra_columns)
+        conn.commit()
+        cur.close()
+        _swap_staged(conn, table_name, staged)
+    except Exception:
+        conn.rollback()
+        if staged:
+            _drop_staging_tables(conn, staged)
+        raise
+    finally:
+        conn.close()
+
+    print(f"[PARTITION] {table_name}: 替换 {len(months)} 个月分区，写入 {len(df)} 行，"
+          f"耗时 {time.perf_counter() - start:.2f} 秒")
+    return True
+
+
+@contextmanager
+def partition_staging(
+    conn,
+    table_name: str,
+    date_column: str,
+    date_range: pd.DatetimeIndex
+):
+    """
+    为 replace_date_range_from_query 预先准备目标表的月分区暂存表（或补建缺少的月分区）
+
+    需要父表锁的 DDL 在 conn 上用单独的短事务执行并提交，因此应在建立 ON COMMIT DROP 临时表之前、
+    conn 上没有未结束的事务时进入；之后的查询、写入、分区替换都使用同一个连接。
+    目标表不是分区表、关闭了分区替换或 date_range 不是整月时返回 None（此时按日期删除后写入）。
+    with 块内出错时回滚 conn 上的事务并删除暂存表。
+
+    Args:
+        conn: 数据库连接（没有未结束的事务）
+        table_name: 目标表名
+        date_column: 日期列名
+        date_range: 日期范围
+
+    Examples:
+        with partition_staging(conn, 'fact_bus_revenue', 'acct_period', date_range) as staged:
+            ...  # 建立临时表、读回数据
+            replace_date_range_from_query(conn, ..., date_range, staged)
+    """
+    cur = conn.cursor()
+    partitioned = _is_partitioned(cur, table_name)
+    conn.rollback()
+    months = _whole_months(date_range)
+
+    staged = None
+    if partitioned and PARTITION_SWAP_ENABLED and months is not None:
+        staged = _create_staging_tables(conn, table_name, date_column, months)
+    elif partitioned:
+        _ensure_partitions(conn, table_name, set(pd.DatetimeIndex(date_range).to_period("M")))
+
+    try:
+        yield staged
+    except Exception:
+        if staged:
+            _drop_staging_tables(conn, staged)
+        raise
+
+
+def replace_date_range_from_query(
+    conn,
+    table_name: str,
+    date_column: str,
+    columns: List[str],
+    select_sql: str,
+    params: Tuple,
+    date_range: pd.DatetimeIndex,
+    staged: Optional[List[Tuple[pd.Period, str]]] = None
+) -> int:
+    """
+    用查询结果替换日期范围内的数据（数据不经过 Python），完成后提交调用方的事务
+
+    查询可以读取调用方事务中的临时表；提交后 ON COMMIT DROP 的临时表随之删除，
+    需要读回的结果应在调用前读取。
+    与 delete_data_add_data_by_DateRange 相同：传入 partition_staging 准备的暂存表时，
+    调用方事务只 INSERT ... SELECT 到暂存表（不持有父表的锁），提交后在同一连接上用短事务替换分区；
+    否则按日期删除后 INSERT ... SELECT。
+
+    Args:
+        conn: 数据库连接（调用方的事务）
+        table_name: 目标表名
+        date_column: 日期列名（目标表与查询结果中相同）
+        columns: 写入的列（目标表与查询结果中相同）
+        select_sql: 查询语句
+        params: 查询参数
+        date_range: 日期范围
+        staged: partition_staging 返回的暂存表，为 None 时按日期删除后写入
+
+    Returns:
+        写入的行数
+    """
+    start = time.perf_counter()
+    cur = conn.cursor()
+    column_list = ", ".join(f'"{col}"' for col in columns)
+
+    if staged:
+        inserted = 0
+        for month, staging in staged:
+            cur.execute(
+                f"INSERT INTO {staging} ({column_list}) SELECT {column_list} FROM ({select_sql}) q "
+                f"WHERE q.{date_column} >= %s AND q.{date_column} < %s",
+                tuple(params) + _month_bounds(month)
+            )
+            inserted += cur.rowcount
+        conn.commit()
+        _swap_staged(conn, table_name, staged)
+        print(f"[PARTITION] {table_name}: 替换 {len(staged)} 个月分区，写入 {inserted} 行，"
+              f"耗时 {time.perf_counter() - start:.2f} 秒")
+        return inserted
+
+    cur.execute(
+        f"DELETE FROM {table_name} WHERE {date_column} >= %s AND {date_column} < %s",
+        (_day(date_range.min()), _next_day(date_range.max()))
+    )
+    deleted = cur.rowcount
+    cur.execute(
+        f"INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM ({select_sql}) q",
+        params
+    )
+    inserted = cur.rowcount
+    conn.commit()
+    print(f"[SQL] {table_name}: 删除 {deleted} 行，写入 {inserted} 行，"
+          f"耗时 {time.perf_counter() - start:.2f} 秒")
+    return inserted
+
+
+# ---------- 增量写入（行哈希） ----------
+
+
+def compute_row_hash(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """
+    计算每行的稳定哈希（有符号 64 位整数，可直接存入 bigint 列）
+
+    按列名排序后把各列转为字符串再哈希，同样的 Excel 内容每次得到相同的哈希。
+
+    Args:
+        df: 数据
+        columns: 参与哈希的列
+
+    Returns:
+        与 df 同索引的哈希序列
+    """
+    hashed = pd.util.hash_pandas_object(df[sorted(columns)].astype(str), index=False)
+    return pd.Series(hashed.to_numpy().view("int64"), index=df.index)
+
+
+def ensure_row_hash_column(table_name: str, conn=None) -> None:
+    """
+    目标表缺少行哈希列或其索引时补充
+
+    ADD COLUMN / CREATE INDEX 即使带 IF NOT EXISTS 也会先取得表锁（ACCESS EXCLUSIVE / SHARE），
+    因此先查系统表，只在确实缺少时用单独的短事务执行 DDL 并立即提交，锁不会延续到之后的增量写入事务。
+    也可以在部署时对各表调用一次，作为迁移执行。
+
+    Args:
+        table_name: 目标表名
+        conn: 使用调用方的连接（其上不能有未结束的事务，结束后不关闭）；不传则新开一个连接
+    """
+    own_connection = conn is None
+    if own_connection:
+        conn = get_engine().raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT
+                EXISTS (
+                    SELECT 1 FROM pg_attribute
+                    WHERE attrelid = to_regclass(%s) AND attname = %s AND NOT attisdropped
+                ),
+                EXISTS (
+                    SELECT 1 FROM pg_index i
+                    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                    WHERE i.indrelid = to_regclass(%s) AND a.attname = %s
+                )
+            """,
+            (table_name, ROW_HASH_COLUMN, table_name, ROW_HASH_COLUMN)
+        )
+        has_column, has_index = cur.fetchone()
+        if has_column and has_index:
+            conn.rollback()
+            return
+
+        index_name = f"{_split_table_name(table_name)[1]}_{ROW_HASH_COLUMN}_idx"
+        if not has_column:
+            cur.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {ROW_HASH_COLUMN} bigint")
+        if not has_index:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({ROW_HASH_COLUMN})")
+        conn.commit()
+        print(f"[DELTA] {table_name}: 已补充行哈希列 {ROW_HASH_COLUMN} 及索引")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_connection:
+            conn.close()
+
+
+def _delta_replace(
+    table_name: str,
+    df: pd.DataFrame,
+    where_sql: str = "TRUE",
+    where_params: Tuple = (),
+    ignore_extra_columns: bool = False
+) -> bool:
+    """
+    按行哈希比对后只写入差异行（辅助函数）
+
+    读取范围内已有行的哈希并加行锁，与新数据按哈希做多重集合比较：
+    新数据多出的行用 COPY 写入，库中多出的行按 ctid 删除，其余行不动。
+    历史数据没有哈希（NULL）时全部视为需要删除，首次增量写入等同于全量替换。
+    行哈希列及索引在写入事务开始前由 ensure_row_hash_column 检查（缺少时才执行 DDL）。
+
+    Returns:
+        是否已写入；目标表不存在时返回 False
+    """
+    start = time.perf_counter()
+    conn = get_engine().raw_connection()
+    try:
+        cur = conn.cursor()
+        table_columns = _table_columns(cur, table_name)
+        if not table_columns:
+            conn.rollback()
+            return False
+        # 先结束只读了系统表的事务，DDL（如需要）在同一连接上用单独的短事务执行
+        conn.rollback()
+        ensure_row_hash_column(table_name, conn)
+
+        ignored = [col for col in df.columns if col not in table_columns and col != ROW_HASH_COLUMN]
+        if ignored:
+            if not ignore_extra_columns:
+                raise ValueError(f"以下列在目标表中不存在: {ignored}")
+            print(f"[WARN] 以下列在目标表中不存在，已忽略: {ignored}")
+        hash_columns = [
+            col for col in df.columns if col in table_columns and col != ROW_HASH_COLUMN]
+        new_df = df[hash_columns].assign(
+            **{ROW_HASH_COLUMN: compute_row_hash(df, hash_columns)})
+
+        cur.execute(
+            f"SELECT ctid::text, {ROW_HASH_COLUMN} FROM {table_name} "
+            f"WHERE {where_sql} FOR UPDATE",
+            where_params
+        )
+        existing = pd.DataFrame(cur.fetchall(), columns=["ctid", ROW_HASH_COLUMN])
+
+        # 同一哈希出现多次时按出现序号配对，保证重复行也能正确比较
+        new_df = new_df.reset_index(drop=True)
+        new_df["_seq"] = new_df.groupby(ROW_HASH_COLUMN).cumcount()
+        existing["_seq"] = existing.groupby(ROW_HASH_COLUMN, dropna=False).cumcount()
+        merged = new_df[[ROW_HASH_COLUMN, "_seq"]].assign(_pos=new_df.index).merge(
+            existing.dropna(subset=[ROW_HASH_COLUMN]).astype({ROW_HASH_COLUMN: "int64"}),
+            on=[ROW_HASH_COLUMN, "_seq"], how="outer", indicator=True
+        )
+        insert_pos = merged.loc[merged["_merge"] == "left_only", "_pos"].astype(int)
+        to_insert = new_df.iloc[insert_pos.to_numpy()]
+        stale_ctids = merged.loc[merged["_merge"] == "right_only", "ctid"].tolist()
+        stale_ctids += existing.loc[existing[ROW_HASH_COLUMN].isna(), "ctid"].tolist()
+
+        if stale_ctids:
+            cur.execute(
+                f"DELETE FROM {table_name} WHERE ctid = ANY(%s::tid[])", (stale_ctids,))
+        copy_frame(cur, table_name, to_insert.drop(columns="_seq"), {
+            **table_columns, ROW_HASH_COLUMN: "bigint"})
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    unchanged = len(new_df) - len(to_insert)
+    print(f"[DELTA] {table_name}: 新增 {len(to_insert)} 行，删除 {len(stale_ctids)} 行，"
+          f"未变化 {unchanged} 行，耗时 {time.perf_counter() - start:.2f} 秒")
+    return True
+
+
+def delta_update_between_dates(
+    table_name: str,
+    table_date_column: str,
+    df: pd.DataFrame,
+    df_date_column: str,
+    start_date: str,
+    end_date: str,
+    ignore_extra_columns: bool = False
+) -> None:
+    """
+    增量替换日期范围内的数据，结果与 update_between_dates 相同，但只写入变化的行
+
+    Args:
+        table_name: 目标表名
+        table_date_column: 表中的日期列名
+        df: 新数据
+        df_date_column: df 中的日期列名
+        start_date: 开始日期（'YYYY-MM-DD'，包含）
+        end_date: 结束日期（'YYYY-MM-DD'，包含）
+        ignore_extra_columns: 忽略 df 中目标表不存在的列（默认报错）
+    """
+    dates = pd.to_datetime(df[df_date_column])
+    mask = (dates >= pd.Timestamp(start_date)) & (dates < pd.Timestamp(_next_day(end_date)))
+    if _delta_replace(
+        table_name,
+        df[mask],
+        f"{table_date_column} >= %s AND {table_date_column} < %s",
+        (_day(start_date), _next_day(end_date)),
+        ignore_extra_columns
+    ):
+        return
+    update_between_dates(table_name, table_date_column, df, df_date_column, start_date, end_date,
+                         ignore_extra_columns)
+
+
+def delta_update_full_table(table_name: str, df: pd.DataFrame, ignore_extra_columns: bool = False) -> None:
+    """
+    增量覆盖整张表，结果与 update_full_table 相同，但只写入变化的行
+
+    Args:
+        table_name: 目标表名
+        df: 新的全量数据
+        ignore_extra_columns: 忽略 df 中目标表不存在的列（默认报错）
+    """
+    if _delta_replace(table_name, df, ignore_extra_columns=ignore_extra_columns):
+        return
+    update_full_table(table_name, df, ignore_extra_columns)
@@ -0,0 +1,356 @@
+"""数据库工具函数"""
+import threading
+import uuid
+from contextlib import contextmanager
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from .frame_schema import apply_schema
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    获取进程内共享的 SQLAlchemy 连接池（首次调用时创建）
+
+    Returns:
+        PostgreSQL Engine
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from mypackage.utilities import url_to_db
+                _engine = create_engine(url_to_db(), pool_pre_ping=True, future=True)
+    return _engine
+
+
+def check_data_exists_batch(
+    checks: List[Tuple[str, str, str, str]]
+) -> Dict[Tuple[str, str, str, str], bool]:
+    """
+    一次查询判断多张表在各自日期范围内是否存在数据
+
+    先从系统目录确认表是否存在（不存在的表视为无数据），再把所有判断拼成一条
+    UNION ALL + EXISTS 查询；若整体查询失败（如某表缺少日期列），退回逐条判断。
+
+    Args:
+        checks: [(表名, 日期列名, 开始日期, 结束日期), ...]，日期格式 'YYYY-MM-DD'
+
+    Returns:
+        {(表名, 日期列名, 开始日期, 结束日期): 是否存在数据}
+    """
+    unique_checks = list(dict.fromkeys(checks))
+    if not unique_checks:
+        return {}
+
+    table_names = sorted({check[0] for check in unique_checks})
+    found: Dict[int, bool] = {}
+
+    with get_engine().connect() as connection:
+        existing_tables = {
+            row[0] for row in connection.execute(
+                text("SELECT t FROM unnest(CAST(:names AS text[])) AS t "
+                     "WHERE to_regclass(t) IS NOT NULL"),
+                {"names": table_names}
+            )
+        }
+
+        parts = []
+        params = {}
+        for idx, (table_name, date_column, start_date, end_date) in enumerate(unique_checks):
+            if table_name not in existing_tables:
+                continue
+            parts.append(
+                f"SELECT {idx} AS idx, EXISTS (SELECT 1 FROM {table_name} "
+                f"WHERE {date_column} >= :s{idx} AND {date_column} <= :e{idx}) AS found"
+            )
+            params[f"s{idx}"] = start_date
+            params[f"e{idx}"] = end_date
+
+        if parts:
+            try:
+                for idx, exists in connection.execute(text(" UNION ALL ".join(parts)), params):
+                    found[idx] = bool(exists)
+            except Exception as e:
+                print(f"[WARN] 批量检查数据是否存在失败，改为逐表检查: {str(e)}")
+                connection.rollback()
+                found = _check_data_exists_one_by_one(connection, unique_checks, existing_tables)
+
+    return {check: found.get(idx, False) for idx, check in enumerate(unique_checks)}
+
+
+def _check_data_exists_one_by_one(connection, checks, existing_tables) -> Dict[int, bool]:
+    """逐条判断是否存在数据，单条失败视为不存在（辅助函数）"""
+    found: Dict[int, bool] = {}
+    for idx, (table_name, date_column, start_date, end_date) in enumerate(checks):
+        if table_name not in existing_tables:
+            continue
+        try:
+            result = connection.execute(
+                text(f"SELECT EXISTS (SELECT 1 FROM {table_name} "
+                     f"WHERE {date_column} >= :s AND {date_column} <= :e)"),
+                {"s": start_date, "e": end_date}
+            )
+            found[idx] = bool(result.scalar())
+        except Exception as e:
+            print(f"[WARN] 检查 {table_name} 是否存在数据失败: {str(e)}")
+            connection.rollback()
+    return found
+
+
+# 进程内数据库连接预算：并发写库/读库时同时占用的连接数不超过该值
+_db_slots = threading.BoundedSemaphore(4)
+_db_budget = 4
+# 正在占用或等待连接名额的数量，不为 0 时不允许调整预算
+_db_slot_users = 0
+_db_slot_lock = threading.Lock()
+
+
+def set_db_connection_budget(budget: int) -> None:
+    """
+    设置进程内同时使用的数据库连接上限
+
+    只能在没有连接名额被占用（或等待）时调整；否则已占用的名额会留在旧的信号量上，
+    新旧信号量各自计数，实际并发连接数可能超过上限。
+
+    Args:
+        budget: 连接数上限（至少为 1）
+
+    Raises:
+        RuntimeError: 有连接名额正在被占用或等待时调整为不同的上限
+    """
+    global _db_slots, _db_budget
+    budget = max(1, int(budget))
+    with _db_slot_lock:
+        if budget == _db_budget:
+            return
+        if _db_slot_users:
+            raise RuntimeError(
+                f"有 {_db_slot_users} 个数据库连接名额正在占用或等待，"
+                f"不能把连接上限从 {_db_budget} 调整为 {budget}，请在并发任务结束后再调整"
+            )
+        _db_slots = threading.BoundedSemaphore(budget)
+        _db_budget = budget
+
+
+def get_db_connection_budget() -> int:
+    """获取当前的数据库连接上限"""
+    return _db_budget
+
+
+@contextmanager
+def db_connection_slot():
+    """
+    占用一个数据库连接名额，名额用尽时阻塞等待
+
+    Examples:
+        with db_connection_slot():
+            update_between_dates(...)
+    """
+    global _db_slot_users
+    with _db_slot_lock:
+        slots = _db_slots
+        _db_slot_users += 1
+    try:
+        slots.acquire()
+        try:
+            yield
+        finally:
+            slots.release()
+    finally:
+        with _db_slot_lock:
+            _db_slot_users -= 1
+
+
+def _decimal_to_float(value, cursor):
+    return float(value) if value is not None else None
+
+
+def fetch_dataframe(
+    conn,
+    sql: str,
+    params=None,
+    chunk_size: int = 50000
+) -> pd.DataFrame:
+    """
+    使用服务端游标分批读取查询结果并直接组装为 DataFrame
+
+    与 pd.DataFrame(cur.fetchall(), ...) 相比，不会一次性在内存中保留全部结果元组；
+    NUMERIC 列在驱动层直接转为 float（不产生 Decimal 对象），结果中为 float64 列。
+
+    Args:
+        conn: psycopg2 连接（如 connect_to_db() 返回的 conn）
+        sql: 查询语句
+        params: 查询参数
+        chunk_size: 每批读取的行数
+
+    Returns:
+        查询结果
+
+    Examples:
+        conn, cur = connect_to_db()
+        df = fetch_dataframe(conn, "SELECT * FROM fact_revenue WHERE acct_period >= %s", (start,))
+    """
+    import psycopg2.extensions
+
+    decimal_to_float = psycopg2.extensions.new_type(
+        psycopg2.extensions.DECIMAL.values, "DECIMAL_TO_FLOAT", _decimal_to_float)
+
+    cur = conn.cursor(name=f"fetch_{uuid.uuid4().hex}", withhold=conn.autocommit)
+    try:
+        psycopg2.extensions.register_type(decimal_to_float, cur)
+        cur.itersize = chunk_size
+        cur.execute(sql, params)
+
+        chunks = []
+        columns: List[str] = []
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not columns and cur.description is not None:
+                columns = [desc[0] for desc in cur.description]
+            if not rows:
+                break
+            chunks.append(pd.DataFrame.from_records(rows, columns=columns, coerce_float=True))
+            del rows
+    finally:
+        cur.close()
+
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+
+# 增量写入（utils.bulk_writer.delta_update_*）在源表上补充的行哈希列，只供比对使用
+ROW_HASH_COLUMN = "row_hash"
+
+
+def get_table_columns(table_name: str, exclude: Iterable[str] = ()) -> List[str]:
+    """
+    按表中顺序返回表的业务列名
+
+    行哈希列 ROW_HASH_COLUMN 是增量写入的内部列，始终排除，不会随读取结果传到下游的明细表。
+
+    Args:
+        table_name: 表名
+        exclude: 需要排除的列
+
+    Returns:
+        列名列表；表不存在时为空列表
+    """
+    exclude = set(exclude) | {ROW_HASH_COLUMN}
+    with get_engine().connect() as connection:
+        rows = connection.execute(
+            text("SELECT column_name FROM information_schema.columns "
+                 "WHERE table_schema = current_schema() AND table_name = :table_name "
+                 "ORDER BY ordinal_position"),
+            {"table_name": table_name}
+        )
+        return [row[0] for row in rows if row[0] not in exclude]
+
+
+def get_numeric_scale(table_name: str, column_name: str) -> Optional[int]:
+    """
+    返回 numeric(p, s) 列的小数位数 s
+
+    Args:
+        table_name: 表名
+        column_name: 列名
+
+    Returns:
+        小数位数；列不是带小数位数的 numeric（如 float8、不限精度的 numeric）或不存在时为 None
+    """
+    with get_engine().connect() as connection:
+        return connection.execute(
+            text("SELECT numeric_scale FROM information_schema.columns "
+                 "WHERE table_schema = current_schema() AND table_name = :table_name "
+                 "AND column_name = :column_name AND data_type = 'numeric'"),
+            {"table_name": table_name, "column_name": column_name}
+        ).scalar()
+
+
+def round_to_scale(values: pd.Series, scale: Optional[int]) -> pd.Series:
+    """
+    按 PostgreSQL 写入 numeric(p, s) 时的规则舍入（四舍五入，远离零）
+
+    浮点数按 COPY 写入时的文本（repr）转为 Decimal 后舍入，结果与写入数据库再读回的值一致。
+
+    Args:
+        values: 金额列
+        scale: 小数位数，为 None 时原样返回
+
+    Returns:
+        舍入后的 float64 序列
+    """
+    if scale is None:
+        return values
+    quantum = Decimal(1).scaleb(-scale)
+    values = values.astype(float)
+    finite = values[np.isfinite(values)]
+    rounded = {
+        value: float(Decimal(repr(float(value))).quantize(quantum, rounding=ROUND_HALF_UP))
+        for value in finite.unique()
+    }
+    result = values.map(rounded)
+    return result.where(result.notna(), values)
+
+
+def load_period_data(
+    table_name: str,
+    date_column: str,
+    date_range: pd.DatetimeIndex,
+    columns: Sequence[str],
+    where: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    只读取指定日期的数据：日期条件和列清单都在 SQL 中完成，不再全表读取后用 pandas 过滤
+
+    日期条件为 date_column = ANY(日期列表)，与原来的 isin(date_range) 结果一致，
+    日期通过绑定参数传入。只读取 columns 中声明的列（见 utils.frame_schema.SOURCE_COLUMNS），
+    表中未声明的列（id、last_modified 除外）打印警告后忽略，不会传到下游；声明的列在表中不存在时报错。
+    结果按 utils.frame_schema 中该表的声明转换列类型。
+
+    Args:
+        table_name: 表名
+        date_column: 日期列名（结果中转换为 datetime64）
+        date_range: 需要读取的日期
+        columns: 需要读取的列（须包含 date_column）
+        where: 额外的过滤条件（SQL 片段），如 "unique_lvl NOT LIKE '%%无归属%%'"
+
+    Returns:
+        指定日期范围内的数据
+    """
+    table_columns = get_table_columns(table_name, ["id", "last_modified"])
+    if not table_columns:
+        raise ValueError(f"表 {table_name} 不存在或没有可读取的列")
+    missing = [col for col in columns if col not in table_columns]
+    if missing:
+        raise ValueError(f"表 {table_name} 中不存在以下声明读取的列: {missing}")
+    undeclared = [col for col in table_columns if col not in columns]
+    if undeclared:
+        print(f"[WARN] {table_name}: 以下列未声明读取，已忽略: {undeclared}")
+
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    sql = f"SELECT {column_list} FROM {table_name} WHERE {date_column} = ANY(%s::date[])"
+    if where:
+        sql += f" AND ({where})"
+    dates = [day.strftime("%Y-%m-%d") for day in pd.DatetimeIndex(date_range)]
+
+    with db_connection_slot():
+        conn = get_engine().raw_connection()
+        try:
+            df = fetch_dataframe(conn, sql, (dates,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    df[date_column] = pd.to_datetime(df[date_column])
+    return apply_schema(df, table_name)
@@ -0,0 +1,169 @@
+"""Excel 解析结果的本地 Parquet 缓存
+
+缓存键由工作簿的 (路径, 大小, 修改时间, 内容哈希) 以及表映射、列映射、解析引擎共同决定，
+工作簿未变化时直接从本地 Parquet 加载，跳过 openpyxl 解析。
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# 缓存目录与容量上限，可通过环境变量覆盖
+DEFAULT_CACHE_DIR = os.environ.get(
+    "PREFECT_EXCEL_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "prefect_excel"),
+)
+DEFAULT_CACHE_MAX_MB = int(os.environ.get("PREFECT_EXCEL_CACHE_MAX_MB", "2048"))
+
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm", ".xls")
+_HASH_INDEX_FILE = "hash_index.json"
+
+
+def parquet_available() -> bool:
+    """判断当前环境是否可以读写 Parquet（需要 pyarrow）"""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExcelParquetCache:
+    """
+    按表存放解析结果的 Parquet 缓存，超出容量时按最近使用时间（LRU）淘汰
+
+    Args:
+        cache_dir: 缓存目录
+        max_mb: 缓存容量上限（MB）
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_mb: Optional[int] = None):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = (max_mb if max_mb is not None else DEFAULT_CACHE_MAX_MB) * 1024 * 1024
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._hash_index_path = os.path.join(self.cache_dir, _HASH_INDEX_FILE)
+        self._hash_index = self._load_hash_index()
+
+    # ---------- 工作簿指纹 ----------
+
+    def _load_hash_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self._hash_index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_hash_index(self) -> None:
+        """持久化内容哈希索引（路径 -> 大小/修改时间/哈希）"""
+        tmp_path = self._hash_index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._hash_index, f, ensure_ascii=False)
+        os.replace(tmp_path, self._hash_index_path)
+
+    def file_fingerprint(self, path: str) -> Tuple[str, int, int, str]:
+        """
+        计算工作簿指纹 (路径, 大小, 修改时间, 内容哈希)
+
+        大小和修改时间均未变化时复用上次计算的内容哈希，否则重新读取文件计算。
+        """
+        stat = os.stat(path)
+        entry = self._hash_index.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            content_hash = entry["sha256"]
+        else:
+            content_hash = _sha256_file(path)
+            self._hash_index[path] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": content_hash,
+            }
+        return path, stat.st_size, stat.st_mtime_ns, content_hash
+
+    def entry_key(
+        self,
+        table_name: str,
+        table_mapping: Dict[str, str],
+        column_mapping: Dict[str, str],
+        paths: List[str],
+        engine: str,
+        variant: str = ""
+    ) -> str:
+        """
+        计算某张表的缓存键
+
+        engine 为实际使用的解析引擎（calamine / openpyxl），不同引擎对空单元格、日期和类型的处理不同，
+        解析结果分开缓存；variant 用于区分同一数据的不同处理方式（如裁剪列后的版本）。
+        """
+        payload = {
+            "table": table_name,
+            "engine": engine,
+            "table_mapping": sorted(table_mapping.items()),
+            "column_mapping": sorted((str(k), str(v)) for k, v in column_mapping.items()),
+            "files": sorted(self.file_fingerprint(path) for path in paths),
+        }
+        if variant:
+            payload["variant"] = variant
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ---------- 读写 ----------
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def load(self, key: str) -> Optional[pd.DataFrame]:
+        """读取缓存，命中时刷新访问时间；未命中返回 None"""
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            df = pd.read_parquet(path)
+        except Exception as e:
+            print(f"[WARN] 读取缓存 {path} 失败，将重新解析: {str(e)}")
+            return None
+        os.utime(path, None)
+        return df
+
+    def store(self, key: str, df: pd.DataFrame) -> bool:
+        """写入缓存，写入失败（如列中混合类型无法转换）时跳过并返回 False"""
+        path = self._entry_path(key)
+        tmp_path = path + ".tmp"
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            return True
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"[WARN] 写入缓存失败，本次不缓存: {str(e)}")
+            return False
+
+    def evict(self) -> int:
+        """按最近使用时间淘汰缓存，直到总大小不超过上限，返回淘汰的文件数"""
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".parquet"):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,359 @@
+"""Excel 读取工具函数"""
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .excel_cache import EXCEL_EXTENSIONS
+from .memory_utils import peak_rss_since_reset_mb, reset_peak_rss
+
+# Excel 解析引擎：auto（优先 calamine，不可用时 openpyxl）、calamine、openpyxl
+EXCEL_ENGINE = os.environ.get("PREFECT_EXCEL_ENGINE", "auto")
+EXCEL_ENGINES = ("auto", "calamine", "openpyxl")
+
+
+def calamine_available() -> bool:
+    """判断当前环境能否使用 calamine 引擎（需要 python-calamine 且 pandas >= 2.2）"""
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return False
+    major, minor = (int(part) for part in pd.__version__.split(".")[:2])
+    return (major, minor) >= (2, 2)
+
+
+def resolve_excel_engine(engine: Optional[str] = None) -> str:
+    """
+    确定实际使用的 Excel 解析引擎
+
+    Args:
+        engine: auto / calamine / openpyxl，不传则使用 PREFECT_EXCEL_ENGINE（默认 auto）
+
+    Returns:
+        'calamine' 或 'openpyxl'
+    """
+    engine = (engine or EXCEL_ENGINE).lower()
+    if engine not in EXCEL_ENGINES:
+        raise ValueError(f"不支持的 Excel 引擎: {engine}，可选: {EXCEL_ENGINES}")
+    if engine == "openpyxl":
+        return "openpyxl"
+    if calamine_available():
+        return "calamine"
+    if engine == "calamine":
+        print("[WARN] calamine 引擎不可用（需要 python-calamine 且 pandas >= 2.2），改用 openpyxl")
+    return "openpyxl"
+
+
+@contextmanager
+def excel_engine(engine: Optional[str] = None):
+    """
+    在上下文内把 pandas 读取 xlsx/xlsm 的默认引擎切换为指定引擎
+
+    pd.read_excel / pd.ExcelFile 未显式指定 engine 时都会使用该设置，
+    因此 read_and_map_excel 等封装函数无需修改即可切换引擎，列名和类型映射逻辑不变。
+
+    Examples:
+        with excel_engine():
+            dfs = read_and_map_excel(root_directory, table_mapping, column_mapping)
+    """
+    name = resolve_excel_engine(engine)
+    with pd.option_context("io.excel.xlsx.reader", name, "io.excel.xlsm.reader", name):
+        yield name
+
+
+def list_workbooks(root_directory: str) -> List[str]:
+    """
+    列出根目录下的所有工作簿（跳过 Excel 临时文件 ~$*）
+
+    Args:
+        root_directory: Excel 文件根目录路径
+
+    Returns:
+        相对于根目录的路径列表（已排序）
+    """
+    workbooks = []
+    for root, _, files in os.walk(root_directory):
+        for filename in files:
+            if not filename.lower().endswith(EXCEL_EXTENSIONS) or filename.startswith("~$"):
+                continue
+            workbooks.append(os.path.relpath(os.path.join(root, filename), root_directory))
+    return sorted(workbooks)
+
+
+def match_workbooks(workbooks: List[str], workbook_name: str) -> List[str]:
+    """
+    可能被 read_and_map_excel 按该工作簿名称读取的文件
+
+    read_and_map_excel 在 mypackage 中实现，按完整文件名、文件名主干、前缀还是子串匹配无法在这里确认，
+    因此取这些方式的并集：相对路径中（不区分大小写）包含工作簿名称的文件都算在内。
+    结果只会比实际读取的文件多，不会少。
+
+    Args:
+        workbooks: list_workbooks 的结果
+        workbook_name: 工作簿名称（table_mapping 的键）
+
+    Returns:
+        匹配的相对路径
+    """
+    name = workbook_name.lower()
+    return [path for path in workbooks if name in path.lower()]
+
+
+def _link_file(source: str, target: str) -> None:
+    """符号链接，不支持时改用硬链接，再不行则复制（辅助函数）"""
+    for link in (os.symlink, os.link):
+        try:
+            link(source, target)
+            return
+        except (OSError, NotImplementedError):
+            continue
+    shutil.copy2(source, target)
+
+
+@contextmanager
+def isolated_directory(root_directory: str, relative_paths: List[str]):
+    """
+    建立只包含指定工作簿的临时目录（保持相对路径），退出时删除
+
+    在该目录上调用 read_and_map_excel，读取结果只可能来自这些文件。
+
+    Args:
+        root_directory: Excel 文件根目录路径
+        relative_paths: 需要包含的工作簿（相对于根目录）
+
+    Examples:
+        with isolated_directory(root_directory, ["收入/收入明细.xlsx"]) as directory:
+            dfs = read_and_map_excel(directory, table_mapping, column_mapping)
+    """
+    directory = tempfile.mkdtemp(prefix="excel_subset_")
+    try:
+        for relative_path in relative_paths:
+            target = os.path.join(directory, relative_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _link_file(os.path.abspath(os.path.join(root_directory, relative_path)), target)
+        yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def group_table_mapping(table_mapping: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+    """
+    按目标表拆分工作簿映射，同一张表的所有工作簿归为一组
+
+    Args:
+        table_mapping: 工作簿名称 -> 表名 的映射（如 combined_table_mapping）
+
+    Returns:
+        {表名: 只包含该表工作簿的子映射}
+    """
+    groups: Dict[str, Dict[str, str]] = {}
+    for workbook, table_name in table_mapping.items():
+        groups.setdefault(table_name, {})[workbook] = table_name
+    return groups
+
+
+def _read_workbook(
+    root_directory: str,
+    relative_path: Optional[str],
+    table_mapping: Dict[str, str],
+    column_mapping: Dict[str, str],
+    engine: Optional[str] = None,
+    keep_columns: Optional[Dict[str, List[str]]] = None
+) -> Tuple[Dict[str, pd.DataFrame], float, Optional[float]]:
+    """
+    在子进程中读取一个工作簿，指定 keep_columns 时在子进程内裁剪列后再返回（辅助函数）
+
+    在只包含该文件的临时目录中调用 read_and_map_excel，映射语义不变且不再遍历整个根目录；
+    relative_path 为 None 时（工作簿名称匹配不到文件）在根目录中读取。
+    解析前重置子进程的峰值内存，返回的峰值只包含本次解析（进程池中的进程会被复用）。
+
+    Returns:
+        (映射后的数据字典, 耗时秒数, 本次解析的子进程峰值内存 MB；无法单独统计时为 None)
+    """
+    from mypackage.utilities import read_and_map_excel
+
+    measured = reset_peak_rss()
+    start = time.perf_counter()
+    with excel_engine(engine):
+        if relative_path is None:
+            dfs = read_and_map_excel(root_directory, table_mapping, column_mapping)
+        else:
+            with isolated_directory(root_directory, [relative_path]) as directory:
+                dfs = read_and_map_excel(directory, table_mapping, column_mapping)
+    if keep_columns:
+        dfs = {
+            name: df[keep_columns[name]]
+            if name in keep_columns and all(col in df.columns for col in keep_columns[name]) else df
+            for name, df in dfs.items()
+        }
+    return dfs, time.perf_counter() - start, peak_rss_since_reset_mb() if measured else None
+
+
+def read_and_map_excel_parallel(
+    root_directory: str,
+    table_mapping: Dict[str, str],
+    column_mapping: Dict[str, str],
+    max_workers: int = 4,
+    engine: Optional[str] = None,
+    keep_columns: Optional[Dict[str, List[str]]] = None
+) -> Tuple[Dict[str, pd.DataFrame], List[Dict]]:
+    """
+    使用进程池并行解析工作簿，结果与 read_and_map_excel 相同
+
+    主进程只遍历一次根目录，按 match_workbooks 把工作簿名称解析为文件，每个文件作为一个解析单元
+    提交到进程池（同一张表的多个工作簿也并行解析），子进程只读取该文件可能对应的工作簿名称；
+    各文件的结果按文件路径顺序合并。匹配不到文件的工作簿名称按表在根目录中读取。
+
+    Args:
+        root_directory: Excel 文件根目录路径
+        table_mapping: 工作簿名称 -> 表名 的映射
+        column_mapping: 列名映射
+        max_workers: 进程数
+        engine: Excel 解析引擎（auto / calamine / openpyxl），不传则使用 PREFECT_EXCEL_ENGINE
+        keep_columns: {表名: 需要保留的列}，在子进程内裁剪后再传回主进程
+
+    Returns:
+        (数据字典, 耗时明细列表)，耗时明细按耗时从高到低排列，
+        每项包含 workbook（相对路径）、tables、seconds、rows、peak_mb（解析该文件时子进程的峰值内存）
+    """
+    engine = resolve_excel_engine(engine)
+    workbooks = list_workbooks(root_directory)
+
+    # 解析单元：(文件相对路径, 该文件对应的子映射)；匹配不到文件的按表在根目录中读取
+    file_mappings: Dict[str, Dict[str, str]] = {}
+    unresolved: Dict[str, str] = {}
+    for workbook, table_name in table_mapping.items():
+        paths = match_workbooks(workbooks, workbook)
+        if not paths:
+            unresolved[workbook] = table_name
+        for path in paths:
+            file_mappings.setdefault(path, {})[workbook] = table_name
+    units: List[Tuple[Optional[str], Dict[str, str]]] = sorted(file_mappings.items())
+    units += [(None, subset) for subset in group_table_mapping(unresolved).values()]
+    if unresolved:
+        print(f"[WARN] 以下工作簿名称匹配不到文件，将在根目录中按表读取: {sorted(unresolved)}")
+
+    parts: Dict[int, Dict[str, pd.DataFrame]] = {}
+    timings: List[Dict] = []
+    errors: List[str] = []
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _read_workbook, root_directory, path, subset, column_mapping, engine, keep_columns
+            ): idx
+            for idx, (path, subset) in enumerate(units)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            path, subset = units[idx]
+            label = path if path is not None else f"(根目录) {', '.join(subset)}"
+            try:
+                part, seconds, peak_mb = future.result()
+            except Exception as e:
+                errors.append(f"{label}: {str(e)}")
+                continue
+
+            parts[idx] = part
+            timings.append({
+                'workbook': label,
+                'tables': sorted(set(subset.values())),
+                'seconds': seconds,
+                'rows': sum(len(df) for df in part.values()),
+                'peak_mb': peak_mb,
+            })
+
+    if errors:
+        raise RuntimeError(f"并行读取 Excel 失败: {'; '.join(errors)}")
+
+    # 按解析单元顺序合并，结果与完成先后无关
+    frames: Dict[str, List[pd.DataFrame]] = {}
+    for idx in sorted(parts):
+        for name, df in parts[idx].items():
+            frames.setdefault(name, []).append(df)
+    dfs = {
+        name: items[0] if len(items) == 1 else pd.concat(items, ignore_index=True)
+        for name, items in frames.items()
+    }
+
+    timings.sort(key=lambda item: item['seconds'], reverse=True)
+    return dfs, timings
+
+
+def print_read_timings(timings: List[Dict], top: int = 20) -> None:
+    """
+    打印每个工作簿的解析耗时、行数与解析时子进程的峰值内存（从慢到快）
+
+    Args:
+        timings: read_and_map_excel_parallel 返回的耗时明细
+        top: 最多打印的条数
+    """
+    print(f"工作簿解析耗时（前 {min(top, len(timings))} 项，共 {len(timings)} 个工作簿）:")
+    for item in timings[:top]:
+        peak = f"{item['peak_mb']:>6.0f} MB" if item.get('peak_mb') is not None else "  未知 MB"
+        print(
+            f"  {item['seconds']:>8.2f} 秒 | {item['rows']:>8} 行 | {peak} | {item['workbook']} | "
+            f"{', '.join(item['tables'])}")
+
+
+def read_excel_sheets(
+    file_path: str,
+    sheet_names: Optional[List[str]] = None,
+    engine: Optional[str] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    只打开一次工作簿，以流式只读模式读取多个工作表
+
+    与逐个调用 pd.read_excel 相比，文件只从共享盘读取、解压一次。
+    每个工作表的第一行作为表头，空表头按 pandas 习惯命名为 "Unnamed: n"，全空行会被丢弃。
+    使用 calamine 引擎时由 pandas 一次读取所有工作表。
+
+    Args:
+        file_path: 工作簿路径
+        sheet_names: 需要读取的工作表名称，不传则读取全部工作表
+        engine: Excel 解析引擎（auto / calamine / openpyxl），不传则使用 PREFECT_EXCEL_ENGINE
+
+    Returns:
+        {工作表名称: DataFrame}
+
+    Raises:
+        ValueError: 工作簿中不存在指定的工作表
+    """
+    if resolve_excel_engine(engine) == "calamine":
+        with pd.ExcelFile(file_path, engine="calamine") as xls:
+            names = sheet_names if sheet_names is not None else xls.sheet_names
+            missing = [name for name in names if name not in xls.sheet_names]
+            if missing:
+                raise ValueError(f"{file_path} 中不存在工作表: {missing}")
+            return {name: xls.parse(name).dropna(how="all") for name in names}
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        names = sheet_names if sheet_names is not None else workbook.sheetnames
+        missing = [name for name in names if name not in workbook.sheetnames]
+        if missing:
+            raise ValueError(f"{file_path} 中不存在工作表: {missing}")
+
+        sheets: Dict[str, pd.DataFrame] = {}
+        for name in names:
+            rows = workbook[name].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                sheets[name] = pd.DataFrame()
+                continue
+            columns = [
+                col if col is not None else f"Unnamed: {idx}"
+                for idx, col in enumerate(header)
+            ]
+            df = pd.DataFrame.from_records(list(rows), columns=columns)
+            sheets[name] = df.dropna(how="all").infer_objects()
+        return sheets
+    finally:
+        workbook.close()
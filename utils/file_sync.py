@@ -0,0 +1,189 @@
+"""共享盘目录本地镜像工具
+
+解析 Excel 前先把共享盘上的源目录同步到本地磁盘：只复制大小或修改时间发生变化的文件，
+多线程并行复制并在失败时重试，之后所有解析都读本地副本，避免每次小读取都承受 SMB 延迟。
+"""
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+# 本地镜像根目录，可通过环境变量覆盖
+DEFAULT_MIRROR_DIR = os.environ.get(
+    "PREFECT_EXCEL_MIRROR_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "prefect_mirror"),
+)
+
+# 共享盘上的修改时间精度通常只有 1~2 秒，差值在该范围内视为未修改
+_MTIME_TOLERANCE = 2.0
+
+
+def default_mirror_path(source_directory: str) -> str:
+    """
+    源目录对应的默认本地镜像目录
+
+    Args:
+        source_directory: 共享盘上的源目录
+
+    Returns:
+        DEFAULT_MIRROR_DIR 下以源目录名称和路径哈希命名的子目录
+    """
+    source_directory = os.path.normpath(source_directory)
+    digest = hashlib.sha1(source_directory.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(DEFAULT_MIRROR_DIR, f"{os.path.basename(source_directory)}_{digest}")
+
+
+def _is_unchanged(src_stat: os.stat_result, dst_path: str) -> bool:
+    try:
+        dst_stat = os.stat(dst_path)
+    except OSError:
+        return False
+    return (dst_stat.st_size == src_stat.st_size and
+            abs(dst_stat.st_mtime - src_stat.st_mtime) <= _MTIME_TOLERANCE)
+
+
+def _copy_with_retry(src_path: str, dst_path: str, retries: int) -> float:
+    """复制单个文件（先写临时文件再替换），失败时按指数退避重试，返回耗时秒数（辅助函数）"""
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    tmp_path = dst_path + ".syncing"
+    for attempt in range(1, retries + 1):
+        start = time.perf_counter()
+        try:
+            shutil.copy2(src_path, tmp_path)
+            os.replace(tmp_path, dst_path)
+            return time.perf_counter() - start
+        except OSError as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if attempt == retries:
+                raise
+            print(f"[WARN] 复制 {src_path} 失败（第 {attempt} 次）: {str(e)}，稍后重试")
+            time.sleep(2 ** (attempt - 1))
+    return 0.0
+
+
+def mirror_directory(
+    source_directory: str,
+    target_directory: Optional[str] = None,
+    extensions: Optional[Tuple[str, ...]] = None,
+    max_workers: int = 8,
+    retries: int = 3,
+    delete_extra: bool = True
+) -> Dict:
+    """
+    将源目录增量同步到本地镜像目录
+
+    按 (大小, 修改时间) 判断文件是否变化，只复制变化的文件并保留原修改时间；
+    源目录中已删除的文件也会从镜像中删除（delete_extra=False 时保留）。
+
+    Args:
+        source_directory: 共享盘上的源目录
+        target_directory: 本地镜像目录，不传则使用 default_mirror_path(source_directory)
+        extensions: 只同步这些扩展名的文件（如 ('.xlsx', '.xlsm')），不传则同步全部文件
+        max_workers: 并行复制的线程数
+        retries: 单个文件的最大尝试次数
+        delete_extra: 是否删除镜像中源目录已不存在的文件
+
+    Returns:
+        同步报告，包含 target_directory、scanned、copied、skipped、removed、
+        bytes_copied、bytes_skipped、seconds、estimated_seconds_saved、failed
+
+    Raises:
+        FileNotFoundError: 源目录不存在
+        RuntimeError: 有文件在重试后仍复制失败
+    """
+    if not os.path.isdir(source_directory):
+        raise FileNotFoundError(f"源目录不存在: {source_directory}")
+    target_directory = target_directory or default_mirror_path(source_directory)
+    start = time.perf_counter()
+
+    to_copy: List[Tuple[str, str, int]] = []
+    expected = set()
+    scanned = 0
+    bytes_skipped = 0
+    for root, _, files in os.walk(source_directory):
+        rel_root = os.path.relpath(root, source_directory)
+        for filename in files:
+            if filename.startswith("~$"):  # 跳过 Office 临时文件
+                continue
+            if extensions and not filename.lower().endswith(extensions):
+                continue
+            src_path = os.path.join(root, filename)
+            dst_path = os.path.normpath(os.path.join(target_directory, rel_root, filename))
+            expected.add(dst_path)
+            scanned += 1
+            try:
+                src_stat = os.stat(src_path)
+            except OSError as e:
+                print(f"[WARN] 无法读取 {src_path} 的文件信息，跳过: {str(e)}")
+                continue
+            if _is_unchanged(src_stat, dst_path):
+                bytes_skipped += src_stat.st_size
+            else:
+                to_copy.append((src_path, dst_path, src_stat.st_size))
+
+    bytes_copied = 0
+    copy_seconds = 0.0
+    failed: List[str] = []
+    if to_copy:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_copy_with_retry, src_path, dst_path, retries): (src_path, size)
+                for src_path, dst_path, size in to_copy
+            }
+            for future in as_completed(futures):
+                src_path, size = futures[future]
+                try:
+                    copy_seconds += future.result()
+                    bytes_copied += size
+                except Exception as e:
+                    failed.append(f"{src_path}: {str(e)}")
+
+    removed = 0
+    if delete_extra and os.path.isdir(target_directory):
+        for root, _, files in os.walk(target_directory):
+            for filename in files:
+                path = os.path.normpath(os.path.join(root, filename))
+                if path not in expected:
+                    os.remove(path)
+                    removed += 1
+
+    # 以本次实际复制速度估算跳过未变化文件节省的时间
+    throughput = bytes_copied / copy_seconds if copy_seconds > 0 else 0
+    report = {
+        "target_directory": target_directory,
+        "scanned": scanned,
+        "copied": len(to_copy) - len(failed),
+        "skipped": scanned - len(to_copy),
+        "removed": removed,
+        "bytes_copied": bytes_copied,
+        "bytes_skipped": bytes_skipped,
+        "seconds": time.perf_counter() - start,
+        "estimated_seconds_saved": bytes_skipped / throughput if throughput else None,
+        "failed": failed,
+    }
+    print_sync_report(source_directory, report)
+
+    if failed:
+        raise RuntimeError(f"同步 {len(failed)} 个文件失败: {'; '.join(failed[:5])}")
+    return report
+
+
+def print_sync_report(source_directory: str, report: Dict) -> None:
+    """
+    打印同步报告
+
+    Args:
+        source_directory: 源目录
+        report: mirror_directory 返回的同步报告
+    """
+    mb = 1024 * 1024
+    print(f"目录同步完成: {source_directory} -> {report['target_directory']}")
+    print(f"  扫描 {report['scanned']} 个文件，复制 {report['copied']} 个，"
+          f"未变化 {report['skipped']} 个，删除 {report['removed']} 个，失败 {len(report['failed'])} 个")
+    print(f"  传输 {report['bytes_copied'] / mb:.1f} MB，跳过 {report['bytes_skipped'] / mb:.1f} MB，"
+          f"耗时 {report['seconds']:.2f} 秒")
+    if report["estimated_seconds_saved"] is not None:
+        print(f"  跳过未变化文件约节省 {report['estimated_seconds_saved']:.1f} 秒")
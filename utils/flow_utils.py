@@ -0,0 +1,66 @@
+"""Prefect flow 辅助函数"""
+from datetime import datetime, timezone
+from typing import Dict, Sequence
+
+
+def wait_branches(branches: Dict[str, object], start: datetime) -> Dict[str, float]:
+    """
+    等待并发提交的各分支结束，打印每个分支的耗时
+
+    先等待全部分支结束再统一检查结果，单个分支失败时其余分支仍会执行完毕。
+
+    Args:
+        branches: {分支名称: 分支最后一个 task 的 PrefectFuture}
+        start: 分支提交时刻（带时区的 datetime，如 datetime.now(timezone.utc)）
+
+    Returns:
+        {分支名称: 从提交到结束的秒数}
+
+    Raises:
+        分支中第一个失败 task 的异常
+    """
+    timings: Dict[str, float] = {}
+    for name, future in branches.items():
+        state = future.wait()
+        finished = getattr(state, "timestamp", None) or datetime.now(timezone.utc)
+        timings[name] = (finished - start).total_seconds()
+
+    for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"  [分支] {name}: {seconds:.1f} 秒")
+
+    for future in branches.values():
+        future.result()
+    return timings
+
+
+def wait_first(futures: Sequence[object], poll_seconds: float = 0.5) -> int:
+    """
+    等待一组 PrefectFuture 中任意一个结束，返回最先结束的下标
+
+    Prefect 3 使用 prefect.futures.as_completed；Prefect 2 没有该函数，
+    改为轮流以短超时调用 future.wait()，直到某个 future 进入终态。
+
+    Args:
+        futures: 已提交的 PrefectFuture 列表（不能为空）
+        poll_seconds: Prefect 2 下每轮轮询的总时长（秒）
+
+    Returns:
+        最先结束的 future 在 futures 中的下标
+    """
+    if not futures:
+        raise ValueError("futures 不能为空")
+    try:
+        from prefect.futures import as_completed
+    except ImportError:
+        as_completed = None
+
+    if as_completed is not None:
+        finished = next(iter(as_completed(list(futures))))
+        return next(idx for idx, future in enumerate(futures) if future is finished)
+
+    timeout = poll_seconds / len(futures)
+    while True:
+        for idx, future in enumerate(futures):
+            state = future.wait(timeout=timeout)
+            if state is not None and state.is_final():
+                return idx
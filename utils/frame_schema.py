@@ -0,0 +1,193 @@
+"""明细表的列类型声明
+
+业务线核算和利润表刷新中的 unique_lvl、bus_line、prim_subj、category、fin_con、fin_ind 等列
+是取值很少的长中文字符串，作为 object 列在每次 merge、concat、melt、groupby 中反复复制和哈希。
+这里按表声明列类型：维度列为 category，金额列为 float64，期间列为 datetime64，
+加载数据时统一转换一次；合并时用 concat_aligned 对齐类别，避免 category 退化为 object。
+
+注意：category 列做 groupby / pivot_table 时需要传 observed=True，否则会生成全部类别组合。
+"""
+from typing import Dict, List, Mapping, Optional
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CATEGORY = "category"
+AMOUNT = "float64"
+PERIOD = "datetime64[ns]"
+
+# 各表共用的列类型（存在即转换）
+COMMON_SCHEMA: Dict[str, str] = {
+    "unique_lvl": CATEGORY,
+    "source_lvl": CATEGORY,
+    "sec_dist_lvl": CATEGORY,
+    "bus_line": CATEGORY,
+    "prim_subj": CATEGORY,
+    "category": CATEGORY,
+    "fin_con": CATEGORY,
+    "fin_ind": CATEGORY,
+    "class": CATEGORY,
+    "acct_period": PERIOD,
+    "amt": AMOUNT,
+    "mo_amt": AMOUNT,
+    "exp_amt": AMOUNT,
+    "rate": AMOUNT,
+}
+
+
+def _amounts(columns: List[str]) -> Dict[str, str]:
+    return {col: AMOUNT for col in columns}
+
+
+# 各表额外的列类型
+TABLE_SCHEMAS: Dict[str, Dict[str, str]] = {
+    "fact_revenue": _amounts(["amt_tax_exc_loc", "cost_amt", "freight_cost", "soft_cost", "tariff_cost"]),
+    "fact_expense": {},
+    "fact_profit_bd": {"date": PERIOD},
+    "fact_bus_profit_bd": {"date": PERIOD},
+    "fact_receivable": _amounts([
+        "unaudited_sales_amt", "unaudited_prepay_amt", "unaudited_inst_amt", "ar_balance", "ovd_amt",
+        "undue_amt", "ovd_30d_less_amt", "ovd_30_90d_amt", "ovd_90_180d_amt", "ovd_180_360d_amt",
+        "ovd_360d_plus_amt", "acct_age_3m_less", "acct_age_3_6m", "acct_age_6_9m", "acct_age_9_12m",
+        "acct_age_1_2y", "acct_age_2_3y", "acct_age_3y_plus",
+        "yr_debit_occ", "yr_credit_occ", "last_mo_ovd_amt", "ovd_change", "yr_repay_amt",
+    ]),
+    "fact_inventory": _amounts([
+        "qty_inv", "ref_amt", "qty_6m_less", "amt_6m_less",
+        "qty_6_9m", "amt_6_9m", "qty_9m_1y", "amt_9m_1y", "qty_1_2y", "amt_1_2y",
+        "qty_2_3y", "amt_2_3y", "qty_3y_plus", "amt_3y_plus",
+    ]),
+    "fact_inventory_on_way": _amounts([
+        "order_amount", "total_payment_amount", "order_count",
+        "total_inventory_received", "unreceived_inventory",
+    ]),
+}
+
+# 业务线核算从各源表读取的列（显式声明，load_period_data 只读取这些列）
+# 源表新增的列不会自动传到 fact_bus_* 明细表，需要时在此处补充；增量写入的 row_hash 等内部列不在其中
+_SOURCE_DIMENSIONS = ["source_no", "fin_con", "fin_ind", "unique_lvl"]
+SOURCE_COLUMNS: Dict[str, List[str]] = {
+    "fact_revenue": _SOURCE_DIMENSIONS + ["acct_period"] + list(TABLE_SCHEMAS["fact_revenue"]),
+    "fact_expense": _SOURCE_DIMENSIONS + ["acct_period", "prim_subj", "exp_amt"],
+    "fact_profit_bd": _SOURCE_DIMENSIONS + ["date", "prim_subj", "mo_amt"],
+    "fact_receivable": ["source_no", "unique_lvl", "acct_period"] + list(TABLE_SCHEMAS["fact_receivable"]),
+    "fact_inventory": ["source_no", "unique_lvl", "acct_period"] + list(TABLE_SCHEMAS["fact_inventory"]),
+    "fact_inventory_on_way": (
+        ["source_no", "unique_lvl", "acct_period"] + list(TABLE_SCHEMAS["fact_inventory_on_way"])),
+}
+
+
+def table_schema(table_name: Optional[str] = None) -> Dict[str, str]:
+    """
+    表的列类型声明
+
+    Args:
+        table_name: 表名，不传或未登记时只使用共用列类型
+
+    Returns:
+        {列名: dtype}
+    """
+    schema = dict(COMMON_SCHEMA)
+    schema.update(TABLE_SCHEMAS.get(table_name, {}))
+    return schema
+
+
+def apply_schema(df: pd.DataFrame, table_name: Optional[str] = None) -> pd.DataFrame:
+    """
+    按声明转换列类型（只转换存在且类型不一致的列）
+
+    Args:
+        df: 数据
+        table_name: 表名
+
+    Returns:
+        转换后的 DataFrame（未转换的列与原数据共享内存）
+    """
+    converted = {}
+    for col, dtype in table_schema(table_name).items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if dtype == CATEGORY:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                converted[col] = series.astype(CATEGORY)
+        elif dtype == PERIOD:
+            if str(series.dtype) != PERIOD:
+                converted[col] = pd.to_datetime(series)
+        elif series.dtype != dtype:
+            converted[col] = pd.to_numeric(series, errors="coerce").astype(dtype)
+    return df.assign(**converted) if converted else df
+
+
+def concat_aligned(frames: List[pd.DataFrame], **kwargs) -> pd.DataFrame:
+    """
+    合并 DataFrame，并保持 category 列不退化为 object
+
+    任一输入中为 category 的列，先用 union_categoricals 合并所有输入的类别，
+    再把各输入的该列转换为同一类别后 concat。
+
+    Args:
+        frames: 需要合并的 DataFrame
+        **kwargs: 传给 pd.concat 的参数（如 ignore_index=True）
+
+    Returns:
+        合并后的数据
+    """
+    frames = [df for df in frames if df is not None]
+    category_columns = {
+        col for df in frames for col in df.columns
+        if isinstance(df[col].dtype, pd.CategoricalDtype)
+    }
+    if not category_columns:
+        return pd.concat(frames, **kwargs)
+
+    aligned = list(frames)
+    for col in category_columns:
+        parts = [
+            df[col] if isinstance(df[col].dtype, pd.CategoricalDtype)
+            else df[col].astype(object).astype(CATEGORY)
+            for df in frames if col in df.columns
+        ]
+        # 全空列（如 reindex 补出的列）没有类别，不参与合并，避免类别 dtype 不一致
+        parts = [part for part in parts if len(part.cat.categories)]
+        if not parts:
+            continue
+        dtype = pd.CategoricalDtype(union_categoricals(parts, ignore_order=True).categories)
+        aligned = [
+            df.assign(**{col: df[col].astype(dtype)}) if col in df.columns else df
+            for df in aligned
+        ]
+    return pd.concat(aligned, **kwargs)
+
+
+def assign_where(series: pd.Series, mask: pd.Series, value) -> pd.Series:
+    """
+    把 mask 为 True 的位置替换为 value（category 列会先补充该类别）
+
+    Args:
+        series: 列数据
+        mask: 需要替换的位置
+        value: 新值
+
+    Returns:
+        替换后的列
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.mask(mask, value)
+
+
+def replace_values(series: pd.Series, mapping: Mapping) -> pd.Series:
+    """
+    按映射替换取值；category 列只替换类别本身，不逐行处理
+
+    Args:
+        series: 列数据
+        mapping: {旧值: 新值}
+
+    Returns:
+        替换后的列
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.map(lambda value: mapping.get(value, value))
+    return series.replace(mapping)
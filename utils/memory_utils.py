@@ -0,0 +1,124 @@
+"""内存占用相关工具函数"""
+import sys
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+# reset_peak_rss 重置前记录的峰值（Linux 下 ru_maxrss 也会随之重置），peak_rss_mb 取两者较大值
+_peak_before_reset_mb = 0.0
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    进程整个生命周期的峰值常驻内存（MB）
+
+    Args:
+        children: 为 True 时返回已结束并被回收的子进程（如关闭后的进程池）中最大的峰值
+
+    Returns:
+        峰值内存；Windows 等不支持 resource 模块的平台返回 None
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux 下单位为 KB，macOS 下为字节
+    peak = peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    return peak if children else max(peak, _peak_before_reset_mb)
+
+
+def peak_rss_since_reset_mb() -> Optional[float]:
+    """
+    上次 reset_peak_rss 以来当前进程的峰值常驻内存（MB，读取 /proc/self/status 的 VmHWM）
+
+    Returns:
+        峰值内存；不支持的平台返回 None
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """
+    把当前进程的峰值常驻内存重置为当前值（仅 Linux，写入 /proc/self/clear_refs）
+
+    重置后 peak_rss_since_reset_mb 返回的是之后这段时间的峰值，可用于统计单个步骤（如解析一个工作簿）的峰值内存；
+    重置前的峰值会被记录下来，peak_rss_mb 仍返回整个生命周期的峰值。
+
+    Returns:
+        是否重置成功；不支持的平台返回 False
+    """
+    global _peak_before_reset_mb
+    _peak_before_reset_mb = max(_peak_before_reset_mb, peak_rss_mb() or 0.0)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def frame_memory_mb(df: pd.DataFrame) -> float:
+    """DataFrame 实际占用的内存（MB，包含字符串对象）"""
+    return df.memory_usage(deep=True).sum() / 1024 / 1024
+
+
+def prune_columns(
+    df: pd.DataFrame,
+    columns: Optional[List[str]],
+    name: str = ""
+) -> pd.DataFrame:
+    """
+    只保留需要的列
+
+    Args:
+        df: 数据
+        columns: 需要保留的列，为 None 时不裁剪
+        name: 表名（仅用于提示）
+
+    Returns:
+        裁剪后的 DataFrame；缺少声明的列时不裁剪并打印警告，交由后续逻辑按原方式报错
+    """
+    if columns is None:
+        return df
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        print(f"[WARN] {name} 缺少声明的列 {missing}，不裁剪")
+        return df
+    return df[columns]
+
+
+def to_categoricals(
+    df: pd.DataFrame,
+    exclude: Iterable[str] = (),
+    max_unique_ratio: float = 0.5
+) -> pd.DataFrame:
+    """
+    把重复度高的字符串列转换为 category 类型
+
+    Args:
+        df: 数据
+        exclude: 不转换的列（如日期列、后续需要做字符串拼接或赋新值的列）
+        max_unique_ratio: 不同取值数 / 行数 不超过该比例的列才转换
+
+    Returns:
+        转换后的 DataFrame（未转换的列与原数据共享内存）
+    """
+    if df.empty:
+        return df
+    exclude = set(exclude)
+    converted = {}
+    for col in df.columns:
+        if col in exclude or df[col].dtype != object:
+            continue
+        if df[col].nunique(dropna=True) <= len(df) * max_unique_ratio:
+            converted[col] = df[col].astype("category")
+    return df.assign(**converted) if converted else df
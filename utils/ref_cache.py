@@ -0,0 +1,127 @@
+"""进程内参考数据（维表）缓存
+
+dim_org_struc、fact_bus_line、fact_bus_shared_rate 等小表在一次业务线核算中会被多个 task
+反复读取。这里按表缓存整表数据，每次取用前先做一次轻量的版本探测
+（行数 + max(last_modified)，表中没有 last_modified 列时用行数 + pg_stat 的增删改计数），
+版本未变且未超过 TTL 时直接返回缓存，否则重新加载。写入这些表的代码应在写入后
+调用 invalidate_reference_table 显式失效。
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from .db_utils import fetch_dataframe, get_engine
+
+# 缓存有效期（秒），小于等于 0 表示只按版本探测失效
+REF_CACHE_TTL = float(os.environ.get("PREFECT_REF_CACHE_TTL", "0"))
+
+_cache: Dict[str, Tuple[pd.DataFrame, tuple, float]] = {}
+_has_last_modified: Dict[str, bool] = {}
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _probe_version(conn, table_name: str) -> tuple:
+    """查询表的当前版本标识（辅助函数）"""
+    cur = conn.cursor()
+    try:
+        if table_name not in _has_last_modified:
+            cur.execute(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = %s "
+                "AND column_name = 'last_modified'",
+                (table_name,)
+            )
+            _has_last_modified[table_name] = cur.fetchone() is not None
+
+        if _has_last_modified[table_name]:
+            cur.execute(f"SELECT count(*), max(last_modified) FROM {table_name}")
+        else:
+            cur.execute(
+                f"SELECT (SELECT count(*) FROM {table_name}), "
+                "(SELECT n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables "
+                "WHERE relid = %s::regclass)",
+                (table_name,)
+            )
+        return tuple(cur.fetchone())
+    finally:
+        cur.close()
+
+
+def get_reference_table(table_name: str, ttl: Optional[float] = None) -> pd.DataFrame:
+    """
+    从进程内缓存获取整张参考表
+
+    Args:
+        table_name: 表名
+        ttl: 缓存有效期（秒），不传则使用 REF_CACHE_TTL，小于等于 0 表示不过期
+
+    Returns:
+        表数据（缓存的浅拷贝：可以对列重新赋值，但不要原地修改列中的值）
+    """
+    ttl = REF_CACHE_TTL if ttl is None else ttl
+    conn = get_engine().raw_connection()
+    try:
+        version = _probe_version(conn, table_name)
+        with _cache_lock:
+            entry = _cache.get(table_name)
+            if entry is not None:
+                df, cached_version, loaded_at = entry
+                expired = ttl > 0 and time.monotonic() - loaded_at > ttl
+                if cached_version == version and not expired:
+                    _stats["hits"] += 1
+                    conn.commit()
+                    return df.copy(deep=False)
+
+        df = fetch_dataframe(conn, f"SELECT * FROM {table_name}")
+        conn.commit()
+    finally:
+        conn.close()
+
+    with _cache_lock:
+        _cache[table_name] = (df, version, time.monotonic())
+        _stats["misses"] += 1
+    print(f"[REF] 已加载参考表 {table_name}: {len(df)} 行")
+    return df.copy(deep=False)
+
+
+def table_version(table_name: str) -> tuple:
+    """
+    查询表的当前版本标识（与缓存失效使用同一探测方式）
+
+    Args:
+        table_name: 表名
+
+    Returns:
+        版本标识，表数据发生增删改后会变化
+    """
+    conn = get_engine().raw_connection()
+    try:
+        version = _probe_version(conn, table_name)
+        conn.commit()
+        return version
+    finally:
+        conn.close()
+
+
+def invalidate_reference_table(table_name: Optional[str] = None) -> None:
+    """
+    使参考表缓存失效
+
+    Args:
+        table_name: 表名，不传则清空全部缓存
+    """
+    with _cache_lock:
+        if table_name is None:
+            _cache.clear()
+        else:
+            _cache.pop(table_name, None)
+
+
+def reference_cache_stats() -> Dict[str, int]:
+    """缓存命中/未命中次数"""
+    with _cache_lock:
+        return dict(_stats, tables=len(_cache))
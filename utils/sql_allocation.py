@@ -0,0 +1,244 @@
+"""业务线分摊的数据库内执行（INSERT ... SELECT）
+
+规则与 utils.allocation 相同，用于数据库服务器资源远多于 Prefect worker 的场景：
+分拆表、组织架构、比例缺口这些小表用 COPY 写入临时表，明细数据不离开数据库，
+分拆、逆透视、公摊比例还原都由集合运算完成。
+
+为与 pandas 结果逐位一致：金额和比例先转换为 float8 再相乘（与 pandas 读取后的 float64 相同），
+比例缺口 1 − Σrate 在 Python 中用 split_gaps（与 allocate_gap 相同）计算后再写入临时表。
+这里生成的 SQL 中参数占位符为 %s，字面量中的百分号需写成 %%。
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .allocation import SPLIT_COLUMNS, split_gaps
+from .bulk_writer import copy_frame
+
+SPLIT_TABLE = "tmp_alloc_split"
+ORG_TABLE = "tmp_alloc_org"
+GAP_TABLE = "tmp_alloc_gap"
+
+# 分拆结果在明细列之外追加的列，与 allocate_manual / allocate_auto 的结果一致
+ALLOCATION_COLUMNS = ["source_lvl", "unique_lvl", "bus_line", "category", "rate"]
+# 明细中读取时需要去掉的列（由分拆结果重新生成）
+_REPLACED_COLUMNS = {"id", "bus_line", "category", "rate"}
+
+
+def quote(column: str) -> str:
+    """列名加双引号"""
+    return '"' + column.replace('"', '""') + '"'
+
+
+def literal(value: str) -> str:
+    """SQL 字符串字面量"""
+    return "'" + value.replace("'", "''").replace("%", "%%") + "'"
+
+
+def _stage(cur, table_name: str, df: pd.DataFrame, columns: Dict[str, str]) -> None:
+    """把 DataFrame 写入事务结束即删除的临时表（辅助函数）"""
+    cur.execute(f"DROP TABLE IF EXISTS {table_name}")
+    column_defs = ", ".join(f"{quote(col)} {dtype}" for col, dtype in columns.items())
+    cur.execute(f"CREATE TEMP TABLE {table_name} ({column_defs}) ON COMMIT DROP")
+    copy_frame(cur, table_name, df[list(columns)], columns)
+    cur.execute(f"ANALYZE {table_name}")
+
+
+def stage_allocation_inputs(
+    cur,
+    split: pd.DataFrame,
+    org: pd.DataFrame,
+    with_gap: bool = False
+) -> None:
+    """
+    把分拆行、组织架构（以及比例缺口）写入临时表
+
+    Args:
+        cur: 游标（临时表在调用方提交事务时删除）
+        split: 该类型的分拆行（split_rows 的结果）
+        org: 组织架构（需包含 unique_lvl、bus_line）
+        with_gap: 是否同时写入比例缺口（split_gaps 的结果，与 allocate_gap 相同）
+    """
+    text_columns = {col: "text" for col in SPLIT_COLUMNS}
+    _stage(cur, SPLIT_TABLE, split.assign(rate=split["rate"].astype(float)),
+           {**text_columns, "rate": "float8"})
+    _stage(cur, ORG_TABLE, org, {"unique_lvl": "text", "bus_line": "text"})
+    if with_gap:
+        gap = split_gaps(split).rename_axis("source_no").reset_index()
+        _stage(cur, GAP_TABLE, gap, {"source_no": "text", "rate": "float8"})
+
+
+def detail_columns(table_columns: Sequence[str]) -> List[str]:
+    """明细表中参与分拆的列（去掉 id 以及由分拆结果重新生成的列）"""
+    return [col for col in table_columns if col not in _REPLACED_COLUMNS]
+
+
+def allocated_columns(columns: Sequence[str]) -> List[str]:
+    """allocation_select 结果的列顺序"""
+    return [col for col in columns if col != "unique_lvl"] + ALLOCATION_COLUMNS
+
+
+def allocation_select(
+    source_sql: str,
+    columns: Sequence[str],
+    amount_columns: Sequence[str],
+    none_category: str = "无",
+    with_gap: bool = False
+) -> str:
+    """
+    手工分拆 + 自动归属（+ 比例缺口）的查询，结果列为 allocated_columns(columns)
+
+    Args:
+        source_sql: 明细查询（结果列为 columns）
+        columns: 明细列（detail_columns 的结果）
+        amount_columns: 需要乘以比例的金额列
+        none_category: 自动归属部分业务线为 '无' 时的 category
+        with_gap: 是否包含比例缺口部分（需 stage_allocation_inputs(with_gap=True)）
+
+    Returns:
+        SELECT 语句
+    """
+    amounts = set(amount_columns)
+    others = [col for col in columns if col != "unique_lvl"]
+
+    def select_list(rate_expr: Optional[str]) -> str:
+        items = []
+        for col in others:
+            if col in amounts:
+                expr = f"src.{quote(col)}::float8"
+                items.append(f"{expr} * {rate_expr} AS {quote(col)}" if rate_expr else f"{expr} AS {quote(col)}")
+            else:
+                items.append(f"src.{quote(col)}")
+        return ", ".join(items)
+
+    branches = [
+        # 手工分拆：按分拆行展开，金额 × rate
+        f"SELECT {select_list('s.rate')}, src.unique_lvl AS source_lvl, s.unique_lvl AS unique_lvl, "
+        f"s.bus_line AS bus_line, s.category AS category, s.rate AS rate "
+        f"FROM src JOIN {SPLIT_TABLE} s ON s.source_no = src.source_no::text",
+        # 自动归属：按 unique_lvl 取组织架构的业务线，rate = 1
+        f"SELECT {select_list(None)}, src.unique_lvl AS source_lvl, src.unique_lvl AS unique_lvl, "
+        f"o.bus_line AS bus_line, "
+        f"CASE WHEN o.bus_line = '无' THEN {literal(none_category)} ELSE '直接归属' END AS category, "
+        f"1::float8 AS rate "
+        f"FROM src LEFT JOIN {ORG_TABLE} o ON o.unique_lvl = src.unique_lvl::text "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {SPLIT_TABLE} s WHERE s.source_no = src.source_no::text)",
+    ]
+    if with_gap:
+        # 比例缺口：1 − Σrate 归入公摊
+        branches.append(
+            f"SELECT {select_list('g.rate')}, src.unique_lvl AS source_lvl, src.unique_lvl AS unique_lvl, "
+            f"'无' AS bus_line, '公摊费用' AS category, g.rate AS rate "
+            f"FROM src JOIN {GAP_TABLE} g ON g.source_no = src.source_no::text"
+        )
+    return f"WITH src AS ({source_sql}) " + " UNION ALL ".join(branches)
+
+
+def melt_select(
+    relation: str,
+    id_columns: Sequence[str],
+    value_columns: Dict[str, str],
+    var_name: str,
+    value_name: str
+) -> str:
+    """
+    逆透视（与 pd.melt 后去掉空值、替换科目名称相同）
+
+    Args:
+        relation: 数据来源（表名或带别名的子查询）
+        id_columns: 保留的列
+        value_columns: {金额列: 逆透视后的名称}
+        var_name: 名称列
+        value_name: 金额列
+
+    Returns:
+        SELECT 语句，结果列为 id_columns + [var_name, value_name]
+    """
+    values = ", ".join(
+        f"({literal(name)}, m.{quote(col)}::float8)" for col, name in value_columns.items())
+    id_list = ", ".join(f"m.{quote(col)}" for col in id_columns)
+    return (
+        f"SELECT {id_list}, v.{quote(var_name)}, v.{quote(value_name)} FROM {relation} m "
+        f"CROSS JOIN LATERAL (VALUES {values}) AS v({quote(var_name)}, {quote(value_name)}) "
+        f"WHERE v.{quote(value_name)} IS NOT NULL"
+    )
+
+
+def replace_select(relation: str, columns: Sequence[str], replacements: Dict[str, str]) -> str:
+    """
+    按列替换为表达式的查询
+
+    Args:
+        relation: 数据来源
+        columns: 结果列
+        replacements: {列名: 替换的 SQL 表达式}
+
+    Returns:
+        SELECT 语句，结果列为 columns
+    """
+    items = [
+        f"{replacements[col]} AS {quote(col)}" if col in replacements else quote(col)
+        for col in columns
+    ]
+    return f"SELECT {', '.join(items)} FROM {relation}"
+
+
+def shared_rate_select(
+    relation: str,
+    columns: Sequence[str],
+    scaled_columns: Sequence[str],
+    date_column: str = "acct_period"
+) -> str:
+    """
+    业务线为 '无' 的数据按当月公摊比例展开到各业务线（与 apply_shared_rate_to_* 相同）
+
+    Args:
+        relation: 数据来源
+        columns: 数据列（包含 bus_line、rate）
+        scaled_columns: 需要乘以公摊比例的金额列，不存在的列忽略
+        date_column: 与公摊比例表 date 关联的日期列
+
+    Returns:
+        SELECT 语句，结果列为 columns
+    """
+    scaled = [col for col in scaled_columns if col in columns]
+    shared = []
+    for col in columns:
+        if col in ("bus_line", "rate"):
+            shared.append(f"r.{col}" + ("::float8" if col == "rate" else "") + f" AS {col}")
+        elif col in scaled:
+            shared.append(f"w.{quote(col)}::float8 * r.rate::float8 AS {quote(col)}")
+        else:
+            shared.append(f"w.{quote(col)}")
+    direct = [
+        f"{quote(col)}::float8" if col in scaled else quote(col)
+        for col in columns
+    ]
+    return (
+        f"SELECT {', '.join(shared)} FROM {relation} w "
+        f"LEFT JOIN fact_bus_shared_rate r ON r.date = w.{quote(date_column)} "
+        f"WHERE w.bus_line = '无' "
+        f"UNION ALL SELECT {', '.join(direct)} FROM {relation} WHERE bus_line IS DISTINCT FROM '无'"
+    )
+
+
+def renamed_select(relation: str, columns: Sequence[str], renames: Dict[str, str],
+                   keep: Optional[Sequence[str]] = None) -> Tuple[str, List[str]]:
+    """
+    列改名（并可只保留部分列）的查询
+
+    Args:
+        relation: 数据来源
+        columns: 数据列
+        renames: {原列名: 新列名}
+        keep: 只保留改名后位于其中的列
+
+    Returns:
+        (SELECT 语句, 结果列)
+    """
+    pairs = [(col, renames.get(col, col)) for col in columns]
+    if keep is not None:
+        keep = set(keep)
+        pairs = [(col, new) for col, new in pairs if new in keep]
+    items = ", ".join(f"{quote(col)} AS {quote(new)}" for col, new in pairs)
+    return f"SELECT {items} FROM {relation}", [new for _, new in pairs]
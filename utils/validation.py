@@ -0,0 +1,192 @@
+"""分组合计校验
+
+业务线分拆后，同一 (source_no, unique_lvl, prim_subj) 等分组的 rate 合计应为 1。
+这里把分组键逐列 factorize 为整数编号并合成组号，用 numpy.bincount 一次求出各组合计，
+只返回不满足条件的分组，不再对上百万行做 groupby 和逐组打印。
+数据库内执行的分摊（utils.sql_allocation）用 check_group_sums_sql 在数据库中完成同样的校验。
+"""
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+RATE_TOLERANCE = 1e-6
+
+# 行数超过该值时只抽样校验部分分组（0 表示始终全量校验）
+RATE_CHECK_SAMPLE_ROWS = int(os.environ.get("PREFECT_RATE_CHECK_SAMPLE_ROWS", "0"))
+
+
+def _group_ids(df: pd.DataFrame, keys: List[str]) -> np.ndarray:
+    """把多列分组键合成为 0..n-1 的整数组号（空值也作为一个取值）（辅助函数）"""
+    group_ids = np.zeros(len(df), dtype=np.int64)
+    for key in keys:
+        codes, uniques = pd.factorize(df[key], use_na_sentinel=False)
+        # 每合并一列重新编号，组号始终小于行数，不会溢出
+        group_ids, _ = pd.factorize(group_ids * len(uniques) + codes)
+    return group_ids
+
+
+def check_group_sums(
+    df: pd.DataFrame,
+    keys: List[str],
+    value: str = "rate",
+    expected: float = 1.0,
+    tolerance: float = RATE_TOLERANCE,
+    sample_frac: Optional[float] = None,
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    校验各分组 value 列的合计是否等于 expected
+
+    Args:
+        df: 数据
+        keys: 分组列
+        value: 求和列
+        expected: 期望的合计
+        tolerance: 允许的绝对误差
+        sample_frac: 抽样比例（0~1）；按第一个分组列的取值抽样，抽中的分组完整参与校验
+        seed: 抽样随机种子
+
+    Returns:
+        不满足条件的分组：分组列 + 合计(total) + 行数(rows) + 差额(diff)，按差额绝对值降序；
+        合计为空值（value 列有空值）的分组同样视为不满足
+    """
+    columns = list(keys) + ["total", "rows", "diff"]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    if sample_frac is not None and sample_frac < 1:
+        codes, uniques = pd.factorize(df[keys[0]], use_na_sentinel=False)
+        picked = np.random.default_rng(seed).random(len(uniques)) < sample_frac
+        df = df[picked[codes]]
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+
+    group_ids = _group_ids(df, keys)
+    group_count = int(group_ids.max()) + 1
+    values = pd.to_numeric(df[value], errors="coerce").to_numpy(dtype=float)
+    totals = np.bincount(group_ids, weights=values, minlength=group_count)
+    rows = np.bincount(group_ids, minlength=group_count)
+
+    bad = ~(np.abs(totals - expected) <= tolerance)
+    if not bad.any():
+        return pd.DataFrame(columns=columns)
+
+    # factorize 按首次出现的顺序编号，组号首次超过此前最大值的位置即各组第一行
+    running_max = np.maximum.accumulate(group_ids)
+    first_row = np.flatnonzero(np.r_[True, group_ids[1:] > running_max[:-1]])
+    bad_groups = np.flatnonzero(bad)
+
+    violations = df[keys].iloc[first_row[bad_groups]].reset_index(drop=True)
+    violations["total"] = totals[bad_groups]
+    violations["rows"] = rows[bad_groups]
+    violations["diff"] = totals[bad_groups] - expected
+    order = np.argsort(-np.nan_to_num(np.abs(violations["diff"].to_numpy()), nan=np.inf), kind="stable")
+    return violations.iloc[order].reset_index(drop=True)
+
+
+def validate_rates(
+    df: pd.DataFrame,
+    keys: List[str],
+    name: str,
+    value: str = "rate",
+    tolerance: float = RATE_TOLERANCE,
+    show: int = 10
+) -> pd.DataFrame:
+    """
+    校验分拆比例合计为 1，打印摘要并返回不满足条件的分组
+
+    行数超过 RATE_CHECK_SAMPLE_ROWS（环境变量 PREFECT_RATE_CHECK_SAMPLE_ROWS，0 为不限制）时
+    按该行数抽样校验。
+
+    Args:
+        df: 数据
+        keys: 分组列
+        name: 数据名称（仅用于提示）
+        value: 比例列
+        tolerance: 允许的绝对误差
+        show: 最多打印的不满足分组数
+
+    Returns:
+        check_group_sums 的结果
+    """
+    sample_frac = None
+    if RATE_CHECK_SAMPLE_ROWS and len(df) > RATE_CHECK_SAMPLE_ROWS:
+        sample_frac = RATE_CHECK_SAMPLE_ROWS / len(df)
+        print(f"{name}数据 {len(df)} 行，按 {sample_frac:.1%} 抽样校验比率")
+
+    violations = check_group_sums(df, keys, value, tolerance=tolerance, sample_frac=sample_frac)
+    _report(violations, keys, name, value, show)
+    return violations
+
+
+def check_group_sums_sql(
+    cur,
+    relation: str,
+    keys: List[str],
+    value: str = "rate",
+    expected: float = 1.0,
+    tolerance: float = RATE_TOLERANCE
+) -> pd.DataFrame:
+    """
+    在数据库中校验各分组 value 列的合计（结果格式与 check_group_sums 相同）
+
+    Args:
+        cur: 游标
+        relation: 表名或带别名的子查询
+        keys: 分组列
+        value: 求和列
+        expected: 期望的合计
+        tolerance: 允许的绝对误差
+
+    Returns:
+        不满足条件的分组，按差额绝对值降序
+    """
+    key_list = ", ".join(f'"{key}"' for key in keys)
+    total = f'CASE WHEN bool_or("{value}" IS NULL) THEN NULL ELSE sum("{value}"::float8) END'
+    cur.execute(
+        f"SELECT {key_list}, {total} AS total, count(*) AS rows, {total} - %s AS diff "
+        f"FROM {relation} GROUP BY {key_list} "
+        f"HAVING bool_or(\"{value}\" IS NULL) OR abs(sum(\"{value}\"::float8) - %s) > %s "
+        f"ORDER BY abs({total} - %s) DESC NULLS FIRST",
+        (expected, expected, tolerance, expected)
+    )
+    return pd.DataFrame(cur.fetchall(), columns=list(keys) + ["total", "rows", "diff"])
+
+
+def validate_rates_sql(
+    cur,
+    relation: str,
+    keys: List[str],
+    name: str,
+    value: str = "rate",
+    tolerance: float = RATE_TOLERANCE,
+    show: int = 10
+) -> pd.DataFrame:
+    """
+    在数据库中校验分拆比例合计为 1，打印摘要并返回不满足条件的分组（与 validate_rates 相同）
+
+    Args:
+        cur: 游标
+        relation: 表名或带别名的子查询
+        keys: 分组列
+        name: 数据名称（仅用于提示）
+        value: 比例列
+        tolerance: 允许的绝对误差
+        show: 最多打印的不满足分组数
+
+    Returns:
+        check_group_sums_sql 的结果
+    """
+    violations = check_group_sums_sql(cur, relation, keys, value, tolerance=tolerance)
+    _report(violations, keys, name, value, show)
+    return violations
+
+
+def _report(violations: pd.DataFrame, keys: List[str], name: str, value: str, show: int) -> None:
+    """打印不满足条件的分组摘要（辅助函数）"""
+    if len(violations):
+        print(f"[WARN] {name}数据有 {len(violations)} 组 {value} 合计不为 1（分组: {keys}），"
+              f"差额最大的 {min(show, len(violations))} 组:")
+        print(violations.head(show).to_string(index=False))
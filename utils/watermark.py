@@ -0,0 +1,154 @@
+"""按月份记录计算输入的水位，用于跳过输入未变化的月份
+
+每个 (期间, 来源表) 记录上次成功计算时该表在期间内的行数和 max(last_modified)，以及当时使用的
+分拆表指纹。重跑时两者都未变化的月份可以直接跳过。
+"""
+import hashlib
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from .bulk_writer import compute_row_hash
+from .db_utils import get_engine, get_table_columns
+
+WATERMARK_TABLE = "etl_bus_line_watermark"
+
+# 计算指纹时忽略的列：自增主键和写入时间每次重写都会变化，不代表内容变化
+_VOLATILE_COLUMNS = {"id", "last_modified"}
+
+
+def ensure_watermark_table() -> None:
+    """创建水位表（已存在时不做任何事）"""
+    with get_engine().begin() as connection:
+        connection.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+                period date NOT NULL,
+                source_table text NOT NULL,
+                source_mark text,
+                split_fingerprint text,
+                updated_at timestamptz NOT NULL DEFAULT now(),
+                PRIMARY KEY (period, source_table)
+            )
+        """))
+
+
+def frame_fingerprint(*frames: pd.DataFrame) -> str:
+    """
+    计算若干 DataFrame 内容的指纹（与行顺序无关，忽略 id、last_modified 列）
+
+    Args:
+        *frames: 参与计算的数据
+
+    Returns:
+        十六进制指纹
+    """
+    digest = hashlib.sha1()
+    for df in frames:
+        columns = sorted(str(col) for col in df.columns if col not in _VOLATILE_COLUMNS)
+        digest.update(repr((columns, len(df))).encode("utf-8"))
+        if len(df) and columns:
+            hashes = np.sort(compute_row_hash(df.rename(columns=str), columns).to_numpy())
+            digest.update(hashes.tobytes())
+    return digest.hexdigest()
+
+
+def source_watermarks(
+    sources: Dict[str, Tuple[str, bool]],
+    start_date: str,
+    end_date: str,
+    year_start: str
+) -> Dict[str, str]:
+    """
+    查询各来源表在期间内的水位：行数 + max(last_modified)
+
+    行数用于发现删除（删除不会改变 max(last_modified)）。没有 last_modified 列的表
+    改用期间内各行内容的 md5 摘要（在数据库中计算，只返回摘要）。
+
+    Args:
+        sources: {表名: (日期列, 是否从年初开始计算)}，累计数类的表（如 fact_offset）
+            当月结果依赖年初以来的数据，需要从年初开始取水位
+        start_date: 期间开始日期 'YYYY-MM-DD'
+        end_date: 期间结束日期 'YYYY-MM-DD'
+        year_start: 年初日期 'YYYY-MM-DD'
+
+    Returns:
+        {表名: 水位}
+    """
+    marks: Dict[str, str] = {}
+    with get_engine().connect() as connection:
+        for table_name, (date_column, from_year_start) in sources.items():
+            if "last_modified" in get_table_columns(table_name):
+                mark_sql = "max(last_modified)::text"
+            else:
+                mark_sql = "md5(string_agg(md5(t::text), '' ORDER BY md5(t::text)))"
+            row = connection.execute(
+                text(f"SELECT count(*), {mark_sql} FROM {table_name} t "
+                     f"WHERE {date_column} >= :s AND {date_column} <= :e"),
+                {"s": year_start if from_year_start else start_date, "e": end_date}
+            ).one()
+            marks[table_name] = f"{row[0]}|{row[1] or ''}"
+    return marks
+
+
+def load_watermarks(period: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """
+    读取期间上次成功计算时记录的水位
+
+    Args:
+        period: 期间（月初日期 'YYYY-MM-DD'）
+
+    Returns:
+        {来源表: (source_mark, split_fingerprint)}
+    """
+    with get_engine().connect() as connection:
+        rows = connection.execute(
+            text(f"SELECT source_table, source_mark, split_fingerprint "
+                 f"FROM {WATERMARK_TABLE} WHERE period = :p"),
+            {"p": period}
+        )
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+
+def save_watermarks(period: str, marks: Dict[str, str], fingerprint: str) -> None:
+    """
+    记录期间本次成功计算使用的水位（覆盖原记录）
+
+    Args:
+        period: 期间（月初日期 'YYYY-MM-DD'）
+        marks: source_watermarks 的结果
+        fingerprint: 分拆表指纹
+    """
+    with get_engine().begin() as connection:
+        connection.execute(
+            text(f"DELETE FROM {WATERMARK_TABLE} WHERE period = :p"), {"p": period})
+        for table_name, mark in marks.items():
+            connection.execute(
+                text(f"INSERT INTO {WATERMARK_TABLE} "
+                     f"(period, source_table, source_mark, split_fingerprint) "
+                     f"VALUES (:p, :t, :m, :f)"),
+                {"p": period, "t": table_name, "m": mark, "f": fingerprint}
+            )
+
+
+def is_unchanged(
+    stored: Dict[str, Tuple[Optional[str], Optional[str]]],
+    marks: Dict[str, str],
+    fingerprint: str
+) -> bool:
+    """
+    判断期间的输入与上次成功计算时是否一致
+
+    Args:
+        stored: load_watermarks 的结果
+        marks: 本次的 source_watermarks 结果
+        fingerprint: 本次的分拆表指纹
+
+    Returns:
+        全部来源表的水位和分拆表指纹都与记录一致时为 True
+    """
+    for table_name, mark in marks.items():
+        if stored.get(table_name) != (mark, fingerprint):
+            return False
+    return bool(marks)